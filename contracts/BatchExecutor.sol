@@ -0,0 +1,70 @@
+// SPDX-License-Identifier: BUSL-1.1
+
+pragma solidity 0.8.4;
+
+import "@openzeppelin/contracts/access/Ownable.sol";
+
+/**
+ * @author Heisenberg
+ * @title Buffer Batch Executor
+ * @notice Executes a list of calls in a single transaction. The contracts that
+ * are administered through it need to make it their owner/grant it their
+ * admin role first.
+ */
+contract BatchExecutor is Ownable {
+    struct Call {
+        address target;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    event ExecuteBatch(uint256 calls);
+
+    /**
+     * @notice Executes all the calls in order, reverting the whole batch with
+     * the reason of the first failing call
+     */
+    function execute(
+        Call[] calldata calls
+    ) external onlyOwner returns (bytes[] memory results) {
+        results = new bytes[](calls.length);
+        for (uint256 index = 0; index < calls.length; index++) {
+            (bool success, bytes memory returnData) = calls[index].target.call(
+                calls[index].callData
+            );
+            if (!success) {
+                _revertWithReason(returnData);
+            }
+            results[index] = returnData;
+        }
+        emit ExecuteBatch(calls.length);
+    }
+
+    /**
+     * @notice Aggregates read only calls, failing calls don't revert the batch
+     */
+    function aggregate(
+        Call[] calldata calls
+    ) external view returns (Result[] memory results) {
+        results = new Result[](calls.length);
+        for (uint256 index = 0; index < calls.length; index++) {
+            (bool success, bytes memory returnData) = calls[index]
+                .target
+                .staticcall(calls[index].callData);
+            results[index] = Result(success, returnData);
+        }
+    }
+
+    function _revertWithReason(bytes memory returnData) private pure {
+        if (returnData.length > 0) {
+            assembly {
+                revert(add(returnData, 32), mload(returnData))
+            }
+        }
+        revert("BatchExecutor: Call failed");
+    }
+}
@@ -496,6 +496,106 @@ contract BufferRouter is AccessControl, IBufferRouter {
         return (true, "");
     }
 
+    /**
+     * @notice Runs the checks of openTrades on a batch of trades without
+     * opening them, so keepers can filter a batch with a single eth_call.
+     * Bit `i % 256` of `validTrades[i / 256]` is set when trade i would open,
+     * otherwise `reasons[i]` is the reason it would be resolved with. Every
+     * trade is checked against the current state, independently of the
+     * others. Registration and permit signatures can't be checked in a view,
+     * the trades are verified as if they succeeded.
+     */
+    function verifyTrades(
+        OpenTxn[] calldata params
+    )
+        external
+        view
+        returns (uint256[] memory validTrades, string[] memory reasons)
+    {
+        validTrades = new uint256[]((params.length + 255) / 256);
+        reasons = new string[](params.length);
+        for (uint256 index = 0; index < params.length; index++) {
+            (bool isValid, string memory reason) = _verifyOpenTxn(
+                params[index]
+            );
+            if (isValid) {
+                validTrades[index / 256] |= 1 << (index % 256);
+            } else {
+                reasons[index] = reason;
+            }
+        }
+    }
+
+    function _verifyOpenTxn(
+        OpenTxn calldata txn
+    ) private view returns (bool, string memory) {
+        TradeParams memory params = txn.tradeParams;
+        // openTrades would revert as a whole on an unknown contract
+        if (!contractRegistry[params.targetContract]) {
+            return (false, "Router: Unauthorized contract");
+        }
+        IBufferBinaryOptions optionsContract = IBufferBinaryOptions(
+            params.targetContract
+        );
+        ERC20 tokenX = ERC20(optionsContract.tokenX());
+        uint256 amountToPay = params.totalFee +
+            IOptionsConfig(optionsContract.config()).platformFee();
+        if (tokenX.balanceOf(txn.user) < amountToPay) {
+            return (false, "Router: Insufficient balance");
+        }
+        if (txn.permit.shouldApprove) {
+            if (txn.permit.deadline < block.timestamp) {
+                return (false, "ERC20Permit: expired deadline");
+            }
+            if (txn.permit.value < amountToPay) {
+                return (false, "Router: Incorrect allowance");
+            }
+        } else if (tokenX.allowance(txn.user, address(this)) < amountToPay) {
+            return (false, "Router: Incorrect allowance");
+        }
+
+        address signer = txn.register.oneCT;
+        if (!txn.register.shouldRegister) {
+            (signer, ) = getAccountMapping(txn.user);
+        }
+        (bool isValid, string memory reason) = verifyTrade(
+            params,
+            txn.user,
+            signer,
+            optionsContract
+        );
+        if (!isValid) {
+            return (false, reason);
+        }
+        return _evaluateParams(params, txn.user, optionsContract);
+    }
+
+    function _evaluateParams(
+        TradeParams memory params,
+        address user,
+        IBufferBinaryOptions optionsContract
+    ) private view returns (bool, string memory) {
+        try
+            optionsContract.evaluateParams(
+                IBufferBinaryOptions.OptionParams(
+                    params.strike,
+                    0,
+                    params.period,
+                    params.allowPartialFill,
+                    params.totalFee,
+                    user,
+                    params.referralCode,
+                    params.settlementFee
+                ),
+                params.slippage
+            )
+        returns (uint256, uint256) {
+            return (true, "");
+        } catch Error(string memory reason) {
+            return (false, reason);
+        }
+    }
+
     function _openTrade(
         TradeParams memory params,
         address user,
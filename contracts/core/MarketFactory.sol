@@ -0,0 +1,265 @@
+// SPDX-License-Identifier: BUSL-1.1
+
+pragma solidity 0.8.4;
+
+import "@openzeppelin/contracts/access/Ownable.sol";
+import "../MarketOIConfig.sol";
+import "../OptionStorage.sol";
+import "../PoolOIStorage.sol";
+import "./BufferBinaryOptions.sol";
+import "./BufferRouter.sol";
+import "./OptionsConfig.sol";
+
+/**
+ * @author Heisenberg
+ * @title Buffer Market Factory
+ * @notice Deploys and wires a complete market (options, config, market OI
+ * config and option storage) in one transaction at CREATE2 addresses.
+ * @dev The factory needs DEFAULT_ADMIN_ROLE on the pool, the router and the
+ * pool OI storage. BufferBinaryOptions is too big to be embedded, so its
+ * creation code is passed with every call and checked against a known hash.
+ */
+contract MarketFactory is Ownable {
+    struct SharedConfig {
+        ERC20 tokenX;
+        BufferBinaryPool pool;
+        IReferralStorage referral;
+        BufferRouter router;
+        PoolOIStorage poolOIStorage;
+        address poolOIConfig;
+        address settlementFeeDisbursal;
+        address booster;
+        address creationWindow;
+    }
+
+    struct MarketParams {
+        bytes32 salt;
+        string token0;
+        string token1;
+        IBufferBinaryOptions.AssetCategory category;
+        uint256 maxMarketOI;
+        uint256 maxTradeSize;
+        uint256 minFee;
+        uint256 platformFee;
+        uint32 minPeriod;
+        uint32 maxPeriod;
+        bool isEarlyCloseAllowed;
+        uint32 earlyCloseThreshold;
+    }
+
+    struct Market {
+        address options;
+        address config;
+        address marketOIConfig;
+        address optionStorage;
+    }
+
+    SharedConfig public shared;
+    bytes32 public optionsCodeHash;
+
+    event CreateMarket(
+        string token0,
+        string token1,
+        address options,
+        address config,
+        address marketOIConfig,
+        address optionStorage
+    );
+
+    constructor(SharedConfig memory _shared, bytes32 _optionsCodeHash) {
+        shared = _shared;
+        optionsCodeHash = _optionsCodeHash;
+    }
+
+    /************************************************
+     *  ADMIN ONLY FUNCTIONS
+     ***********************************************/
+
+    function setSharedConfig(SharedConfig calldata _shared) external onlyOwner {
+        shared = _shared;
+    }
+
+    function setOptionsCodeHash(bytes32 _optionsCodeHash) external onlyOwner {
+        optionsCodeHash = _optionsCodeHash;
+    }
+
+    /**
+     * @notice Deploys the market contracts, initializes and configures them,
+     * grants the roles and hands the admin rights over to the owner
+     */
+    function createMarket(
+        MarketParams calldata params,
+        bytes calldata optionsCode
+    ) external onlyOwner returns (Market memory market) {
+        require(
+            keccak256(optionsCode) == optionsCodeHash,
+            "MarketFactory: Wrong options code"
+        );
+        BufferBinaryOptions options = BufferBinaryOptions(
+            _deploy(params.salt, optionsCode)
+        );
+        OptionsConfig config = new OptionsConfig{salt: params.salt}(
+            shared.pool
+        );
+        MarketOIConfig marketOIConfig = new MarketOIConfig{salt: params.salt}(
+            params.maxMarketOI,
+            params.maxTradeSize,
+            IBufferBinaryOptions(address(options))
+        );
+        OptionStorage optionStorage = new OptionStorage{salt: params.salt}();
+
+        market = Market(
+            address(options),
+            address(config),
+            address(marketOIConfig),
+            address(optionStorage)
+        );
+        _initialize(options, config, params);
+        _configure(config, market, params);
+        _grantRoles(options);
+
+        config.transferOwnership(owner());
+        marketOIConfig.transferOwnership(owner());
+
+        emit CreateMarket(
+            params.token0,
+            params.token1,
+            market.options,
+            market.config,
+            market.marketOIConfig,
+            market.optionStorage
+        );
+    }
+
+    /************************************************
+     *  READ ONLY FUNCTIONS
+     ***********************************************/
+
+    /**
+     * @notice Returns the addresses createMarket will deploy the market at
+     */
+    function computeMarket(
+        MarketParams calldata params
+    ) external view returns (Market memory market) {
+        market.options = _computeAddress(params.salt, optionsCodeHash);
+        market.config = _computeAddress(
+            params.salt,
+            keccak256(
+                abi.encodePacked(
+                    type(OptionsConfig).creationCode,
+                    abi.encode(shared.pool)
+                )
+            )
+        );
+        market.marketOIConfig = _computeAddress(
+            params.salt,
+            keccak256(
+                abi.encodePacked(
+                    type(MarketOIConfig).creationCode,
+                    abi.encode(
+                        params.maxMarketOI,
+                        params.maxTradeSize,
+                        market.options
+                    )
+                )
+            )
+        );
+        market.optionStorage = _computeAddress(
+            params.salt,
+            keccak256(type(OptionStorage).creationCode)
+        );
+    }
+
+    /************************************************
+     *  INTERNAL FUNCTIONS
+     ***********************************************/
+
+    function _deploy(
+        bytes32 salt,
+        bytes memory code
+    ) internal returns (address deployed) {
+        assembly {
+            deployed := create2(0, add(code, 32), mload(code), salt)
+        }
+        require(deployed != address(0), "MarketFactory: Deployment failed");
+    }
+
+    function _computeAddress(
+        bytes32 salt,
+        bytes32 codeHash
+    ) internal view returns (address) {
+        return
+            address(
+                uint160(
+                    uint256(
+                        keccak256(
+                            abi.encodePacked(
+                                bytes1(0xff),
+                                address(this),
+                                salt,
+                                codeHash
+                            )
+                        )
+                    )
+                )
+            );
+    }
+
+    function _initialize(
+        BufferBinaryOptions options,
+        OptionsConfig config,
+        MarketParams calldata params
+    ) internal {
+        options.initialize(
+            shared.tokenX,
+            ILiquidityPool(address(shared.pool)),
+            IOptionsConfig(address(config)),
+            shared.referral,
+            params.category,
+            params.token0,
+            params.token1
+        );
+        options.approvePoolToTransferTokenX();
+    }
+
+    function _configure(
+        OptionsConfig config,
+        Market memory market,
+        MarketParams calldata params
+    ) internal {
+        config.setSettlementFeeDisbursalContract(shared.settlementFeeDisbursal);
+        config.setBoosterContract(shared.booster);
+        if (params.category != IBufferBinaryOptions.AssetCategory.Crypto) {
+            config.setCreationWindowContract(shared.creationWindow);
+        }
+        config.setOptionStorageContract(market.optionStorage);
+        config.setPoolOIStorageContract(address(shared.poolOIStorage));
+        config.setMarketOIConfigContract(market.marketOIConfig);
+        config.setPoolOIConfigContract(shared.poolOIConfig);
+        config.setMinFee(params.minFee);
+        config.setPlatformFee(params.platformFee);
+        // setMaxPeriod is validated against the new minPeriod
+        config.setMinPeriod(params.minPeriod);
+        config.setMaxPeriod(params.maxPeriod);
+        if (params.isEarlyCloseAllowed) {
+            config.toggleEarlyClose();
+            config.setEarlyCloseThreshold(params.earlyCloseThreshold);
+        }
+    }
+
+    function _grantRoles(BufferBinaryOptions options) internal {
+        options.grantRole(options.ROUTER_ROLE(), address(shared.router));
+        shared.pool.grantRole(
+            shared.pool.OPTION_ISSUER_ROLE(),
+            address(options)
+        );
+        shared.poolOIStorage.grantRole(
+            shared.poolOIStorage.UPDATOR_ROLE(),
+            address(options)
+        );
+        shared.router.setContractRegistry(address(options), true);
+
+        options.grantRole(options.DEFAULT_ADMIN_ROLE(), owner());
+        options.renounceRole(options.DEFAULT_ADMIN_ROLE(), address(this));
+    }
+}
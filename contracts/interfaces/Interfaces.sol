@@ -235,7 +235,7 @@ interface IBufferBinaryOptions {
     function evaluateParams(
         OptionParams calldata optionParams,
         uint256 slippage
-    ) external returns (uint256 amount, uint256 revisedFee);
+    ) external view returns (uint256 amount, uint256 revisedFee);
 
     function tokenX() external view returns (ERC20);
 
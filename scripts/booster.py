@@ -28,6 +28,8 @@ from colorama import Fore, Style
 from eth_account import Account
 from eth_account.messages import encode_defunct
 
+from .market_catalog import config_state, load_catalog
+from .reconcile import reconcile_configs
 from .utility import deploy_contract, save_flat, transact
 
 
@@ -67,96 +69,6 @@ def main():
     pool_oi_storage = None
     pool_oi_config = None
 
-    market_times = [
-        (17, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 15, 59),
-        (0, 0, 0, 0),
-    ]
-
-    asset_pairs = [
-        {
-            "token1": "BTC",
-            "token2": "USD",
-            "full_name": "Bitcoin",
-            "asset_category": 1,
-            "payout": 65,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-        },
-        {
-            "token1": "ETH",
-            "token2": "USD",
-            "full_name": "Ethereum",
-            "asset_category": 1,
-            "payout": 65,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-        },
-        {
-            "token1": "EUR",
-            "token2": "USD",
-            "full_name": "Euro",
-            "asset_category": 0,
-            "payout": 65,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-        },
-        {
-            "token1": "GBP",
-            "token2": "USD",
-            "full_name": "Pound",
-            "asset_category": 0,
-            "payout": 65,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-        },
-        {
-            "token1": "XAU",
-            "token2": "USD",
-            "full_name": "Gold",
-            "asset_category": 2,
-            "payout": 65,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-        },
-        {
-            "token1": "XAG",
-            "token2": "USD",
-            "full_name": "Silver",
-            "asset_category": 2,
-            "payout": 65,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-        },
-    ]
     initialLiquidityForTestnet = int(499999.786093e6)
     if network.show_active() == "development":
         allow_revert = True
@@ -266,333 +178,39 @@ def main():
     )
     booster = booster.address
 
-    addresses = [
-        {
-            "configContract": {
-                "address": "0x16d8e3670791e8eb4372889fad426bff35b988be",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-            },
-            "address": "0x578d08cf15b08296043a0968b98fb408dbe0ff9d",
-            "poolContract": "0x6efabb45b781b62979600444775113516220d992",
-            "isPaused": False,
-            "category": 1,
-            "asset": "ETHUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x3d729530851dd1a1573d3cd1638cc935d801936d",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-            },
-            "address": "0x67985caf7551191feabdc7f15289bfb45680d74e",
-            "poolContract": "0x6efabb45b781b62979600444775113516220d992",
-            "isPaused": False,
-            "category": 2,
-            "asset": "XAUUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x2f52d5695786c58b5fbfcd81267ad48a59578d15",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-            },
-            "address": "0x6f34dee136314b2a610566ac8091a4e9e7ed4e9e",
-            "poolContract": "0x6efabb45b781b62979600444775113516220d992",
-            "isPaused": False,
-            "category": 1,
-            "asset": "BTCUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x4be39a1a8a02b9c0895628841e84a93440bcec16",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-            },
-            "address": "0x92d2dbfe34c2527780d9d4897cada3aef153a1fd",
-            "poolContract": "0x6efabb45b781b62979600444775113516220d992",
-            "isPaused": False,
-            "category": 0,
-            "asset": "EURUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x52b9eeb12aca9d5bd4c12735e8f6d7b94d1c5035",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-            },
-            "address": "0xe23a3c592b80c7416538a607acecc76c2ff83e69",
-            "poolContract": "0x6efabb45b781b62979600444775113516220d992",
-            "isPaused": False,
-            "category": 0,
-            "asset": "GBPUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x1599601770f48aefc5cc3bcf5ec9d3012995a6d3",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-            },
-            "address": "0xe457b8313c3e71e9f458ab473d329d795f48669d",
-            "poolContract": "0x6efabb45b781b62979600444775113516220d992",
-            "isPaused": False,
-            "category": 2,
-            "asset": "XAGUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x91be1704eafd42449d13b151f9aaa15982c340cc",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x20d44cee731c877b30c3d4d1020be2f0c1d7aee5",
-            },
-            "address": "0x0135fd2979266662942c9f4717b97c9f56bb4368",
-            "poolContract": "0xb04abea1152bfcdbb35edcb3a5c9b1929cd789d4",
-            "isPaused": False,
-            "category": 0,
-            "asset": "EURUSD",
-        },
-        {
-            "configContract": {
-                "address": "0xdefdecb1336fb449808443479c55c550e4594cc1",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x0fa722efb09cba2cd383c381c879557111c80cef",
-            },
-            "address": "0x09e1020329ec624205e16bcd51633328828e4914",
-            "poolContract": "0xb04abea1152bfcdbb35edcb3a5c9b1929cd789d4",
-            "isPaused": False,
-            "category": 2,
-            "asset": "XAGUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x0bb6898f472342dee466156873c76a95fd21e792",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x0d061ea39406f1188435f2ef59c6c2e855bdb382",
-            },
-            "address": "0x286ae6e965d13f4027b745d16616bf50728f479d",
-            "poolContract": "0xb04abea1152bfcdbb35edcb3a5c9b1929cd789d4",
-            "isPaused": False,
-            "category": 0,
-            "asset": "GBPUSD",
-        },
-        {
-            "configContract": {
-                "address": "0xd935c81e6bd2fc89db1556aad0db08aa95bfdfa9",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x9b995f8d00de769154c4bc51f863b44aebed8ef0",
-            },
-            "address": "0x2995a7a89aad6c8a20be72f13c6f47433506c46f",
-            "poolContract": "0xb04abea1152bfcdbb35edcb3a5c9b1929cd789d4",
-            "isPaused": False,
-            "category": 2,
-            "asset": "XAUUSD",
-        },
-        {
-            "configContract": {
-                "address": "0xfbdd0396a81620f75b07878e62047174fef94932",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000000000000000",
-                "minPeriod": "180",
-                "platformFee": "100000000000000000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x941735bf7e22284757a31718ba6daecb6c9693c8",
-            },
-            "address": "0x441bd7f41affa3df0bb75601eff3f804b286e918",
-            "poolContract": "0x70e29d7f07bbb83253de57f73543f5cb8f3a267a",
-            "isPaused": False,
-            "category": 0,
-            "asset": "EURUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x07b95dcf6418ed2de79e84d804094e42b76b4124",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x057c1b161af11c753d7eb6dde45e2e63000bf5dd",
-            },
-            "address": "0x6a24170caaf5d1e47de1069583fec9555e86f462",
-            "poolContract": "0xb04abea1152bfcdbb35edcb3a5c9b1929cd789d4",
-            "isPaused": False,
-            "category": 1,
-            "asset": "BTCUSD",
-        },
-        {
-            "configContract": {
-                "address": "0xf8203d818a35f4484e6e240980e9b112faaecd13",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000000000000000",
-                "minPeriod": "180",
-                "platformFee": "100000000000000000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0xf72c8924759c459e0cddd536270d4433918a13bb",
-            },
-            "address": "0x6b03b8c9426b351e934d2271fd5b498fef079dbd",
-            "poolContract": "0x70e29d7f07bbb83253de57f73543f5cb8f3a267a",
-            "isPaused": False,
-            "category": 2,
-            "asset": "XAGUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x3d6177469f7574d761705c9b3e78118908aabe58",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000",
-                "minPeriod": "180",
-                "platformFee": "100000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x10c48532c549e1c4a86e6547d3653c7457ffdede",
-            },
-            "address": "0x6f7cd28814973d7000143968e7f6c72f8c907b34",
-            "poolContract": "0xb04abea1152bfcdbb35edcb3a5c9b1929cd789d4",
-            "isPaused": False,
-            "category": 1,
-            "asset": "ETHUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x98e99f5695a62c21c9940141092aa791901aca82",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000000000000000",
-                "minPeriod": "180",
-                "platformFee": "100000000000000000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x88dcca7d2ecfe55b8043edd74d73802c8e1508bb",
-            },
-            "address": "0x807e61346a9898c35b5954f82ba70efecdf86171",
-            "poolContract": "0x70e29d7f07bbb83253de57f73543f5cb8f3a267a",
-            "isPaused": False,
-            "category": 2,
-            "asset": "XAUUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x49ecc7f3b104df685fd317bbad13dbf5c6351e95",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000000000000000",
-                "minPeriod": "180",
-                "platformFee": "100000000000000000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0xd51d23dea9931e8a765949648ee2d4fb317d9164",
-            },
-            "address": "0x8d8b172022250f89f80307b37f6f0c6b0150c236",
-            "poolContract": "0x70e29d7f07bbb83253de57f73543f5cb8f3a267a",
-            "isPaused": False,
-            "category": 0,
-            "asset": "GBPUSD",
-        },
-        {
-            "configContract": {
-                "address": "0xbb69d65cf3e12ae2ad37f713ded76c111c30e63d",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000000000000000",
-                "minPeriod": "180",
-                "platformFee": "100000000000000000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x380a7031632558b8949f3527bff236a679f8fdcf",
-            },
-            "address": "0xda7860922c12113ef53f9e43fc287f221fedb6d3",
-            "poolContract": "0x70e29d7f07bbb83253de57f73543f5cb8f3a267a",
-            "isPaused": False,
-            "category": 1,
-            "asset": "BTCUSD",
-        },
-        {
-            "configContract": {
-                "address": "0x44a6d1f57b5c534e95a01d3b2ff8f4e227817aab",
-                "maxFee": "0",
-                "maxPeriod": "14400",
-                "minFee": "1000000000000000000",
-                "minPeriod": "180",
-                "platformFee": "100000000000000000",
-                "earlyCloseThreshold": "60",
-                "isEarlyCloseEnabled": True,
-                "marketOIaddress": "0x8b2c2ba628484f1129c3992568db059795d7c73f",
-            },
-            "address": "0xe38d57b47745b076a7b50a6581e5279a89a0199c",
-            "poolContract": "0x70e29d7f07bbb83253de57f73543f5cb8f3a267a",
-            "isPaused": False,
-            "category": 1,
-            "asset": "ETHUSD",
-        },
-    ]
+    # Only the configs that don't point to the new booster yet get a transaction
+    reconcile_markets(booster, admin, fields=["booster"])
+
+
+def desired_config_states(booster, fields=None):
+    desired_states = {}
+    for market, deployed in load_catalog().deployed_markets():
+        config = config_state(market)
+        config["booster"] = booster
+        if "market_oi_config" in deployed:
+            config["marketOIaddress"] = deployed["market_oi_config"]
+        if fields is not None:
+            config = {field: config[field] for field in fields if field in config}
+        desired_states[deployed["config"]] = config
+    return desired_states
 
-    for d in addresses:
-        option_config = OptionsConfig.at(d["configContract"]["address"])
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setBoosterContract",
-            booster,
-            sender=admin,
-        )
+
+def reconcile_markets(booster, admin, fields=None, dry_run=False):
+    reconcile_configs(
+        brownie.network.web3,
+        OptionsConfig.abi,
+        desired_config_states(booster, fields),
+        admin,
+        dry_run=dry_run,
+    )
+
+
+def reconcile():
+    """
+    Sends only the OptionsConfig setters whose on-chain value differs from
+    the deployed markets of the catalog, using the already deployed booster.
+    """
+    admin = accounts.add(os.environ["BFR_PK"])
+    reconcile_markets(
+        os.environ["BOOSTER"], admin, dry_run=os.environ.get("DRY_RUN") == "1"
+    )
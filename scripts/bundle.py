@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+
+import rlp
+from brownie import web3
+from eth_utils import keccak, to_checksum_address
+from web3.exceptions import TransactionNotFound
+
+from .receipt_tracker import ReceiptTracker, format_results
+
+BUNDLE_PATH = "deployments/bundle.json"
+
+
+def create_address(sender, nonce):
+    """Address of the contract deployed by `sender` with `nonce`."""
+    return to_checksum_address(
+        keccak(rlp.encode([bytes.fromhex(sender[2:]), nonce]))[12:]
+    )
+
+
+class DeploymentBundle:
+    """
+    Ordered list of signed raw transactions of a deployment. The bundle is
+    recorded by running a deployment script against a fork of the target
+    network, which builds and signs every transaction with the nonces and
+    contract addresses they will have on the target network. The recorded run
+    is the dry-run. `broadcast` then sends the whole bundle to the target
+    network as a burst.
+
+    The fork has to keep the chain id of the forked network, otherwise the
+    signatures are not valid on the target network. Transactions are sent in
+    the order they were recorded, which the sequencer keeps across senders.
+    """
+
+    def __init__(self, chain_id, path=BUNDLE_PATH, transactions=None):
+        self.chain_id = chain_id
+        self.path = path
+        self.transactions = transactions or []
+        self._lock = threading.Lock()
+
+    def add(self, label, sender, nonce, to, raw_transaction, txn_hash):
+        entry = {
+            "label": label,
+            "sender": sender,
+            "nonce": nonce,
+            "to": to,
+            "raw": raw_transaction,
+            "txn_hash": txn_hash,
+            # Contract creations get a predictable address
+            "contract_address": None if to else create_address(sender, nonce),
+        }
+        with self._lock:
+            self.transactions.append(entry)
+            # Written as it's recorded, a failure later in the run doesn't lose
+            # what was already signed
+            self._write()
+        return entry
+
+    def add_verification(self, txn_hash, verification):
+        """
+        Source verification of a bundled deployment, queued on the target
+        network once `broadcast` confirmed the contract address.
+        """
+        with self._lock:
+            for entry in self.transactions:
+                if entry["txn_hash"] == txn_hash:
+                    entry["verification"] = verification
+                    self._write()
+                    return entry
+        raise KeyError(txn_hash)
+
+    def save(self):
+        with self._lock:
+            self._write()
+        print(f"Saved {len(self.transactions)} transactions to {self.path}")
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "version": 1,
+            "chain_id": self.chain_id,
+            "created_at": int(time.time()),
+            "transactions": self.transactions,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path=BUNDLE_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["chain_id"], path, data["transactions"])
+
+    def _pending(self, web3):
+        """
+        Transactions that still need to be sent. Transactions of a previous,
+        interrupted broadcast are skipped if they were mined, any other nonce
+        mismatch means the bundle is stale.
+        """
+        chain_nonces = {}
+        pending = []
+        for entry in self.transactions:
+            sender = entry["sender"]
+            if sender not in chain_nonces:
+                chain_nonces[sender] = web3.eth.getTransactionCount(sender, "pending")
+            if entry["nonce"] >= chain_nonces[sender]:
+                pending.append(entry)
+                continue
+            try:
+                web3.eth.get_transaction_receipt(entry["txn_hash"])
+            except TransactionNotFound:
+                raise Exception(
+                    f"Nonce {entry['nonce']} of {sender} was used by another "
+                    f"transaction, the bundle has to be recorded again"
+                )
+
+        first_nonces = {}
+        for entry in pending:
+            sender = entry["sender"]
+            first_nonces[sender] = min(
+                first_nonces.get(sender, entry["nonce"]), entry["nonce"]
+            )
+        for sender, nonce in first_nonces.items():
+            if nonce != chain_nonces[sender]:
+                raise Exception(
+                    f"Bundle continues {sender} at nonce {nonce}, "
+                    f"the chain is at {chain_nonces[sender]}"
+                )
+        return pending
+
+    def broadcast(self, web3, tracker=None, verification_queue=None):
+        """
+        Sends all pending transactions back to back without waiting for
+        receipts, then verifies every receipt (status and contract address).
+        Deployments recorded with a verification are queued on
+        `verification_queue` once their address is confirmed.
+        """
+        if web3.eth.chain_id != self.chain_id:
+            raise Exception(
+                f"Bundle was signed for chain {self.chain_id}, "
+                f"connected to {web3.eth.chain_id}"
+            )
+        pending = self._pending(web3)
+        print(
+            f"Broadcasting {len(pending)}/{len(self.transactions)} transactions "
+            f"of {self.path}"
+        )
+        tracker = tracker or ReceiptTracker(web3)
+        futures = []
+        for entry in pending:
+            web3.eth.sendRawTransaction(entry["raw"])
+            futures.append(
+                (
+                    entry,
+                    tracker.track(
+                        entry["txn_hash"],
+                        label=entry["label"],
+                        nonce=entry["nonce"],
+                        sender=entry["sender"],
+                    ),
+                )
+            )
+
+        results = []
+        errors = []
+        for entry, future in futures:
+            result = future.result()
+            results.append(result)
+            if not result.succeeded:
+                errors.append(f"{entry['label']} reverted ({entry['txn_hash']})")
+            elif entry["contract_address"] and (
+                to_checksum_address(result.contract_address)
+                != entry["contract_address"]
+            ):
+                errors.append(
+                    f"{entry['label']} deployed at {result.contract_address}, "
+                    f"expected {entry['contract_address']}"
+                )
+            elif verification_queue is not None and entry.get("verification"):
+                verification_queue.enqueue(
+                    entry["contract_address"], **entry["verification"]
+                )
+        print(format_results(results))
+        if errors:
+            raise Exception("Bundle verification failed: {}".format(", ".join(errors)))
+        return results
+
+
+def broadcast():
+    """
+    brownie run scripts/bundle.py broadcast --network <target network>
+    with BUNDLE pointing at the recorded bundle file.
+    """
+    from brownie import network
+
+    from .utility import get_verification_queue, should_publish_source
+
+    bundle = DeploymentBundle.load(os.environ.get("BUNDLE", BUNDLE_PATH))
+    queue = get_verification_queue() if should_publish_source(network) else None
+    bundle.broadcast(web3, verification_queue=queue)
+    if queue is not None:
+        print(queue.drain(wait=True))
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+from collections import Counter, OrderedDict
+
+from eth_utils import function_abi_to_4byte_selector
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    hash(value)
+    return value
+
+
+class ContractCache:
+    """
+    Process-wide cache of web3 contract objects, function selectors and
+    encoded calldata keyed by (address, ABI hash), so that admin loops calling
+    the same setters on the same contracts don't rebuild and re-encode them
+    for every transaction.
+    """
+
+    def __init__(self, web3, max_calldata=4096):
+        self.web3 = web3
+        self.max_calldata = max_calldata
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        # id(abi) -> (abi, hash), keeps the abi alive so the id isn't reused
+        self._abi_hashes = {}
+        self._contracts = {}
+        self._selectors = {}
+        self._calldata = OrderedDict()
+
+    def abi_hash(self, abi):
+        with self._lock:
+            cached = self._abi_hashes.get(id(abi))
+            if cached is not None and cached[0] is abi:
+                return cached[1]
+        digest = hashlib.sha256(json.dumps(abi, sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            self._abi_hashes[id(abi)] = (abi, digest)
+        return digest
+
+    def contract(self, address, abi):
+        key = (address, self.abi_hash(abi))
+        with self._lock:
+            contract = self._contracts.get(key)
+        if contract is not None:
+            self.stats["contract_hits"] += 1
+            return contract
+        self.stats["contract_misses"] += 1
+        contract = self.web3.eth.contract(abi=abi, address=address)
+        with self._lock:
+            return self._contracts.setdefault(key, contract)
+
+    def selector(self, abi, method):
+        """4 byte selectors of all overloads of `method`, as hex strings"""
+        key = (self.abi_hash(abi), method)
+        with self._lock:
+            selectors = self._selectors.get(key)
+        if selectors is None:
+            selectors = [
+                "0x" + function_abi_to_4byte_selector(item).hex()
+                for item in abi
+                if item.get("type") == "function" and item.get("name") == method
+            ]
+            with self._lock:
+                self._selectors[key] = selectors
+        return selectors
+
+    def encode(self, address, abi, method, args):
+        """
+        Calldata of `method(*args)`, memoized for hashable arguments. The
+        calldata doesn't depend on the address, so the same setter sent to
+        many contracts of one type is encoded once.
+        """
+        try:
+            key = (self.abi_hash(abi), method, _freeze(args))
+        except TypeError:
+            key = None
+        if key is not None:
+            with self._lock:
+                calldata = self._calldata.get(key)
+                if calldata is not None:
+                    self._calldata.move_to_end(key)
+            if calldata is not None:
+                self.stats["calldata_hits"] += 1
+                return calldata
+
+        self.stats["calldata_misses"] += 1
+        calldata = self.contract(address, abi).encodeABI(
+            fn_name=method, args=list(args)
+        )
+        if key is not None:
+            with self._lock:
+                self._calldata[key] = calldata
+                if len(self._calldata) > self.max_calldata:
+                    self._calldata.popitem(last=False)
+        return calldata
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+
+from eth_abi import encode_abi
+from eth_utils import keccak, to_checksum_address
+
+# Brownie build artifacts, the init code has to come from the same
+# compilation the factory was deployed with
+BUILD_PATH = "build/contracts"
+
+
+def create2_address(deployer, salt, init_code):
+    digest = keccak(b"\xff" + bytes.fromhex(deployer[2:]) + salt + keccak(init_code))
+    return to_checksum_address(digest[12:])
+
+
+def market_salt(token0, token1, version=0):
+    """Salt of a market, bump the version to redeploy the same pair."""
+    return keccak(
+        encode_abi(["string", "string", "uint256"], [token0, token1, version])
+    )
+
+
+def load_bytecode(name, build_path=BUILD_PATH):
+    with open(os.path.join(build_path, f"{name}.json")) as f:
+        bytecode = json.load(f)["bytecode"]
+    return bytes.fromhex(bytecode[2:] if bytecode.startswith("0x") else bytecode)
+
+
+def market_addresses(
+    factory, pool, salt, max_market_oi, max_trade_size, build_path=BUILD_PATH
+):
+    """
+    Addresses MarketFactory.createMarket deploys a market at, computed
+    offline from the build artifacts.
+    """
+    options = create2_address(
+        factory, salt, load_bytecode("BufferBinaryOptions", build_path)
+    )
+    config = create2_address(
+        factory,
+        salt,
+        load_bytecode("OptionsConfig", build_path) + encode_abi(["address"], [pool]),
+    )
+    market_oi_config = create2_address(
+        factory,
+        salt,
+        load_bytecode("MarketOIConfig", build_path)
+        + encode_abi(
+            ["uint256", "uint256", "address"],
+            [int(max_market_oi), int(max_trade_size), options],
+        ),
+    )
+    option_storage = create2_address(
+        factory, salt, load_bytecode("OptionStorage", build_path)
+    )
+    return {
+        "options": options,
+        "config": config,
+        "market_oi_config": market_oi_config,
+        "option_storage": option_storage,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Precompute the addresses of MarketFactory markets"
+    )
+    parser.add_argument("pairs", nargs="+", help="e.g. BTC-USD ETH-USD")
+    parser.add_argument("--factory", required=True)
+    parser.add_argument("--pool", required=True)
+    parser.add_argument("--max-market-oi", type=float, default=50000e6)
+    parser.add_argument("--max-trade-size", type=float, default=1000e6)
+    parser.add_argument("--version", type=int, default=0)
+    parser.add_argument("--build-path", default=BUILD_PATH)
+    args = parser.parse_args(argv)
+
+    markets = {}
+    for pair in args.pairs:
+        token0, token1 = pair.split("-")
+        salt = market_salt(token0, token1, args.version)
+        markets[pair] = dict(
+            salt="0x" + salt.hex(),
+            **market_addresses(
+                args.factory,
+                args.pool,
+                salt,
+                args.max_market_oi,
+                args.max_trade_size,
+                args.build_path,
+            ),
+        )
+    print(json.dumps(markets, indent=2))
+
+
+if __name__ == "__main__":
+    main()
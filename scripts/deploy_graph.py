@@ -0,0 +1,127 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .journal import scope
+
+
+class Step:
+    def __init__(self, name, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+class DeploymentGraph:
+    """
+    Deployment described as a DAG of steps. Each step is a function receiving
+    the results of all finished steps (keyed by step name) and returns its own
+    result, e.g. the deployed contract. A step starts as soon as all of its
+    dependencies are done, so independent branches (like different markets)
+    run in parallel lanes and the run time scales with the depth of the graph.
+
+    Lanes share the process-wide nonce manager, so steps sending from the same
+    account in parallel still get distinct nonces.
+
+    Finalizers run once every other step is done or the run stopped on a
+    failure, whenever their own dependencies succeeded, e.g. to take back
+    temporary roles.
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.finalizers = {}
+        self.durations = {}
+
+    def add(self, name, fn, deps=()):
+        if name in self.steps or name in self.finalizers:
+            raise ValueError(f"Step {name} is already defined")
+        self.steps[name] = Step(name, fn, deps)
+        return name
+
+    def add_finalizer(self, name, fn, deps=()):
+        if name in self.steps or name in self.finalizers:
+            raise ValueError(f"Step {name} is already defined")
+        for dep in deps:
+            if dep not in self.steps:
+                raise ValueError(f"Finalizer {name} depends on unknown step {dep}")
+        self.finalizers[name] = Step(name, fn, deps)
+        return name
+
+    def levels(self):
+        for step in self.steps.values():
+            for dep in step.deps:
+                if dep not in self.steps:
+                    raise ValueError(f"Step {step.name} depends on unknown step {dep}")
+
+        levels = []
+        done = set()
+        remaining = dict(self.steps)
+        while remaining:
+            ready = [
+                name
+                for name, step in remaining.items()
+                if all(dep in done for dep in step.deps)
+            ]
+            if not ready:
+                raise ValueError(
+                    "Dependency cycle between steps: {}".format(", ".join(remaining))
+                )
+            levels.append(ready)
+            done.update(ready)
+            for name in ready:
+                del remaining[name]
+        return levels
+
+    def run(self, max_workers=8):
+        # Validates the graph before anything is sent
+        depth = len(self.levels())
+        print(f"Running {len(self.steps)} steps, graph depth {depth}")
+
+        results = {}
+        running = {}
+        pending = dict(self.steps)
+        failure = None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                if failure is None:
+                    for name, step in list(pending.items()):
+                        if all(dep in results for dep in step.deps):
+                            del pending[name]
+                            running[
+                                executor.submit(self._run_step, step, dict(results))
+                            ] = step
+
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        results[step.name] = future.result()
+                    except Exception as e:
+                        # Let the steps already running finish, but start no new ones
+                        print(f"Step {step.name} failed: {e}")
+                        failure = failure or e
+
+        for step in self.finalizers.values():
+            if not all(dep in results for dep in step.deps):
+                print(f"Finalizer {step.name} skipped, its dependencies failed")
+                continue
+            try:
+                results[step.name] = self._run_step(step, dict(results))
+            except Exception as e:
+                print(f"Finalizer {step.name} failed: {e}")
+                failure = failure or e
+
+        if failure is not None:
+            raise failure
+        return results
+
+    def _run_step(self, step, results):
+        start = time.time()
+        try:
+            with scope(step.name):
+                return step.fn(results)
+        finally:
+            self.durations[step.name] = time.time() - start
@@ -28,7 +28,21 @@ from colorama import Fore, Style
 from eth_account import Account
 from eth_account.messages import encode_defunct
 
-from .utility import deploy_contract, save_flat, transact
+from .market_catalog import AppliedMarkets, diff_markets, load_catalog, pair_name
+from .reconcile import reconcile_configs, reconfigure_market
+from .utility import (
+    TransactionPipeline,
+    deploy_contract,
+    finish_journal,
+    rpc_report,
+    save_flat,
+    save_manifest,
+    tracer,
+    transact,
+    use_journal,
+    use_pooled_provider,
+    use_tracer,
+)
 
 
 def get_signature(timestamp, token, price, publisher):
@@ -66,102 +80,10 @@ def main():
     account_registrar_address = None
     pool_oi_config = None
     pool_oi_storage = None
-    market_times = [
-        (17, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 23, 59),
-        (0, 0, 15, 59),
-        (0, 0, 0, 0),
-    ]
-
-    asset_pairs = [
-        {
-            "token1": "BTC",
-            "token2": "USD",
-            "full_name": "Bitcoin",
-            "asset_category": 1,
-            "minFee": int(1e18),
-            "platformFee": int(1e17),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e18),
-            "max_market_oi": int(50000e18),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "ETH",
-            "token2": "USD",
-            "full_name": "Ethereum",
-            "asset_category": 1,
-            "minFee": int(1e18),
-            "platformFee": int(1e17),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e18),
-            "max_market_oi": int(50000e18),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "EUR",
-            "token2": "USD",
-            "full_name": "Euro",
-            "asset_category": 0,
-            "minFee": int(1e18),
-            "platformFee": int(1e17),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e18),
-            "max_market_oi": int(50000e18),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "GBP",
-            "token2": "USD",
-            "full_name": "Pound",
-            "asset_category": 0,
-            "minFee": int(1e18),
-            "platformFee": int(1e17),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e18),
-            "max_market_oi": int(50000e18),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "XAU",
-            "token2": "USD",
-            "full_name": "Gold",
-            "asset_category": 2,
-            "minFee": int(1e18),
-            "platformFee": int(1e17),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e18),
-            "max_market_oi": int(50000e18),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "XAG",
-            "token2": "USD",
-            "full_name": "Silver",
-            "asset_category": 2,
-            "minFee": int(1e18),
-            "platformFee": int(1e17),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e18),
-            "max_market_oi": int(50000e18),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-    ]
+    # The markets and their parameters come from the shared catalog
+    catalog = load_catalog()
+    market_times = catalog.market_times
+    asset_pairs = catalog.asset_pairs(os.environ.get("POOL_TOKEN", "BFR"))
     initialLiquidityForTestnet = int(499999.786093e18)
     if network.show_active() == "development":
         allow_revert = True
@@ -241,6 +163,18 @@ def main():
     print(pool_admin, admin)
     print(pool_admin.balance() / 1e18, admin.balance() / 1e18)
 
+    # TRACE=<path> writes the timing, gas and attempts of every step as JSON lines
+    if os.environ.get("TRACE"):
+        use_tracer(os.environ["TRACE"])
+
+    # Keep-alive connections, concurrent reads are batched into one request
+    use_pooled_provider()
+
+    # RESUME=<run id> resumes a partially failed run instead of redeploying
+    # everything
+    if network.show_active() != "development":
+        use_journal("deploy_new_pool", network.show_active(), os.environ.get("RESUME"))
+
     ########### Get TokenX ###########
     if not token_contract_address:
         token_contract = deploy_contract(
@@ -339,79 +273,127 @@ def main():
                 sender=admin,
             )
 
-    all_options = []
-    all_configs = []
-    for asset_pair in asset_pairs:
-        pair = asset_pair["token1"] + asset_pair["token2"]
-
-        ########### Get Options Config ###########
+    ########### Catalog changes ###########
+    # Only the markets that changed since the catalog was last applied to this
+    # pool are deployed (added) or reconfigured (changed)
 
-        if option_config_address:
-            option_config = OptionsConfig.at(option_config_address)
-        else:
-            option_config = deploy_contract(
+    applied = None
+    if network.show_active() != "development":
+        applied = AppliedMarkets(network.show_active(), pool_address)
+        changes = applied.changes(asset_pairs)
+    else:
+        changes = diff_markets([], asset_pairs)
+    print(changes.summary())
+    for asset_pair in asset_pairs:
+        pair = pair_name(asset_pair)
+        if pair in changes.changed:
+            reconfigure_market(
+                brownie.network.web3,
+                asset_pair,
+                applied.contracts(pair),
+                changes.changed[pair],
                 admin,
-                network,
-                OptionsConfig,
-                [
-                    pool_address,
-                ],
-            )
-            transact(
-                option_config.address,
-                option_config.abi,
-                "setSettlementFeeDisbursalContract",
-                sfd,
-                sender=admin,
+                OptionsConfig.abi,
+                MarketOIConfig.abi,
             )
-            transact(
-                option_config.address,
-                option_config.abi,
-                "setBoosterContract",
-                booster,
+    new_markets = [
+        asset_pair
+        for asset_pair in asset_pairs
+        if pair_name(asset_pair) in changes.added
+    ]
+
+    ########### Deploy market contracts ###########
+
+    # The contracts of different markets don't depend on each other, so they
+    # are all sent back to back and their receipts are awaited together.
+    with TransactionPipeline() as pipeline:
+        pending_markets = [
+            {
+                "config": (
+                    None
+                    if option_config_address
+                    else pipeline.deploy(OptionsConfig, pool_address, sender=admin)
+                ),
+                "options": (
+                    None
+                    if options_address
+                    else pipeline.deploy(BufferBinaryOptions, sender=admin)
+                ),
+                "option_storage": pipeline.deploy(OptionStorage, sender=admin),
+            }
+            for _ in new_markets
+        ]
+    market_contracts = [
+        {
+            "config": (
+                OptionsConfig.at(option_config_address)
+                if option_config_address
+                else pending["config"].contract
+            ),
+            "options": (
+                BufferBinaryOptions.at(options_address)
+                if options_address
+                else pending["options"].contract
+            ),
+            "option_storage": pending["option_storage"].contract,
+        }
+        for pending in pending_markets
+    ]
+    with TransactionPipeline() as pipeline:
+        for asset_pair, contracts in zip(new_markets, market_contracts):
+            contracts["market_oi_config"] = pipeline.deploy(
+                MarketOIConfig,
+                asset_pair["max_market_oi"],
+                asset_pair["max_trade_size"],
+                contracts["options"].address,
                 sender=admin,
             )
 
-            if asset_pair["asset_category"] != 1:
-                transact(
+    market_addresses = {}
+    for asset_pair, contracts in zip(new_markets, market_contracts):
+        pair = pair_name(asset_pair)
+        option_config = contracts["config"]
+        options = contracts["options"]
+        option_storage = contracts["option_storage"]
+        market_oi_config = contracts["market_oi_config"].contract
+
+        ########### Get Options Config ###########
+
+        if not option_config_address:
+            with TransactionPipeline() as pipeline:
+                pipeline.transact(
                     option_config.address,
                     option_config.abi,
-                    "setCreationWindowContract",
-                    creation_window_address,
+                    "setSettlementFeeDisbursalContract",
+                    sfd,
                     sender=admin,
                 )
-
-        ########### Deploy Options ###########
-        if options_address:
-            options = BufferBinaryOptions.at(options_address)
-
-        else:
-            options = deploy_contract(
-                admin,
-                network,
-                BufferBinaryOptions,
-                [],
-            )
-            # save_flat(BufferBinaryOptions, "BufferBinaryOptions")
-            if is_testnet_token:
-                transact(
-                    token_contract.address,
-                    token_contract.abi,
-                    "approveAddress",
-                    options.address,
+                pipeline.transact(
+                    option_config.address,
+                    option_config.abi,
+                    "setBoosterContract",
+                    booster,
                     sender=admin,
                 )
-        option_storage = deploy_contract(admin, network, OptionStorage, [])
-        market_oi_config = deploy_contract(
-            admin,
-            network,
-            MarketOIConfig,
-            [
-                asset_pair["max_market_oi"],
-                asset_pair["max_trade_size"],
+
+                if asset_pair["asset_category"] != 1:
+                    pipeline.transact(
+                        option_config.address,
+                        option_config.abi,
+                        "setCreationWindowContract",
+                        creation_window_address,
+                        sender=admin,
+                    )
+
+        ########### Deploy Options ###########
+        if not options_address and is_testnet_token:
+            transact(
+                token_contract.address,
+                token_contract.abi,
+                "approveAddress",
                 options.address,
-            ],
-        )
+                sender=admin,
+            )
         ########### Deploy Faucet ###########
         if not faucet_address and network.show_active() != mainnet:
             faucet = deploy_contract(
@@ -440,55 +422,56 @@ def main():
         UPDATOR_ROLE = pool_oi_storage.UPDATOR_ROLE()
         ADMIN_ROLE = account_registrar.ADMIN_ROLE()
 
-        transact(
-            account_registrar.address,
-            account_registrar.abi,
-            "grantRole",
-            ADMIN_ROLE,
-            router_contract_address,
-            sender=admin,
-        )
-        transact(
-            account_registrar.address,
-            account_registrar.abi,
-            "grantRole",
-            ADMIN_ROLE,
-            admin.address,
-            sender=admin,
-        )
-        transact(
-            pool.address,
-            pool.abi,
-            "grantRole",
-            OPTION_ISSUER_ROLE,
-            options.address,
-            sender=pool_admin,
-        )
-        transact(
-            options.address,
-            options.abi,
-            "grantRole",
-            ROUTER_ROLE,
-            router_contract_address,
-            sender=admin,
-        )
+        with TransactionPipeline() as pipeline:
+            pipeline.transact(
+                account_registrar.address,
+                account_registrar.abi,
+                "grantRole",
+                ADMIN_ROLE,
+                router_contract_address,
+                sender=admin,
+            )
+            pipeline.transact(
+                account_registrar.address,
+                account_registrar.abi,
+                "grantRole",
+                ADMIN_ROLE,
+                admin.address,
+                sender=admin,
+            )
+            pipeline.transact(
+                pool.address,
+                pool.abi,
+                "grantRole",
+                OPTION_ISSUER_ROLE,
+                options.address,
+                sender=pool_admin,
+            )
+            pipeline.transact(
+                options.address,
+                options.abi,
+                "grantRole",
+                ROUTER_ROLE,
+                router_contract_address,
+                sender=admin,
+            )
 
-        transact(
-            pool_oi_storage.address,
-            pool_oi_storage.abi,
-            "grantRole",
-            UPDATOR_ROLE,
-            options.address,
-            sender=admin,
-        )
-        transact(
-            router_contract.address,
-            router_contract.abi,
-            "setContractRegistry",
-            options.address,
-            True,
-            sender=admin,
-        )
+            pipeline.transact(
+                pool_oi_storage.address,
+                pool_oi_storage.abi,
+                "grantRole",
+                UPDATOR_ROLE,
+                options.address,
+                sender=admin,
+            )
+            pipeline.transact(
+                router_contract.address,
+                router_contract.abi,
+                "setContractRegistry",
+                options.address,
+                True,
+                sender=admin,
+            )
 
         ########### Approve the max amount ###########
 
@@ -514,91 +497,117 @@ def main():
         )
 
         ########### Setting configs ###########
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setOptionStorageContract",
-            option_storage.address,
-            sender=admin,
-        )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setPoolOIStorageContract",
-            pool_oi_storage.address,
-            sender=admin,
-        )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMarketOIConfigContract",
-            market_oi_config.address,
-            sender=admin,
-        )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setPoolOIConfigContract",
-            pool_oi_config.address,
-            sender=admin,
-        )
-        all_options.append(options.address)
-        all_configs.append(option_config.address)
-        print(f"{Fore.YELLOW}Deployed {pair} at {options.address} {Style.RESET_ALL} ")
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMinFee",
-            asset_pair["minFee"],
-            sender=admin,
-        )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setPlatformFee",
-            asset_pair["platformFee"],
-            sender=admin,
-        )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMinPeriod",
-            asset_pair["minPeriod"],
-            sender=admin,
-        )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMaxPeriod",
-            asset_pair["maxPeriod"],
-            sender=admin,
-        )
-        if asset_pair["is_early_close_allowed"]:
-            transact(
+        with TransactionPipeline() as pipeline:
+            pipeline.transact(
                 option_config.address,
                 option_config.abi,
-                "toggleEarlyClose",
+                "setOptionStorageContract",
+                option_storage.address,
                 sender=admin,
             )
-            if asset_pair["early_close_threshold"] != 60:
-                transact(
+            pipeline.transact(
+                option_config.address,
+                option_config.abi,
+                "setPoolOIStorageContract",
+                pool_oi_storage.address,
+                sender=admin,
+            )
+            pipeline.transact(
+                option_config.address,
+                option_config.abi,
+                "setMarketOIConfigContract",
+                market_oi_config.address,
+                sender=admin,
+            )
+            pipeline.transact(
+                option_config.address,
+                option_config.abi,
+                "setPoolOIConfigContract",
+                pool_oi_config.address,
+                sender=admin,
+            )
+            market_addresses[pair] = {
+                "options": options.address,
+                "config": option_config.address,
+                "market_oi_config": market_oi_config.address,
+                "option_storage": option_storage.address,
+            }
+            print(
+                f"{Fore.YELLOW}Deployed {pair} at {options.address} {Style.RESET_ALL} "
+            )
+            pipeline.transact(
+                option_config.address,
+                option_config.abi,
+                "setMinFee",
+                asset_pair["minFee"],
+                sender=admin,
+            )
+            pipeline.transact(
+                option_config.address,
+                option_config.abi,
+                "setPlatformFee",
+                asset_pair["platformFee"],
+                sender=admin,
+            )
+            if asset_pair["is_early_close_allowed"]:
+                pipeline.transact(
                     option_config.address,
                     option_config.abi,
-                    "setEarlyCloseThreshold",
-                    asset_pair["early_close_threshold"],
+                    "toggleEarlyClose",
                     sender=admin,
                 )
+                if asset_pair["early_close_threshold"] != 60:
+                    pipeline.transact(
+                        option_config.address,
+                        option_config.abi,
+                        "setEarlyCloseThreshold",
+                        asset_pair["early_close_threshold"],
+                        sender=admin,
+                    )
+        # setMaxPeriod checks against the minPeriod on chain, the period
+        # setters are sent one after the other in the order of diff_config
+        reconcile_configs(
+            brownie.network.web3,
+            option_config.abi,
+            {
+                option_config.address: {
+                    "minPeriod": asset_pair["minPeriod"],
+                    "maxPeriod": asset_pair["maxPeriod"],
+                }
+            },
+            sender=admin,
+        )
 
-    option_data = []
-    assets = [x["token1"] + x["token2"] for x in asset_pairs]
-    for x, y in zip(all_options, all_configs):
-        option_data.append({"option": x, "config": y})
+    for asset_pair in asset_pairs:
+        pair = pair_name(asset_pair)
+        if pair not in market_addresses:
+            market_addresses[pair] = applied.contracts(pair)
+        if applied:
+            applied.record(asset_pair, market_addresses[pair])
+    for pair in changes.removed:
+        print(
+            f"{Fore.RED}{pair} is no longer in the catalog, its contracts are "
+            f"left as they are{Style.RESET_ALL}"
+        )
+        applied.remove(pair)
+    if applied:
+        applied.save(catalog.version)
+
+    assets = list(market_addresses)
+    option_data = [
+        {
+            "option": market_addresses[asset]["options"],
+            "config": market_addresses[asset]["config"],
+        }
+        for asset in assets
+    ]
+    last_asset = assets[-1]
 
     all_contractss = {
         "pool": pool.address,
         "options": dict(zip(assets, option_data)),
         "meta": option_reader_address,
-        "faucet": faucet.address if network.show_active() != mainnet else "",
+        "faucet": faucet_address if network.show_active() != mainnet else "",
         "router": router_contract.address,
         "token": token_contract_address,
         "nft": nft_contract_address,
@@ -606,10 +615,45 @@ def main():
         "sfd": sfd,
         "pool_oi_storage": pool_oi_storage.address,
         "pool_oi_config": pool_oi_config.address,
-        "market_oi_config": market_oi_config.address,
-        "option_storage": option_storage.address,
+        "market_oi_config": market_addresses[last_asset]["market_oi_config"],
+        "option_storage": market_addresses[last_asset]["option_storage"],
         "account_registrar": account_registrar.address,
         "booster": booster,
     }
 
     print(all_contractss)
+
+    # Machine-readable version of the above for keepers and front ends, see
+    # manifest.py
+    market_containers = {
+        "options": BufferBinaryOptions,
+        "config": OptionsConfig,
+        "market_oi_config": MarketOIConfig,
+        "option_storage": OptionStorage,
+    }
+    save_manifest(
+        network.show_active(),
+        {
+            "pool": (BufferBinaryPool, pool.address),
+            "router": (BufferRouter, router_contract.address),
+            "referral_storage": (ReferralStorage, referral_storage_address),
+            "faucet": (Faucet, all_contractss["faucet"]),
+            "token": (FakeToken, token_contract_address),
+            "nft": (TraderNFT, nft_contract_address),
+            "creation_window": (CreationWindow, creation_window_address),
+            "pool_oi_storage": (PoolOIStorage, pool_oi_storage.address),
+            "pool_oi_config": (PoolOIConfig, pool_oi_config.address),
+            "account_registrar": (AccountRegistrar, account_registrar.address),
+            "booster": (Booster, booster),
+        },
+        {
+            asset: {
+                name: (market_containers[name], address)
+                for name, address in addresses.items()
+            }
+            for asset, addresses in market_addresses.items()
+        },
+    )
+    finish_journal()
+    print(rpc_report())
+    print(tracer.summary())
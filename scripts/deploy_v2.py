@@ -21,6 +21,8 @@ from brownie import (
     Faucet,
     AccountRegistrar,
     Booster,
+    BatchExecutor,
+    MarketFactory,
     accounts,
     network,
 )
@@ -28,7 +30,33 @@ from colorama import Fore, Style
 from eth_account import Account
 from eth_account.messages import encode_defunct
 
-from .utility import deploy_contract, save_flat, transact
+from .create2 import market_salt
+from .deploy_graph import DeploymentGraph
+from .market_catalog import (
+    MARKET_CONTRACTS,
+    AppliedMarkets,
+    diff_markets,
+    load_catalog,
+    pair_name,
+)
+from .reconcile import reconfigure_market
+from .utility import (
+    TransactionPipeline,
+    batch_transact,
+    deploy_contract,
+    encode_call,
+    finish_journal,
+    record_bundle,
+    retry_policy,
+    rpc_report,
+    save_flat,
+    save_manifest,
+    tracer,
+    transact,
+    use_journal,
+    use_pooled_provider,
+    use_tracer,
+)
 
 
 def get_signature(timestamp, token, price, publisher):
@@ -67,92 +95,9 @@ def main():
     pool_oi_storage = None
     pool_oi_config = None
 
-    asset_pairs = [
-        {
-            "token1": "BTC",
-            "token2": "USD",
-            "full_name": "Bitcoin",
-            "asset_category": 1,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "ETH",
-            "token2": "USD",
-            "full_name": "Ethereum",
-            "asset_category": 1,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "EUR",
-            "token2": "USD",
-            "full_name": "Euro",
-            "asset_category": 0,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "GBP",
-            "token2": "USD",
-            "full_name": "Pound",
-            "asset_category": 0,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "XAU",
-            "token2": "USD",
-            "full_name": "Gold",
-            "asset_category": 2,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-        {
-            "token1": "XAG",
-            "token2": "USD",
-            "full_name": "Silver",
-            "asset_category": 2,
-            "minFee": int(1e6),
-            "platformFee": int(1e5),
-            "minPeriod": 3 * 60,
-            "maxPeriod": 4 * 60 * 60,
-            "max_trade_size": int(1000e6),
-            "max_market_oi": int(50000e6),
-            "is_early_close_allowed": True,
-            "early_close_threshold": 60,
-        },
-    ]
+    # The markets and their parameters come from the shared catalog
+    catalog = load_catalog()
+    asset_pairs = catalog.asset_pairs(os.environ.get("POOL_TOKEN", "USDC"))
     initialLiquidityForTestnet = int(499999.786093e6)
     if network.show_active() == "development":
         allow_revert = True
@@ -236,6 +181,24 @@ def main():
     print(pool_admin, admin)
     print(pool_admin.balance() / 1e18, admin.balance() / 1e18)
 
+    # TRACE=<path> writes the timing, gas and attempts of every step as JSON lines
+    if os.environ.get("TRACE"):
+        use_tracer(os.environ["TRACE"])
+
+    # Keep-alive connections, concurrent reads are batched into one request
+    use_pooled_provider()
+
+    # With BUNDLE=<path> on a fork of the target network every transaction is
+    # recorded, signed for the target network, into a bundle that
+    # `brownie run scripts/bundle.py broadcast` sends later as a burst
+    bundle = None
+    if os.environ.get("BUNDLE"):
+        bundle = record_bundle(os.environ["BUNDLE"])
+    # RESUME=<run id> resumes a partially failed run instead of redeploying
+    # everything
+    elif network.show_active() != "development":
+        use_journal("deploy_v2", network.show_active(), os.environ.get("RESUME"))
+
     ########### Get TokenX ###########
     if not token_contract_address:
         token_contract = deploy_contract(
@@ -420,69 +383,139 @@ def main():
     # else:
     #     nft_contract = TraderNFT.at(nft_contract_address)
 
-    all_options = []
-    all_configs = []
-    for asset_pair in asset_pairs:
-        pair = asset_pair["token1"] + asset_pair["token2"]
+    ########### Shared steps ###########
+    # Everything below is described as a graph of steps. Steps of different
+    # markets don't depend on each other and run in parallel.
 
-        ########### Get Options Config ###########
+    graph = DeploymentGraph()
 
-        if option_config_address:
-            option_config = OptionsConfig.at(option_config_address)
-        else:
-            option_config = deploy_contract(
-                admin,
-                network,
-                OptionsConfig,
-                [
-                    pool_address,
-                ],
-            )
-            transact(
-                option_config.address,
-                option_config.abi,
-                "setSettlementFeeDisbursalContract",
-                sfd,
-                sender=admin,
-            )
+    def get_referral_storage(results):
+        if referral_storage_address:
+            return ReferralStorage.at(referral_storage_address)
+        referral_storage = deploy_contract(admin, network, ReferralStorage, [])
+        transact(
+            referral_storage.address,
+            referral_storage.abi,
+            "setConfigure",
+            referrerTierStep,
+            referrerTierDiscount,
+            sender=admin,
+        )
+        return referral_storage
+
+    def get_faucet(results):
+        if network.show_active() == mainnet:
+            return None
+        if faucet_address:
+            return Faucet.at(faucet_address)
+        faucet = deploy_contract(
+            admin,
+            network,
+            Faucet,
+            [token_contract_address, admin.address, 1683475200],
+        )
+        transact(
+            token_contract.address,
+            token_contract.abi,
+            "transfer",
+            faucet.address,
+            int(1e12),
+            sender=admin,
+        )
+        if is_testnet_token:
             transact(
-                option_config.address,
-                option_config.abi,
-                "setBoosterContract",
-                booster,
+                token_contract.address,
+                token_contract.abi,
+                "approveAddress",
+                faucet.address,
                 sender=admin,
             )
+        return faucet
 
-            if asset_pair["asset_category"] != 1:
-                transact(
-                    option_config.address,
-                    option_config.abi,
-                    "setCreationWindowContract",
-                    creation_window_address,
+    def grant_registrar_roles(results):
+        ADMIN_ROLE = account_registrar.ADMIN_ROLE()
+        with TransactionPipeline() as pipeline:
+            for account in [router_contract_address, admin.address]:
+                pipeline.transact(
+                    account_registrar.address,
+                    account_registrar.abi,
+                    "grantRole",
+                    ADMIN_ROLE,
+                    account,
                     sender=admin,
                 )
 
-        ########### Deploy referral storage ###########
+    graph.add("referral_storage", get_referral_storage)
+    graph.add("faucet", get_faucet)
+    graph.add("registrar_roles", grant_registrar_roles)
 
-        if referral_storage_address:
-            referral_storage = ReferralStorage.at(referral_storage_address)
-        else:
-            referral_storage = deploy_contract(admin, network, ReferralStorage, [])
-            referral_storage_address = referral_storage.address
+    ########### Market steps ###########
+
+    def add_market_steps(asset_pair):
+        pair = pair_name(asset_pair)
+
+        def create_market(results):
+            factory = results["market_factory"]
+            params = (
+                market_salt(asset_pair["token1"], asset_pair["token2"]),
+                asset_pair["token1"],
+                asset_pair["token2"],
+                asset_pair["asset_category"],
+                asset_pair["max_market_oi"],
+                asset_pair["max_trade_size"],
+                asset_pair["minFee"],
+                asset_pair["platformFee"],
+                asset_pair["minPeriod"],
+                asset_pair["maxPeriod"],
+                asset_pair["is_early_close_allowed"],
+                asset_pair["early_close_threshold"],
+            )
             transact(
-                referral_storage.address,
-                referral_storage.abi,
-                "setConfigure",
-                referrerTierStep,
-                referrerTierDiscount,
+                factory.address,
+                factory.abi,
+                "createMarket",
+                params,
+                options_code,
                 sender=admin,
             )
+            options, config, market_oi_config, option_storage = factory.computeMarket(
+                params
+            )
+            if is_testnet_token:
+                transact(
+                    token_contract.address,
+                    token_contract.abi,
+                    "approveAddress",
+                    options,
+                    sender=admin,
+                )
+            print(f"{Fore.YELLOW}Deployed {pair} at {options} {Style.RESET_ALL} ")
+            return {
+                "options": BufferBinaryOptions.at(options),
+                "config": OptionsConfig.at(config),
+                "market_oi_config": MarketOIConfig.at(market_oi_config),
+                "option_storage": OptionStorage.at(option_storage),
+            }
 
-        ########### Deploy Options ###########
-        if options_address:
-            options = BufferBinaryOptions.at(options_address)
+        if use_market_factory:
+            graph.add(f"{pair}:market", create_market, deps=["market_factory"])
+            return None, [f"{pair}:market"]
 
-        else:
+        def get_options_config(results):
+            if option_config_address:
+                return OptionsConfig.at(option_config_address)
+            return deploy_contract(
+                admin,
+                network,
+                OptionsConfig,
+                [
+                    pool_address,
+                ],
+            )
+
+        def get_options(results):
+            if options_address:
+                return BufferBinaryOptions.at(options_address)
             options = deploy_contract(
                 admin,
                 network,
@@ -498,214 +531,497 @@ def main():
                     options.address,
                     sender=admin,
                 )
-        option_storage = deploy_contract(admin, network, OptionStorage, [])
-        market_oi_config = deploy_contract(
-            admin,
-            network,
-            MarketOIConfig,
-            [
-                asset_pair["max_market_oi"],
-                asset_pair["max_trade_size"],
-                options.address,
-            ],
-        )
-        ########### Deploy Faucet ###########
-        if not faucet_address and network.show_active() != mainnet:
-            faucet = deploy_contract(
+            return options
+
+        def deploy_option_storage(results):
+            return deploy_contract(admin, network, OptionStorage, [])
+
+        def deploy_market_oi_config(results):
+            return deploy_contract(
                 admin,
                 network,
-                Faucet,
-                [token_contract_address, admin.address, 1683475200],
+                MarketOIConfig,
+                [
+                    asset_pair["max_market_oi"],
+                    asset_pair["max_trade_size"],
+                    results[f"{pair}:options"].address,
+                ],
             )
-            transact(
-                token_contract.address,
-                token_contract.abi,
-                "transfer",
-                faucet.address,
-                int(1e12),
-                sender=admin,
+
+        # The admin calls of the market setup as (contract, method, args), sent
+        # either one transaction each or batched through the BatchExecutor
+
+        ########### Grant Roles ###########
+
+        def role_calls(results):
+            options = results[f"{pair}:options"]
+            return [
+                (
+                    options,
+                    "grantRole",
+                    [options.ROUTER_ROLE(), router_contract_address],
+                ),
+                (
+                    pool_oi_storage,
+                    "grantRole",
+                    [pool_oi_storage.UPDATOR_ROLE(), options.address],
+                ),
+                (router_contract, "setContractRegistry", [options.address, True]),
+            ]
+
+        def grant_pool_role(pipeline, results):
+            # The pool is administered by the pool admin, never by the executor
+            pipeline.transact(
+                pool.address,
+                pool.abi,
+                "grantRole",
+                pool.OPTION_ISSUER_ROLE(),
+                results[f"{pair}:options"].address,
+                sender=pool_admin,
             )
 
-            if is_testnet_token:
-                transact(
-                    token_contract.address,
-                    token_contract.abi,
-                    "approveAddress",
-                    faucet.address,
-                    sender=admin,
+        ########### Approve the max amount ###########
+
+        def initialize_calls(results):
+            options = results[f"{pair}:options"]
+            return [
+                (
+                    options,
+                    "initialize",
+                    [
+                        token_contract_address,
+                        pool_address,
+                        results[f"{pair}:config"].address,
+                        results["referral_storage"].address,
+                        asset_pair["asset_category"],
+                        asset_pair["token1"],
+                        asset_pair["token2"],
+                    ],
+                ),
+                (options, "approvePoolToTransferTokenX", []),
+            ]
+
+        ########### Setting configs ###########
+
+        def config_calls(results):
+            option_config = results[f"{pair}:config"]
+            calls = [
+                (option_config, "setSettlementFeeDisbursalContract", [sfd]),
+                (option_config, "setBoosterContract", [booster]),
+            ]
+            if asset_pair["asset_category"] != 1:
+                calls.append(
+                    (
+                        option_config,
+                        "setCreationWindowContract",
+                        [creation_window_address],
+                    )
                 )
-            faucet_address = faucet.address
-        elif network.show_active() != mainnet:
-            faucet = Faucet.at(faucet_address)
+            calls += [
+                (
+                    option_config,
+                    "setOptionStorageContract",
+                    [results[f"{pair}:option_storage"].address],
+                ),
+                (option_config, "setPoolOIStorageContract", [pool_oi_storage.address]),
+                (
+                    option_config,
+                    "setMarketOIConfigContract",
+                    [results[f"{pair}:market_oi_config"].address],
+                ),
+                (option_config, "setPoolOIConfigContract", [pool_oi_config.address]),
+                (option_config, "setMinFee", [asset_pair["minFee"]]),
+                (option_config, "setPlatformFee", [asset_pair["platformFee"]]),
+                (option_config, "setMinPeriod", [asset_pair["minPeriod"]]),
+                (option_config, "setMaxPeriod", [asset_pair["maxPeriod"]]),
+            ]
+            if asset_pair["is_early_close_allowed"]:
+                calls.append((option_config, "toggleEarlyClose", []))
+                if asset_pair["early_close_threshold"] != 60:
+                    calls.append(
+                        (
+                            option_config,
+                            "setEarlyCloseThreshold",
+                            [asset_pair["early_close_threshold"]],
+                        )
+                    )
+            return calls
 
-        ########### Grant Roles ###########
+        def grant_roles(results):
+            with TransactionPipeline() as pipeline:
+                grant_pool_role(pipeline, results)
+                for contract, method, args in role_calls(results):
+                    pipeline.transact(
+                        contract.address, contract.abi, method, *args, sender=admin
+                    )
 
-        OPTION_ISSUER_ROLE = pool.OPTION_ISSUER_ROLE()
-        ROUTER_ROLE = options.ROUTER_ROLE()
-        UPDATOR_ROLE = pool_oi_storage.UPDATOR_ROLE()
-        ADMIN_ROLE = account_registrar.ADMIN_ROLE()
+        def initialize_options(results):
+            # approvePoolToTransferTokenX needs the initialized pool
+            for contract, method, args in initialize_calls(results):
+                transact(contract.address, contract.abi, method, *args, sender=admin)
 
-        transact(
-            account_registrar.address,
-            account_registrar.abi,
-            "grantRole",
-            ADMIN_ROLE,
-            router_contract_address,
-            sender=admin,
-        )
-        transact(
-            account_registrar.address,
-            account_registrar.abi,
-            "grantRole",
-            ADMIN_ROLE,
-            admin.address,
-            sender=admin,
-        )
-        transact(
-            pool.address,
-            pool.abi,
-            "grantRole",
-            OPTION_ISSUER_ROLE,
-            options.address,
-            sender=pool_admin,
-        )
-        transact(
-            options.address,
-            options.abi,
-            "grantRole",
-            ROUTER_ROLE,
-            router_contract_address,
-            sender=admin,
+        def set_configs(results):
+            with TransactionPipeline() as pipeline:
+                for contract, method, args in config_calls(results):
+                    pipeline.transact(
+                        contract.address, contract.abi, method, *args, sender=admin
+                    )
+            print(
+                f"{Fore.YELLOW}Deployed {pair} at {results[f'{pair}:options'].address} {Style.RESET_ALL} "
+            )
+
+        def hand_over_to_executor(results):
+            executor = results["batch_executor"]
+            options = results[f"{pair}:options"]
+            option_config = results[f"{pair}:config"]
+            with TransactionPipeline() as pipeline:
+                grant_pool_role(pipeline, results)
+                pipeline.transact(
+                    options.address,
+                    options.abi,
+                    "grantRole",
+                    options.DEFAULT_ADMIN_ROLE(),
+                    executor.address,
+                    sender=admin,
+                )
+                pipeline.transact(
+                    option_config.address,
+                    option_config.abi,
+                    "transferOwnership",
+                    executor.address,
+                    sender=admin,
+                )
+
+        def batched_calls(results):
+            # Ordered: the options have to be initialized before the pool
+            # approval, the rest is independent
+            executor = results["batch_executor"]
+            options = results[f"{pair}:options"]
+            option_config = results[f"{pair}:config"]
+            return (
+                initialize_calls(results)
+                + role_calls(results)
+                + config_calls(results)
+                + [
+                    (option_config, "transferOwnership", [admin.address]),
+                    (
+                        options,
+                        "renounceRole",
+                        [options.DEFAULT_ADMIN_ROLE(), executor.address],
+                    ),
+                ]
+            )
+
+        graph.add(f"{pair}:config", get_options_config)
+        graph.add(f"{pair}:options", get_options)
+        graph.add(f"{pair}:option_storage", deploy_option_storage)
+        graph.add(
+            f"{pair}:market_oi_config",
+            deploy_market_oi_config,
+            deps=[f"{pair}:options"],
         )
+        if use_batch_executor:
+            graph.add(
+                f"{pair}:handover",
+                hand_over_to_executor,
+                deps=[f"{pair}:options", f"{pair}:config", "batch_executor"],
+            )
+            return batched_calls, [
+                f"{pair}:handover",
+                f"{pair}:option_storage",
+                f"{pair}:market_oi_config",
+            ]
 
-        transact(
-            pool_oi_storage.address,
-            pool_oi_storage.abi,
-            "grantRole",
-            UPDATOR_ROLE,
-            options.address,
-            sender=admin,
+        graph.add(f"{pair}:roles", grant_roles, deps=[f"{pair}:options"])
+        graph.add(
+            f"{pair}:initialize",
+            initialize_options,
+            deps=[f"{pair}:options", f"{pair}:config", "referral_storage"],
         )
-        transact(
-            router_contract.address,
-            router_contract.abi,
-            "setContractRegistry",
-            options.address,
-            True,
-            sender=admin,
+        graph.add(
+            f"{pair}:set_configs",
+            set_configs,
+            deps=[
+                f"{pair}:config",
+                f"{pair}:option_storage",
+                f"{pair}:market_oi_config",
+            ],
         )
+        return None, []
 
-        ########### Approve the max amount ###########
+    ########### Batched market setup ###########
+    # With BATCH_EXECUTOR=1 the admin setup of all markets is sent as
+    # BatchExecutor.execute batches instead of ~15 transactions per market.
+    # The executor only holds the admin roles/ownership for the duration of
+    # the setup and hands them back in the last batch, or in
+    # release_batch_executor when the setup failed.
 
-        transact(
-            options.address,
-            options.abi,
-            "initialize",
-            token_contract_address,
-            pool_address,
-            option_config.address,
-            referral_storage_address,
-            asset_pair["asset_category"],
-            asset_pair["token1"],
-            asset_pair["token2"],
-            sender=admin,
-        )
+    def deploy_batch_executor(results):
+        executor = deploy_contract(admin, network, BatchExecutor, [])
+        try:
+            with TransactionPipeline() as pipeline:
+                for contract in [router_contract, pool_oi_storage]:
+                    pipeline.transact(
+                        contract.address,
+                        contract.abi,
+                        "grantRole",
+                        contract.DEFAULT_ADMIN_ROLE(),
+                        executor.address,
+                        sender=admin,
+                    )
+        except Exception:
+            # The finalizer doesn't run without this step's result
+            release_batch_executor({"batch_executor": executor})
+            raise
+        return executor
 
-        transact(
-            options.address,
-            options.abi,
-            "approvePoolToTransferTokenX",
+    def run_batched_setup(results):
+        executor = results["batch_executor"]
+        calls = []
+        for market_calls in batched_calls:
+            calls += market_calls(results)
+        calls += [
+            (
+                contract,
+                "renounceRole",
+                [contract.DEFAULT_ADMIN_ROLE(), executor.address],
+            )
+            for contract in [router_contract, pool_oi_storage]
+        ]
+        txn_hashes = batch_transact(
+            executor,
+            [
+                encode_call(contract.address, contract.abi, method, *args)
+                for contract, method, args in calls
+            ],
             sender=admin,
+            batch_size=batch_size,
+        )
+        print(
+            f"{Fore.YELLOW}Set up {len(batched_calls)} markets with {len(calls)} calls "
+            f"in {len(txn_hashes)} transactions{Style.RESET_ALL}"
         )
 
-        ########### Setting configs ###########
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setOptionStorageContract",
-            option_storage.address,
+    def release_batch_executor(results):
+        executor = results["batch_executor"]
+        calls = []
+        for pair in changes.added:
+            options = results.get(f"{pair}:options")
+            option_config = results.get(f"{pair}:config")
+            if option_config and option_config.owner() == executor.address:
+                calls.append((option_config, "transferOwnership", [admin.address]))
+            if options and options.hasRole(
+                options.DEFAULT_ADMIN_ROLE(), executor.address
+            ):
+                calls.append(
+                    (
+                        options,
+                        "renounceRole",
+                        [options.DEFAULT_ADMIN_ROLE(), executor.address],
+                    )
+                )
+        for contract in [router_contract, pool_oi_storage]:
+            if contract.hasRole(contract.DEFAULT_ADMIN_ROLE(), executor.address):
+                calls.append(
+                    (
+                        contract,
+                        "renounceRole",
+                        [contract.DEFAULT_ADMIN_ROLE(), executor.address],
+                    )
+                )
+        if not calls:
+            return
+        batch_transact(
+            executor,
+            [
+                encode_call(contract.address, contract.abi, method, *args)
+                for contract, method, args in calls
+            ],
             sender=admin,
         )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setPoolOIStorageContract",
-            pool_oi_storage.address,
-            sender=admin,
+        print(
+            f"{Fore.YELLOW}Took back {len(calls)} roles/ownerships from the "
+            f"batch executor{Style.RESET_ALL}"
         )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMarketOIConfigContract",
-            market_oi_config.address,
-            sender=admin,
-        )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setPoolOIConfigContract",
-            pool_oi_config.address,
-            sender=admin,
+
+    ########### Market factory ###########
+    # With MARKET_FACTORY=1 every market is deployed, initialized, configured
+    # and granted its roles by a single MarketFactory.createMarket transaction.
+    # The factory holds the admin role of the pool, router and pool OI storage
+    # only while the markets are created.
+
+    factory_admins = [
+        (pool, pool_admin),
+        (router_contract, admin),
+        (pool_oi_storage, admin),
+    ]
+
+    def deploy_market_factory(results):
+        factory = deploy_contract(
+            admin,
+            network,
+            MarketFactory,
+            [
+                (
+                    token_contract_address,
+                    pool_address,
+                    results["referral_storage"].address,
+                    router_contract_address,
+                    pool_oi_storage.address,
+                    pool_oi_config.address,
+                    sfd,
+                    booster,
+                    creation_window_address,
+                ),
+                brownie.network.web3.keccak(hexstr=options_code),
+            ],
         )
-        all_options.append(options.address)
-        all_configs.append(option_config.address)
-        print(f"{Fore.YELLOW}Deployed {pair} at {options.address} {Style.RESET_ALL} ")
+        try:
+            with TransactionPipeline() as pipeline:
+                for contract, contract_admin in factory_admins:
+                    pipeline.transact(
+                        contract.address,
+                        contract.abi,
+                        "grantRole",
+                        contract.DEFAULT_ADMIN_ROLE(),
+                        factory.address,
+                        sender=contract_admin,
+                    )
+        except Exception:
+            # Some of the roles may have been granted, revoking is a no-op
+            # for the others
+            revoke_market_factory({"market_factory": factory})
+            raise
+        return factory
 
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMinFee",
-            asset_pair["minFee"],
-            sender=admin,
+    def revoke_market_factory(results):
+        factory = results["market_factory"]
+        with TransactionPipeline() as pipeline:
+            for contract, contract_admin in factory_admins:
+                pipeline.transact(
+                    contract.address,
+                    contract.abi,
+                    "revokeRole",
+                    contract.DEFAULT_ADMIN_ROLE(),
+                    factory.address,
+                    sender=contract_admin,
+                )
+
+    ########### Catalog changes ###########
+    # Only the markets that changed since the catalog was last applied to this
+    # pool are deployed (added) or reconfigured (changed), the others are kept
+
+    applied = None
+    if network.show_active() != "development":
+        applied = AppliedMarkets(network.show_active(), pool_address)
+        changes = applied.changes(asset_pairs)
+    else:
+        changes = diff_markets([], asset_pairs)
+    print(changes.summary())
+
+    def add_reconfigure_step(asset_pair):
+        pair = pair_name(asset_pair)
+
+        def reconfigure(results):
+            reconfigure_market(
+                brownie.network.web3,
+                asset_pair,
+                applied.contracts(pair),
+                changes.changed[pair],
+                admin,
+                OptionsConfig.abi,
+                MarketOIConfig.abi,
+            )
+
+        graph.add(f"{pair}:reconfigure", reconfigure)
+
+    use_market_factory = os.environ.get("MARKET_FACTORY") == "1" and bool(changes.added)
+    use_batch_executor = (
+        os.environ.get("BATCH_EXECUTOR") == "1"
+        and bool(changes.added)
+        and not use_market_factory
+    )
+    batch_size = int(os.environ.get("BATCH_SIZE", 0)) or None
+    options_code = BufferBinaryOptions.bytecode
+    if not options_code.startswith("0x"):
+        options_code = "0x" + options_code
+    if use_batch_executor:
+        graph.add("batch_executor", deploy_batch_executor)
+    if use_market_factory:
+        graph.add("market_factory", deploy_market_factory, deps=["referral_storage"])
+
+    batched_calls = []
+    market_deps = []
+    for asset_pair in asset_pairs:
+        if pair_name(asset_pair) in changes.changed:
+            add_reconfigure_step(asset_pair)
+        if pair_name(asset_pair) not in changes.added:
+            continue
+        market_calls, deps = add_market_steps(asset_pair)
+        if market_calls:
+            batched_calls.append(market_calls)
+        market_deps += deps
+    if use_market_factory:
+        # Also runs when a createMarket step failed, the factory mustn't keep
+        # its roles on the live pool and router
+        graph.add_finalizer(
+            "revoke_market_factory", revoke_market_factory, deps=["market_factory"]
         )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setPlatformFee",
-            asset_pair["platformFee"],
-            sender=admin,
+    if use_batch_executor:
+        graph.add(
+            "batched_setup",
+            run_batched_setup,
+            deps=market_deps + ["referral_storage"],
         )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMinPeriod",
-            asset_pair["minPeriod"],
-            sender=admin,
+        # Also runs when a hand over or batch failed, the executor mustn't
+        # keep the admin roles of the router, pool OI storage and markets
+        graph.add_finalizer(
+            "release_batch_executor", release_batch_executor, deps=["batch_executor"]
         )
-        transact(
-            option_config.address,
-            option_config.abi,
-            "setMaxPeriod",
-            asset_pair["maxPeriod"],
-            sender=admin,
+
+    results = graph.run()
+    if use_market_factory:
+        for pair in changes.added:
+            for name, contract in results.pop(f"{pair}:market").items():
+                results[f"{pair}:{name}"] = contract
+
+    market_addresses = {}
+    for asset_pair in asset_pairs:
+        pair = pair_name(asset_pair)
+        if pair in changes.added:
+            market_addresses[pair] = {
+                name: results[f"{pair}:{name}"].address for name in MARKET_CONTRACTS
+            }
+        else:
+            market_addresses[pair] = applied.contracts(pair)
+        if applied:
+            applied.record(asset_pair, market_addresses[pair])
+    for pair in changes.removed:
+        print(
+            f"{Fore.RED}{pair} is no longer in the catalog, its contracts are "
+            f"left as they are{Style.RESET_ALL}"
         )
-        if asset_pair["is_early_close_allowed"]:
-            transact(
-                option_config.address,
-                option_config.abi,
-                "toggleEarlyClose",
-                sender=admin,
-            )
-            if asset_pair["early_close_threshold"] != 60:
-                transact(
-                    option_config.address,
-                    option_config.abi,
-                    "setEarlyCloseThreshold",
-                    asset_pair["early_close_threshold"],
-                    sender=admin,
-                )
+        applied.remove(pair)
+    # A bundle is only recorded here, it is applied once it's broadcast
+    if applied and not bundle:
+        applied.save(catalog.version)
 
-    option_data = []
-    assets = [x["token1"] + x["token2"] for x in asset_pairs]
-    for x, y in zip(all_options, all_configs):
-        option_data.append({"option": x, "config": y})
+    assets = list(market_addresses)
+    option_data = [
+        {
+            "option": market_addresses[asset]["options"],
+            "config": market_addresses[asset]["config"],
+        }
+        for asset in assets
+    ]
+    last_asset = assets[-1]
 
     all_contractss = {
         "pool": pool.address,
         "options": dict(zip(assets, option_data)),
-        "referral_storage": referral_storage.address,
+        "referral_storage": results["referral_storage"].address,
         "meta": option_reader_address,
-        "faucet": faucet.address if network.show_active() != mainnet else "",
+        "faucet": results["faucet"].address if network.show_active() != mainnet else "",
         "router": router_contract.address,
         "token": token_contract_address,
         "nft": nft_contract_address,
@@ -713,10 +1029,52 @@ def main():
         "sfd": sfd,
         "pool_oi_storage": pool_oi_storage.address,
         "pool_oi_config": pool_oi_config.address,
-        "market_oi_config": market_oi_config.address,
-        "option_storage": option_storage.address,
+        "market_oi_config": market_addresses[last_asset]["market_oi_config"],
+        "option_storage": market_addresses[last_asset]["option_storage"],
         "account_registrar": account_registrar.address,
         "booster": booster,
     }
 
     print(all_contractss)
+
+    # Machine-readable version of the above for keepers and front ends, see
+    # manifest.py
+    market_containers = {
+        "options": BufferBinaryOptions,
+        "config": OptionsConfig,
+        "market_oi_config": MarketOIConfig,
+        "option_storage": OptionStorage,
+    }
+    if not bundle:
+        save_manifest(
+            network.show_active(),
+            {
+                "pool": (BufferBinaryPool, pool.address),
+                "router": (BufferRouter, router_contract.address),
+                "referral_storage": (
+                    ReferralStorage,
+                    all_contractss["referral_storage"],
+                ),
+                "faucet": (Faucet, all_contractss["faucet"]),
+                "token": (FakeToken, token_contract_address),
+                "nft": (TraderNFT, nft_contract_address),
+                "creation_window": (CreationWindow, creation_window_address),
+                "pool_oi_storage": (PoolOIStorage, pool_oi_storage.address),
+                "pool_oi_config": (PoolOIConfig, pool_oi_config.address),
+                "account_registrar": (AccountRegistrar, account_registrar.address),
+                "booster": (Booster, booster),
+            },
+            {
+                asset: {
+                    name: (market_containers[name], address)
+                    for name, address in addresses.items()
+                }
+                for asset, addresses in market_addresses.items()
+            },
+        )
+    finish_journal()
+    print(retry_policy.report())
+    print(rpc_report())
+    print(tracer.summary())
+    if bundle:
+        bundle.save()
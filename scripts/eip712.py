@@ -0,0 +1,166 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from eth_abi import encode_abi
+from eth_keys import keys
+from eth_utils import keccak, to_bytes
+
+DOMAIN_TYPE = (
+    "EIP712Domain(string name,string version,uint256 chainId,"
+    "address verifyingContract)"
+)
+DOMAIN_TYPE_HASH = keccak(text=DOMAIN_TYPE)
+
+Signature = namedtuple("Signature", ["v", "r", "s", "signature"])
+
+
+class Struct:
+    """
+    An EIP-712 struct type compiled once: the type string and its hash are
+    computed up front, so hashing a message only ABI encodes its fields.
+    Only atomic fields plus string and bytes are supported, which covers every
+    struct Validator.sol verifies.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        for field, field_type in fields:
+            if field_type.endswith("]") or field_type[0].isupper():
+                raise ValueError(f"{name}.{field}: {field_type} is not supported")
+        self.encode_type = f"{name}({','.join(f'{t} {field}' for field, t in fields)})"
+        self.type_hash = keccak(text=self.encode_type)
+        self._names = [field for field, _ in fields]
+        self._dynamic = [t in ("string", "bytes") for _, t in fields]
+        self._abi_types = ["bytes32"] + [
+            "bytes32" if dynamic else t
+            for (_, t), dynamic in zip(fields, self._dynamic)
+        ]
+
+    def hash(self, message):
+        """hashStruct(message), message is a dict or a sequence in field order"""
+        values = (
+            [message[name] for name in self._names]
+            if isinstance(message, dict)
+            else list(message)
+        )
+        for i, dynamic in enumerate(self._dynamic):
+            if dynamic:
+                value = values[i]
+                values[i] = keccak(value.encode() if isinstance(value, str) else value)
+        return keccak(encode_abi(self._abi_types, [self.type_hash] + values))
+
+
+# The structs of Validator.sol, field for field
+USER_TRADE_FIELDS = [
+    ("user", "address"),
+    ("totalFee", "uint256"),
+    ("period", "uint256"),
+    ("targetContract", "address"),
+    ("strike", "uint256"),
+    ("slippage", "uint256"),
+    ("allowPartialFill", "bool"),
+    ("referralCode", "string"),
+    ("traderNFTId", "uint256"),
+]
+USER_TRADE = Struct(
+    "UserTradeSignature", USER_TRADE_FIELDS + [("timestamp", "uint256")]
+)
+USER_TRADE_WITH_SF = Struct(
+    "UserTradeSignatureWithSettlementFee",
+    USER_TRADE_FIELDS + [("timestamp", "uint256"), ("settlementFee", "uint256")],
+)
+MARKET_DIRECTION = Struct(
+    "MarketDirectionSignature",
+    USER_TRADE_FIELDS + [("isAbove", "bool"), ("timestamp", "uint256")],
+)
+MARKET_DIRECTION_WITH_SF = Struct(
+    "MarketDirectionSignatureWithSettlementFee",
+    USER_TRADE_FIELDS
+    + [("isAbove", "bool"), ("timestamp", "uint256"), ("settlementFee", "uint256")],
+)
+CLOSE_ANYTIME = Struct(
+    "CloseAnytimeSignature",
+    [("assetPair", "string"), ("timestamp", "uint256"), ("optionId", "uint256")],
+)
+SETTLEMENT_FEE = Struct(
+    "SettlementFeeSignature",
+    [
+        ("assetPair", "string"),
+        ("expiryTimestamp", "uint256"),
+        ("settlementFee", "uint256"),
+    ],
+)
+REGISTER_ACCOUNT = Struct(
+    "RegisterAccount",
+    [("oneCT", "address"), ("user", "address"), ("nonce", "uint256")],
+)
+DEREGISTER_ACCOUNT = Struct(
+    "DeregisterAccount", [("user", "address"), ("nonce", "uint256")]
+)
+# ERC20Permit of OpenZeppelin
+PERMIT = Struct(
+    "Permit",
+    [
+        ("owner", "address"),
+        ("spender", "address"),
+        ("value", "uint256"),
+        ("nonce", "uint256"),
+        ("deadline", "uint256"),
+    ],
+)
+
+
+@lru_cache(maxsize=None)
+def private_key(key):
+    return keys.PrivateKey(to_bytes(hexstr=key) if isinstance(key, str) else key)
+
+
+class Domain:
+    """
+    EIP-712 domain with its separator computed once. Use `domain()` to get
+    one, domains are cached per (name, version, chain id, contract).
+    """
+
+    def __init__(self, name, version, chain_id, verifying_contract):
+        self.name = name
+        self.version = version
+        self.chain_id = chain_id
+        self.verifying_contract = verifying_contract
+        self.separator = keccak(
+            encode_abi(
+                ["bytes32", "bytes32", "bytes32", "uint256", "address"],
+                [
+                    DOMAIN_TYPE_HASH,
+                    keccak(text=name),
+                    keccak(text=version),
+                    chain_id,
+                    verifying_contract,
+                ],
+            )
+        )
+        self._prefix = b"\x19\x01" + self.separator
+
+    def digest(self, struct, message):
+        """The digest Validator._validate recovers the signer from"""
+        return keccak(self._prefix + struct.hash(message))
+
+    def sign(self, struct, message, key):
+        signature = private_key(key).sign_msg_hash(self.digest(struct, message))
+        v = signature.v + 27
+        return Signature(
+            v,
+            signature.r,
+            signature.s,
+            signature.to_bytes()[:64] + bytes([v]),
+        )
+
+
+@lru_cache(maxsize=None)
+def domain(name, version, chain_id, verifying_contract):
+    return Domain(name, version, chain_id, verifying_contract)
+
+
+def validator_domain(verifying_contract, chain_id=1):
+    """Domain of Validator.sol for a contract using it (router, registrar)"""
+    return domain("Validator", "1", chain_id, verifying_contract)
@@ -0,0 +1,168 @@
+import threading
+import time
+
+from .retry_policy import KNOWN, NONCE, classify
+
+
+class FeeOracle:
+    """
+    EIP-1559 fee estimation from the fee history of recent blocks: the
+    priority fee is a percentile of the tips paid in the last `blocks` blocks
+    and the max fee leaves room for the base fee to grow for a few blocks.
+    Falls back to the legacy gas price on nodes without a base fee. Estimates
+    are reused for `ttl` seconds so that bursts of transactions don't each
+    query the fee history.
+    """
+
+    def __init__(
+        self,
+        web3,
+        blocks=20,
+        percentile=50,
+        base_fee_multiplier=2,
+        min_priority_fee=0,
+        ttl=2,
+    ):
+        self.web3 = web3
+        self.blocks = blocks
+        self.percentile = percentile
+        self.base_fee_multiplier = base_fee_multiplier
+        self.min_priority_fee = min_priority_fee
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0
+
+    def estimate(self):
+        with self._lock:
+            if self._cached and time.time() - self._cached_at < self.ttl:
+                return dict(self._cached)
+        fees = self._estimate()
+        with self._lock:
+            self._cached, self._cached_at = fees, time.time()
+        return dict(fees)
+
+    def _estimate(self):
+        history = self.web3.provider.make_request(
+            "eth_feeHistory", [hex(self.blocks), "latest", [self.percentile]]
+        ).get("result")
+        if not history or not history.get("baseFeePerGas"):
+            return {"gasPrice": self.web3.eth.gas_price}
+
+        # The last entry is the base fee of the next block
+        base_fee = int(history["baseFeePerGas"][-1], 16)
+        tips = sorted(int(reward[0], 16) for reward in history.get("reward") or [])
+        tip = tips[len(tips) // 2] if tips else 0
+        tip = max(tip, self.min_priority_fee)
+        return {
+            "maxFeePerGas": int(base_fee * self.base_fee_multiplier) + tip,
+            "maxPriorityFeePerGas": tip,
+        }
+
+    def fees(self, multiplier=1):
+        return bump(self.estimate(), multiplier)
+
+
+def bump(fees, multiplier):
+    return {field: int(value * multiplier) for field, value in fees.items()}
+
+
+def replacement_fees(previous, current, bump_factor):
+    """
+    Fees for a same-nonce replacement: nodes only accept it if every fee field
+    is raised by at least 10% over the pending transaction, the current
+    estimate is used if it is higher.
+    """
+    bumped = bump(previous, bump_factor)
+    return {field: max(value, current.get(field, 0)) for field, value in bumped.items()}
+
+
+class FeeEscalator:
+    """
+    Sends a transaction and, if it isn't mined within `deadline` seconds,
+    replaces it (same nonce) with escalating fees, up to `max_replacements`
+    times. Bounds the confirmation latency of time sensitive transactions.
+    """
+
+    def __init__(
+        self,
+        web3,
+        oracle,
+        deadline=30,
+        max_replacements=5,
+        bump_factor=1.125,
+        poll_interval=0.5,
+        timeout=300,
+    ):
+        assert bump_factor >= 1.1, "Nodes reject replacements below a 10% bump"
+        self.web3 = web3
+        self.oracle = oracle
+        self.deadline = deadline
+        self.max_replacements = max_replacements
+        self.bump_factor = bump_factor
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def send(self, sign, label=""):
+        """
+        sign(fees) has to return the raw transaction signed with the given
+        fee fields and always the same nonce. Returns the hash of the mined
+        transaction, its receipt and the number of replacements sent.
+        """
+        # Imported here so that the oracle can be used without web3 (ops.py)
+        from web3.exceptions import TimeExhausted
+
+        start = time.time()
+        fees = self.oracle.estimate()
+        hashes = []
+        replacements = 0
+        while True:
+            raw_transaction = sign(fees)
+            try:
+                txn_hash = self.web3.eth.sendRawTransaction(raw_transaction)
+                hashes.append(self.web3.toHex(txn_hash))
+            except Exception as e:
+                error_class = classify(e)
+                if error_class == KNOWN:
+                    # Sent before, e.g. by an attempt that timed out
+                    hashes.append(self.web3.toHex(self.web3.keccak(raw_transaction)))
+                # One of the earlier transactions got mined in the meantime
+                elif not hashes or error_class != NONCE:
+                    raise
+                else:
+                    print(f"{label} replacement rejected: {e}")
+
+            mined = self._wait(hashes, time.time() + self.deadline)
+            if mined:
+                return mined[0], mined[1], replacements
+            if time.time() - start > self.timeout:
+                raise TimeExhausted(f"{label} not mined after {self.timeout} seconds")
+
+            if replacements < self.max_replacements:
+                replacements += 1
+                fees = replacement_fees(fees, self.oracle.estimate(), self.bump_factor)
+                print(
+                    f"{label} not mined after {self.deadline}s, "
+                    f"replacing with {fees}"
+                )
+            else:
+                # Out of replacements, keep waiting for any of the sent ones
+                mined = self._wait(hashes, start + self.timeout)
+                if mined:
+                    return mined[0], mined[1], replacements
+                raise TimeExhausted(f"{label} not mined after {self.timeout} seconds")
+
+    def _wait(self, hashes, until):
+        from web3.exceptions import TransactionNotFound
+
+        while True:
+            for txn_hash in hashes:
+                try:
+                    receipt = self.web3.eth.get_transaction_receipt(txn_hash)
+                except TransactionNotFound:
+                    receipt = None
+                if receipt is not None:
+                    return txn_hash, receipt
+            if time.time() > until:
+                return None
+            time.sleep(self.poll_interval)
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .rpc_batch import batch_request
+
+JOURNAL_DIR = "deployments/journal"
+
+_scope = threading.local()
+
+
+@contextmanager
+def scope(name):
+    """
+    Prefixes the keys of all steps recorded by this thread, so that steps of
+    parallel branches (e.g. deploy graph steps) get stable keys across runs.
+    """
+    previous = getattr(_scope, "name", None)
+    _scope.name = name
+    try:
+        yield
+    finally:
+        _scope.name = previous
+
+
+def current_scope():
+    return getattr(_scope, "name", None)
+
+
+def journal_path(script, network, run_id):
+    return os.path.join(JOURNAL_DIR, f"{script}_{network}_{run_id}.json")
+
+
+class DeploymentJournal:
+    """
+    On-disk record of every completed deployment and transaction of one run of
+    a script on a network, one file per run (see `journal_path`). When the run
+    is resumed the recorded steps are checked on-chain (code at the deployed
+    address, successful receipt for transactions) in one batched request and
+    then skipped. `finish` removes the file once the run completed.
+    """
+
+    def __init__(self, network, path):
+        self.network = network
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {"version": 2, "network": network, "steps": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._data = json.load(f)
+        self.steps = self._data["steps"]
+        self.verified = set()
+
+    def verify(self, web3):
+        keys = list(self.steps)
+        calls = []
+        for key in keys:
+            entry = self.steps[key]
+            if entry["kind"] == "deploy":
+                calls.append(("eth_getCode", [entry["address"], "latest"]))
+            else:
+                calls.append(("eth_getTransactionReceipt", [entry["txn_hash"]]))
+
+        for key, result in zip(keys, batch_request(web3, calls)):
+            entry = self.steps[key]
+            if entry["kind"] == "deploy":
+                valid = result not in (None, "0x", "0x0")
+            else:
+                valid = result is not None and int(result["status"], 16) == 1
+            if valid:
+                self.verified.add(key)
+            else:
+                print(f"Journal step {key} could not be verified, it will be redone")
+                del self.steps[key]
+        self.save()
+        print(f"Journal: {len(self.verified)} verified steps for {self.network}")
+        return self.verified
+
+    def completed(self, key):
+        if key in self.verified:
+            return self.steps[key]
+        return None
+
+    def record_deploy(self, key, contract_name, address, txn_hash=None):
+        self._record(
+            key,
+            {
+                "kind": "deploy",
+                "contract": contract_name,
+                "address": address,
+                "txn_hash": txn_hash,
+            },
+        )
+
+    def record_transaction(self, key, method, txn_hash):
+        self._record(
+            key, {"kind": "transaction", "method": method, "txn_hash": txn_hash}
+        )
+
+    def _record(self, key, entry):
+        entry["timestamp"] = int(time.time())
+        with self._lock:
+            self.steps[key] = entry
+            self.verified.add(key)
+            self.save()
+
+    def finish(self):
+        """The run completed, nothing is left to resume"""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        print(f"Journal: run completed, removed {self.path}")
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
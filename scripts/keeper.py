@@ -0,0 +1,435 @@
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from brownie import web3
+from eth_abi import decode_abi
+from eth_utils import event_signature_to_log_topic
+
+from .preflight import DROP, PASS
+from .utility import receipt_tracker, send_transaction, tracer
+
+# Router events that resolve a queued trade: topic -> (name, non indexed types)
+RESOLVE_EVENTS = {
+    event_signature_to_log_topic(signature): (name, types)
+    for name, signature, types in (
+        (
+            "OpenTrade",
+            "OpenTrade(address,uint256,uint256,address)",
+            ["uint256", "uint256", "address"],
+        ),
+        ("CancelTrade", "CancelTrade(address,uint256,string)", ["uint256", "string"]),
+        ("FailResolve", "FailResolve(uint256,string)", ["uint256", "string"]),
+    )
+}
+OPENED = "opened"
+CANCELLED = "cancelled"
+FAILED = "failed"
+# Gas of the transaction itself and of openTrades outside of the loop
+BASE_GAS = 60_000
+
+
+def resolved_trades(result, router_address):
+    """{queue id: (status, option id or reason)} from an openTrades TxResult"""
+    resolved = {}
+    for log in result.logs:
+        if log["address"].lower() != router_address.lower() or not log["topics"]:
+            continue
+        topic = bytes(log["topics"][0])
+        if topic not in RESOLVE_EVENTS:
+            continue
+        name, types = RESOLVE_EVENTS[topic]
+        data = log["data"]
+        data = bytes.fromhex(data[2:]) if isinstance(data, str) else bytes(data)
+        queue_id, detail = decode_abi(types, data)[:2]
+        status = {"OpenTrade": OPENED, "CancelTrade": CANCELLED}.get(name, FAILED)
+        resolved[queue_id] = (status, detail)
+    return resolved
+
+
+def unique_trades(batch):
+    """
+    (one item per queue id, the others) of a batch, since the outcomes of an
+    openTrades transaction are matched to its items by queue id
+    """
+    queue_ids = set()
+    unique, duplicates = [], []
+    for item in batch:
+        if item.queue_id in queue_ids:
+            duplicates.append(item)
+        else:
+            queue_ids.add(item.queue_id)
+            unique.append(item)
+    return unique, duplicates
+
+
+class QueuedOpen:
+    """One OpenTxn of the intake queue"""
+
+    def __init__(self, txn, received_at=None):
+        self.txn = txn
+        self.queue_id = txn[0][0]
+        self.received_at = received_at or time.time()
+        self.attempts = 0
+        self.deferrals = 0
+
+
+class TradeQueue:
+    """Thread safe intake of signed trades, first in first out"""
+
+    def __init__(self):
+        self._items = deque()
+        self._condition = threading.Condition()
+        self.closed = False
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, front=False):
+        with self._condition:
+            if front:
+                self._items.appendleft(item)
+            else:
+                self._items.append(item)
+            self._condition.notify()
+
+    def take(self, max_items, timeout):
+        """
+        Waits up to `timeout` seconds for a trade, then returns it with all the
+        trades already waiting, up to `max_items`
+        """
+        with self._condition:
+            if not self._items and not self.closed:
+                self._condition.wait(timeout)
+            return [
+                self._items.popleft() for _ in range(min(max_items, len(self._items)))
+            ]
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+class KeeperMetrics:
+    """Throughput, latency (intake to mined) and gas of a keeper run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.received = 0
+        self.statuses = Counter()
+        self.reasons = Counter()
+        self.latencies = []
+        self.batches = 0
+        self.batch_sizes = []
+        self.reverted_batches = 0
+        self.send_errors = 0
+        self.gas_used = 0
+        self.first_received = None
+        self.last_resolved = None
+
+    def record_received(self, item):
+        with self._lock:
+            self.received += 1
+            if self.first_received is None:
+                self.first_received = item.received_at
+
+    def record_send_error(self):
+        with self._lock:
+            self.send_errors += 1
+
+    def record_batch(self, size, gas_used, reverted):
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes.append(size)
+            self.gas_used += gas_used
+            self.reverted_batches += reverted
+
+    def record_resolved(self, item, status, detail, resolved_at):
+        with self._lock:
+            self.statuses[status] += 1
+            if status == OPENED:
+                self.latencies.append(resolved_at - item.received_at)
+            else:
+                self.reasons[detail] += 1
+            self.last_resolved = resolved_at
+
+    @property
+    def resolved(self):
+        return sum(self.statuses.values())
+
+    @property
+    def elapsed(self):
+        if self.first_received is None or self.last_resolved is None:
+            return 0.0
+        return self.last_resolved - self.first_received
+
+    @property
+    def throughput(self):
+        """Opened trades per second, from the first trade received"""
+        return self.statuses[OPENED] / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        with self._lock:
+            opened = self.statuses[OPENED]
+            lines = [
+                f"{self.received} trades received, {opened} opened, "
+                f"{self.statuses[CANCELLED]} cancelled, {self.statuses[FAILED]} "
+                f"failed in {self.batches} batches ({self.reverted_batches} "
+                f"reverted, {self.send_errors} send errors)",
+                f"throughput: {self.throughput:.1f} trades/s over "
+                f"{self.elapsed:.1f}s",
+                f"latency: p50 {_percentile(self.latencies, 0.5):.2f}s, "
+                f"p95 {_percentile(self.latencies, 0.95):.2f}s, "
+                f"max {max(self.latencies, default=0):.2f}s",
+            ]
+            if self.batches:
+                lines.append(
+                    f"gas: {self.gas_used // max(self.resolved, 1)} per trade, "
+                    f"{sum(self.batch_sizes) / self.batches:.1f} trades per batch"
+                )
+            for reason, count in self.reasons.most_common():
+                lines.append(f"  {count} x {reason}")
+        return "\n".join(lines)
+
+
+class OpenTradeKeeper:
+    """
+    Keeper service opening queued trades. Signed OpenTxn tuples are submitted
+    to an intake queue and packed into openTrades batches sized by the
+    measured gas per trade, so that a batch stays within `gas_fraction` of the
+    block gas limit. Each keeper account (registered with router.setKeeper)
+    has up to `max_in_flight` batches pending at a time and new batches go to
+    the keeper with the most free slots. Reverted batches (e.g. out of gas)
+    are put back at the front of the queue up to `max_attempts` times.
+
+    With a `preflight` filter (preflight.PreflightFilter) every batch is
+    checked before it is sent. Trades that would fail are resolved as failed
+    without spending gas, trades failing on balance or allowance are retried
+    every `defer_interval` seconds, `max_deferrals` times.
+
+        keeper = OpenTradeKeeper(
+            router, [keeper_1, keeper_2], preflight=PreflightFilter(router, web3)
+        ).start()
+        for txn in signed_trades:
+            keeper.submit(txn)
+        keeper.stop()
+        print(keeper.report())
+    """
+
+    def __init__(
+        self,
+        router,
+        keepers,
+        gas_per_trade=600_000,
+        gas_fraction=0.5,
+        max_batch=100,
+        max_in_flight=2,
+        max_attempts=2,
+        poll_interval=0.05,
+        on_resolved=None,
+        preflight=None,
+        defer_interval=2.0,
+        max_deferrals=3,
+    ):
+        self.router = router
+        self.keepers = list(keepers)
+        self.gas_per_trade = gas_per_trade
+        self.gas_fraction = gas_fraction
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.on_resolved = on_resolved
+        self.preflight = preflight
+        self.defer_interval = defer_interval
+        self.max_deferrals = max_deferrals
+        self.block_gas_limit = web3.eth.get_block("latest")["gasLimit"]
+        self.queue = TradeQueue()
+        self.metrics = KeeperMetrics()
+        self._slots = {keeper.address: max_in_flight for keeper in self.keepers}
+        self._slot_condition = threading.Condition()
+        self._pending = 0
+        # Batches are confirmed concurrently, each one updates gas_per_trade
+        self._gas_lock = threading.Lock()
+        self._confirmations = ThreadPoolExecutor(
+            max_workers=len(self.keepers) * max_in_flight
+        )
+        self._thread = None
+
+    def submit(self, txn, received_at=None):
+        item = QueuedOpen(txn, received_at)
+        self.metrics.record_received(item)
+        with self._slot_condition:
+            self._pending += 1
+        self.queue.put(item)
+        return item
+
+    def batch_size(self):
+        budget = self.block_gas_limit * self.gas_fraction - BASE_GAS
+        return max(1, min(self.max_batch, int(budget // self.gas_per_trade)))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Waits until every submitted trade is resolved, then stops"""
+        with self._slot_condition:
+            self._slot_condition.wait_for(lambda: self._pending == 0, timeout)
+        self.queue.close()
+        if self._thread:
+            self._thread.join()
+        self._confirmations.shutdown()
+
+    def report(self):
+        report = self.metrics.report()
+        if self.preflight:
+            report += "\n" + self.preflight.report()
+        return report
+
+    def _acquire_keeper(self):
+        with self._slot_condition:
+            while not self.queue.closed:
+                keeper = max(self.keepers, key=lambda k: self._slots[k.address])
+                if self._slots[keeper.address] > 0:
+                    self._slots[keeper.address] -= 1
+                    return keeper
+                self._slot_condition.wait(self.poll_interval)
+        return None
+
+    def _release(self, keeper):
+        with self._slot_condition:
+            self._slots[keeper.address] += 1
+            self._slot_condition.notify_all()
+
+    def _run(self):
+        while True:
+            keeper = self._acquire_keeper()
+            if keeper is None:
+                return
+            batch = self.queue.take(self.batch_size(), self.poll_interval)
+            if not batch:
+                self._release(keeper)
+                continue
+            batch, next_batch = unique_trades(batch)
+            # Resubmissions of a queued trade go in the next batch
+            for item in reversed(next_batch):
+                self.queue.put(item, front=True)
+            self._send(keeper, batch)
+
+    def _send(self, keeper, batch):
+        if self.preflight:
+            batch = self._preflight(batch)
+            if not batch:
+                self._release(keeper)
+                return
+        sent_at = time.time()
+        gas = int(BASE_GAS + self.gas_per_trade * len(batch) * 1.25)
+        gas = min(gas, self.block_gas_limit)
+        try:
+            txn_hash, nonce = send_transaction(
+                self.router.address,
+                self.router.abi,
+                "openTrades",
+                [item.txn for item in batch],
+                sender=keeper,
+                gas=gas,
+            )
+        except Exception as e:
+            print(f"openTrades of {len(batch)} trades not sent: {e}")
+            self.metrics.record_send_error()
+            self._release(keeper)
+            self._retry(batch, "Keeper: openTrades not sent")
+            return
+        future = receipt_tracker.track(
+            txn_hash,
+            label=f"openTrades x{len(batch)}",
+            nonce=nonce,
+            sender=keeper.address,
+            sent_at=sent_at,
+        )
+        self._confirmations.submit(self._confirm, keeper, batch, future)
+
+    def _confirm(self, keeper, batch, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._release(keeper)
+            self._retry(batch, f"Keeper: {e}")
+            return
+        self._release(keeper)
+        tracer.record_result(result, kind="keeper", trades=len(batch))
+        self.metrics.record_batch(len(batch), result.gas_used, not result.succeeded)
+        if not result.succeeded:
+            # Most likely out of gas, measure again with a bigger budget
+            with self._gas_lock:
+                self.gas_per_trade = int(self.gas_per_trade * 1.5)
+            self._retry(batch, "Keeper: openTrades reverted")
+            return
+
+        # Moving average of the gas per trade, sizes the next batches
+        measured = (result.gas_used - BASE_GAS) / len(batch)
+        with self._gas_lock:
+            self.gas_per_trade = int(0.7 * self.gas_per_trade + 0.3 * max(measured, 1))
+
+        resolved = resolved_trades(result, self.router.address)
+        for item in batch:
+            status, detail = resolved.get(
+                item.queue_id, (FAILED, "Keeper: not resolved by openTrades")
+            )
+            self._resolve(item, status, detail, result.confirmed_at)
+
+    def _preflight(self, batch):
+        try:
+            results = self.preflight.check([item.txn for item in batch])
+        except Exception as e:
+            # Not worth holding trades back for, openTrades resolves them anyway
+            print(f"Preflight of {len(batch)} trades failed: {e}")
+            return batch
+        ready, next_batch = [], []
+        for item, (status, reason) in zip(batch, results):
+            if status == PASS:
+                ready.append(item)
+            elif status == DROP:
+                self._resolve(item, FAILED, reason, time.time())
+            elif reason is None:
+                # Another trade of the same user is in this batch
+                next_batch.append(item)
+            else:
+                self._defer(item, reason)
+        for item in reversed(next_batch):
+            self.queue.put(item, front=True)
+        return ready
+
+    def _defer(self, item, reason):
+        item.deferrals += 1
+        if item.deferrals > self.max_deferrals:
+            self._resolve(item, FAILED, reason, time.time())
+            return
+        timer = threading.Timer(self.defer_interval, self.queue.put, (item,))
+        timer.daemon = True
+        timer.start()
+
+    def _retry(self, batch, reason):
+        for item in reversed(batch):
+            item.attempts += 1
+            if item.attempts < self.max_attempts:
+                self.queue.put(item, front=True)
+            else:
+                self._resolve(item, FAILED, reason, time.time())
+
+    def _resolve(self, item, status, detail, resolved_at):
+        self.metrics.record_resolved(item, status, detail, resolved_at)
+        if self.on_resolved:
+            self.on_resolved(item, status, detail)
+        with self._slot_condition:
+            self._pending -= 1
+            self._slot_condition.notify_all()
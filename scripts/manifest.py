@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_PATH = "deployments/manifest_{network}.json"
+MANIFEST_VERSION = 2
+
+
+def abi_hash(abi):
+    return hashlib.sha256(json.dumps(abi, sort_keys=True).encode()).hexdigest()
+
+
+def manifest_path(network):
+    return MANIFEST_PATH.format(network=network)
+
+
+class ManifestError(ValueError):
+    pass
+
+
+class Manifest:
+    """
+    Per-network deployment manifest: address, type, ABI hash and deploy block
+    of every contract of each pool deployed on the network, plus the ABIs,
+    updated at the end of each deploy run. A Manifest is the view of one pool,
+    the last deployed one unless `pool` (its address) is given. This module
+    only uses the standard library, so keepers and front end tooling can load
+    a manifest without brownie:
+
+        manifest = load_manifest("arbitrum-main")
+        router = manifest.address("router")
+        options = manifest.market("ETHUSD")["options"]
+        usdc_pool = load_manifest("arbitrum-main", pool=usdc_pool_address)
+    """
+
+    def __init__(self, data, pool=None):
+        if data.get("version") != MANIFEST_VERSION:
+            raise ManifestError(
+                f"Unsupported manifest version {data.get('version')}, "
+                f"expected {MANIFEST_VERSION}"
+            )
+        self.data = data
+        self.network = data["network"]
+        self.chain_id = data["chain_id"]
+        self.revision = data["revision"]
+        self.pools = list(data["pools"])
+        self.pool = pool or data["last_pool"]
+        if self.pool not in data["pools"]:
+            raise ManifestError(f"Pool {self.pool} is not in the manifest")
+        self.contracts = data["pools"][self.pool]["contracts"]
+        self.markets = data["pools"][self.pool]["markets"]
+        self.abis = data["abis"]
+
+    def address(self, name):
+        return self.contracts[name]["address"]
+
+    def contract_type(self, name):
+        return self.contracts[name]["type"]
+
+    def market(self, asset):
+        """{contract name: address} of one market"""
+        return {name: entry["address"] for name, entry in self.markets[asset].items()}
+
+    @property
+    def assets(self):
+        return list(self.markets)
+
+    def abi(self, name_or_type, asset=None):
+        """
+        ABI of a contract type, or of the contract with that name (of the
+        market `asset` for market contracts)
+        """
+        if name_or_type in self.abis:
+            return self.abis[name_or_type]["abi"]
+        entries = self.markets[asset] if asset else self.contracts
+        return self.abis[entries[name_or_type]["type"]]["abi"]
+
+    def entries(self):
+        """(name, asset or None, entry) of every contract"""
+        for name, entry in self.contracts.items():
+            yield name, None, entry
+        for asset, contracts in self.markets.items():
+            for name, entry in contracts.items():
+                yield name, asset, entry
+
+
+_cache = {}
+
+
+def load_manifest(network=None, path=None, pool=None):
+    """Loads a manifest, reparsed only when the file changes."""
+    path = path or manifest_path(network)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get((path, pool))
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        manifest = Manifest(json.load(f), pool)
+    _cache[(path, pool)] = (mtime, manifest)
+    return manifest
+
+
+def _previous_pools(previous):
+    """{pool: {"contracts", "markets"}} of the previous manifest, if any"""
+    if previous is None:
+        return {}
+    if previous.get("version") == 1:
+        # One pool per manifest
+        pool = previous["contracts"].get("pool", {}).get("address", "")
+        return {
+            pool: {"contracts": previous["contracts"], "markets": previous["markets"]}
+        }
+    return previous["pools"]
+
+
+def _entry(contract_type, address, abi, blocks, previous):
+    entry = {"address": address, "type": contract_type, "abi_hash": abi_hash(abi)}
+    block = blocks.get(address.lower())
+    if block is None and previous and previous.get("address") == address:
+        block = previous.get("block")
+    entry["block"] = block
+    return entry
+
+
+def write_manifest(network, chain_id, pool, contracts, markets, blocks=None, path=None):
+    """
+    Records the contracts of `pool` (its address), the other pools of the
+    network are kept as they are. contracts: {name: (contract type, address,
+    abi)} of the shared contracts, markets: {asset: {name: (contract type,
+    address, abi)}}, blocks: {lowercase address: deploy block} of the
+    contracts deployed by this run. The deploy blocks of contracts kept from
+    the previous manifest are kept.
+    """
+    path = path or manifest_path(network)
+    blocks = blocks or {}
+    previous = None
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+    pools = _previous_pools(previous)
+    old_contracts = pools.get(pool, {}).get("contracts", {})
+    old_markets = pools.get(pool, {}).get("markets", {})
+
+    abis = dict((previous or {}).get("abis", {}))
+    data = {
+        "version": MANIFEST_VERSION,
+        "network": network,
+        "chain_id": chain_id,
+        "revision": (previous or {}).get("revision", 0) + 1,
+        "generated_at": int(time.time()),
+        "last_pool": pool,
+        "pools": dict(pools),
+        "abis": abis,
+    }
+    entries = {"contracts": {}, "markets": {}}
+    data["pools"][pool] = entries
+    for name, (contract_type, address, abi) in contracts.items():
+        if not address:
+            continue
+        entries["contracts"][name] = _entry(
+            contract_type, address, abi, blocks, old_contracts.get(name)
+        )
+        abis[contract_type] = {"hash": abi_hash(abi), "abi": abi}
+    for asset, market in markets.items():
+        entries["markets"][asset] = {}
+        for name, (contract_type, address, abi) in market.items():
+            entries["markets"][asset][name] = _entry(
+                contract_type,
+                address,
+                abi,
+                blocks,
+                old_markets.get(asset, {}).get(name),
+            )
+            abis[contract_type] = {"hash": abi_hash(abi), "abi": abi}
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+    return Manifest(data)
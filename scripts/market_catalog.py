@@ -0,0 +1,314 @@
+import json
+import os
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+CATALOG_PATH = "markets.json"
+APPLIED_PATH = "deployments/markets.json"
+
+# Market field -> accepted types. Amounts are given in token units (strings, to
+# keep them exact) and scaled by the decimals of the pool's token on load.
+FIELDS = {
+    "token1": str,
+    "token2": str,
+    "full_name": str,
+    "asset_category": int,
+    "payout": int,
+    "minFee": str,
+    "platformFee": str,
+    "minPeriod": int,
+    "maxPeriod": int,
+    "max_trade_size": str,
+    "max_market_oi": str,
+    "is_early_close_allowed": bool,
+    "early_close_threshold": int,
+}
+AMOUNT_FIELDS = ("minFee", "platformFee", "max_trade_size", "max_market_oi")
+CATEGORIES = (0, 1, 2)  # Forex, Crypto, Commodities
+
+# Fields that are only read off-chain (UI, docs)
+OFF_CHAIN_FIELDS = ("full_name", "payout")
+# Fields set once by BufferBinaryOptions.initialize, a change needs a new market
+REDEPLOY_FIELDS = ("asset_category",)
+# Catalog field -> desired-state key of reconcile.OPTIONS_CONFIG_FIELDS
+CONFIG_FIELDS = {
+    "minFee": "minFee",
+    "platformFee": "platformFee",
+    "minPeriod": "minPeriod",
+    "maxPeriod": "maxPeriod",
+    "is_early_close_allowed": "isEarlyCloseEnabled",
+    "early_close_threshold": "earlyCloseThreshold",
+}
+# Contracts deployed for every market
+MARKET_CONTRACTS = ("options", "config", "market_oi_config", "option_storage")
+# Catalog field -> MarketOIConfig setter
+MARKET_OI_FIELDS = {
+    "max_market_oi": "setMaxMarketOI",
+    "max_trade_size": "setMaxTradeSize",
+}
+
+_TOKEN = re.compile(r"^[A-Z0-9]{2,10}$")
+_ADDRESS = re.compile(r"^0x[0-9a-fA-F]{40}$")
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def pair_name(market):
+    return market["token1"] + market["token2"]
+
+
+def _is_type(value, expected):
+    # bools are ints for isinstance, but never a valid int field here
+    if expected is int and isinstance(value, bool):
+        return False
+    return isinstance(value, expected)
+
+
+def _scale(amount, decimals):
+    value = Decimal(amount) * (10**decimals)
+    if value != value.to_integral_value():
+        raise CatalogError(f"{amount} has more than {decimals} decimals")
+    return int(value)
+
+
+def _validate_market(name, market):
+    errors = []
+    for field, expected in FIELDS.items():
+        if field not in market:
+            errors.append(f"{name}: missing {field}")
+        elif not _is_type(market[field], expected):
+            errors.append(
+                f"{name}: {field} should be {expected.__name__}, "
+                f"got {market[field]!r}"
+            )
+    for field in sorted(set(market) - set(FIELDS)):
+        errors.append(f"{name}: unknown field {field}")
+    if errors:
+        return errors
+
+    for field in ("token1", "token2"):
+        if not _TOKEN.match(market[field]):
+            errors.append(f"{name}: invalid {field} {market[field]!r}")
+    if market["asset_category"] not in CATEGORIES:
+        errors.append(f"{name}: asset_category should be one of {CATEGORIES}")
+    if not 0 < market["payout"] <= 100:
+        errors.append(f"{name}: payout should be a percentage")
+    if not 0 < market["minPeriod"] <= market["maxPeriod"]:
+        errors.append(f"{name}: minPeriod should be in (0, maxPeriod]")
+    if market["early_close_threshold"] < 0:
+        errors.append(f"{name}: early_close_threshold can't be negative")
+    try:
+        amounts = {field: Decimal(market[field]) for field in AMOUNT_FIELDS}
+    except InvalidOperation:
+        return errors + [f"{name}: amounts should be decimal numbers"]
+    for field, amount in amounts.items():
+        if amount < 0:
+            errors.append(f"{name}: {field} can't be negative")
+    if amounts["max_trade_size"] > amounts["max_market_oi"]:
+        errors.append(f"{name}: max_trade_size exceeds max_market_oi")
+    return errors
+
+
+class MarketCatalog:
+    """
+    The versioned list of markets and their parameters shared by the
+    deployment scripts (markets.json). Every market gets the `defaults`, which
+    it can override field by field. All problems of a catalog are reported at
+    once when it is loaded.
+    """
+
+    def __init__(self, data):
+        errors = []
+        if not isinstance(data.get("version"), int):
+            errors.append("version should be an int")
+        self.version = data.get("version")
+        self.market_times = [tuple(times) for times in data.get("market_times", [])]
+        for times in self.market_times:
+            if len(times) != 4 or not all(_is_type(t, int) for t in times):
+                errors.append(f"invalid market_times entry {list(times)}")
+        self.pools = data.get("pools", {})
+        for name, pool in self.pools.items():
+            decimals = pool.get("decimals")
+            if not _is_type(decimals, int) or not 0 <= decimals <= 36:
+                errors.append(f"pool {name}: invalid decimals")
+
+        self.markets = {}
+        defaults = data.get("defaults", {})
+        for market in data.get("markets", []):
+            market = {**defaults, **market}
+            try:
+                name = pair_name(market)
+            except (KeyError, TypeError):
+                name = repr(market)
+            if name in self.markets:
+                errors.append(f"{name}: listed twice")
+            errors += _validate_market(name, market)
+            self.markets[name] = market
+
+        self.deployed = data.get("deployed", [])
+        for entry in self.deployed:
+            if entry.get("asset") not in self.markets:
+                errors.append(f"deployed: unknown market {entry.get('asset')}")
+            if entry.get("pool") not in self.pools:
+                errors.append(f"deployed: unknown pool {entry.get('pool')}")
+            for field in ("pool_address", "options", "config", "market_oi_config"):
+                if field in entry and not _ADDRESS.match(entry[field] or ""):
+                    errors.append(f"deployed {entry.get('asset')}: invalid {field}")
+        if errors:
+            raise CatalogError("Invalid market catalog:\n  " + "\n  ".join(errors))
+
+    def market(self, pair, pool):
+        """Parameters of one market with the amounts in the pool's token."""
+        decimals = self.pools[pool]["decimals"]
+        market = dict(self.markets[pair])
+        for field in AMOUNT_FIELDS:
+            market[field] = _scale(market[field], decimals)
+        return market
+
+    def asset_pairs(self, pool):
+        """All markets of the catalog for `pool`, in catalog order."""
+        if pool not in self.pools:
+            raise CatalogError(
+                f"Unknown pool {pool}, expected one of {list(self.pools)}"
+            )
+        return [self.market(pair, pool) for pair in self.markets]
+
+    def deployed_markets(self, pool=None):
+        """[(market parameters, deployed entry)] of the already deployed markets."""
+        return [
+            (self.market(entry["asset"], entry["pool"]), entry)
+            for entry in self.deployed
+            if pool is None or entry["pool"] == pool
+        ]
+
+
+_cache = {}
+
+
+def load_catalog(path=CATALOG_PATH):
+    """Loads and validates the catalog, reparsed only when the file changes."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        catalog = MarketCatalog(json.load(f))
+    _cache[path] = (mtime, catalog)
+    return catalog
+
+
+class ChangeSet(namedtuple("ChangeSet", "added changed removed unchanged")):
+    """
+    Markets to deploy (added), to reconfigure ({pair: changed fields}), left
+    on-chain but no longer in the catalog (removed) and untouched.
+    """
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self):
+        lines = [
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, {len(self.unchanged)} unchanged"
+        ]
+        lines += [f"  + {pair}" for pair in self.added]
+        lines += [
+            f"  ~ {pair}: {', '.join(fields)}" for pair, fields in self.changed.items()
+        ]
+        lines += [f"  - {pair}" for pair in self.removed]
+        return "\n".join(lines)
+
+
+def diff_markets(previous, current):
+    """
+    previous, current: [market parameters]. A market whose REDEPLOY_FIELDS
+    changed is reported as added, changes of off-chain fields only as
+    unchanged.
+    """
+    previous = {pair_name(market): market for market in previous}
+    current = {pair_name(market): market for market in current}
+    added, changed, unchanged = [], {}, []
+    for pair, market in current.items():
+        old = previous.get(pair)
+        if old is None or any(old.get(f) != market[f] for f in REDEPLOY_FIELDS):
+            added.append(pair)
+            continue
+        fields = [
+            field
+            for field in FIELDS
+            if field not in OFF_CHAIN_FIELDS and old.get(field) != market[field]
+        ]
+        if fields:
+            changed[pair] = fields
+        else:
+            unchanged.append(pair)
+    removed = [pair for pair in previous if pair not in current]
+    return ChangeSet(added, changed, removed, unchanged)
+
+
+def config_state(market, fields=None):
+    """Desired OptionsConfig state of a market, for reconcile.reconcile_configs"""
+    return {
+        key: market[field]
+        for field, key in CONFIG_FIELDS.items()
+        if fields is None or field in fields
+    }
+
+
+class AppliedMarkets:
+    """
+    The catalog version last applied to a pool of a network, with the
+    parameters and contract addresses of each of its markets. Deployment
+    scripts diff the catalog against it and only touch the markets that
+    changed.
+    """
+
+    def __init__(self, network, pool_address, path=APPLIED_PATH):
+        self.network = network
+        self.pool_address = pool_address.lower()
+        self.path = path
+        self._data = {"version": 1, "networks": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._data = json.load(f)
+        self._pools = self._data["networks"].setdefault(network, {})
+        self.entry = self._pools.setdefault(
+            self.pool_address, {"catalog_version": None, "markets": {}}
+        )
+
+    @property
+    def markets(self):
+        return self.entry["markets"]
+
+    def changes(self, asset_pairs):
+        previous = [market["params"] for market in self.markets.values()]
+        return diff_markets(previous, asset_pairs)
+
+    def contracts(self, pair):
+        return self.markets[pair]["contracts"]
+
+    def record(self, market, contracts):
+        self.markets[pair_name(market)] = {
+            "params": market,
+            "contracts": dict(contracts),
+        }
+
+    def remove(self, pair):
+        self.markets.pop(pair, None)
+
+    def save(self, catalog_version):
+        self.entry["catalog_version"] = catalog_version
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._data, f, indent=2)
+        os.replace(tmp, self.path)
+        print(
+            f"Recorded catalog version {catalog_version} for "
+            f"{len(self.markets)} markets in {self.path}"
+        )
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+
+from eth_abi import decode_single
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+from .rpc_batch import batch_call, batch_request
+
+METADATA_PATH = "deployments/metadata_cache.json"
+
+# Getters of BufferBinaryOptions that are set once by initialize and never
+# change afterwards. decimals is tokenX.decimals(), fixed for any sane token.
+FIELDS = {
+    "assetPair": "string",
+    "tokenX": "address",
+    "pool": "address",
+    "config": "address",
+    "decimals": "uint256",
+}
+SELECTORS = {
+    field: "0x" + function_signature_to_4byte_selector(f"{field}()").hex()
+    for field in FIELDS
+}
+ZERO_ADDRESS = "0x" + "0" * 40
+
+
+def _empty(value):
+    return value in (None, "", ZERO_ADDRESS)
+
+
+class MetadataCache:
+    """
+    Cache of the per-market values that can't change once an options contract
+    is initialized, so signing and keeper loops resolve them over RPC once.
+    Entries are keyed by (chain id, genesis hash, address): a restarted dev
+    chain that deploys different contracts at the same addresses doesn't get
+    stale values. Uninitialized contracts aren't cached. With a `path` the
+    cache is persisted across runs, call `save` after filling it.
+
+        metadata = MetadataCache(web3, METADATA_PATH)
+        metadata.prefetch(options_addresses)
+        pair = metadata.get(options_address, "assetPair")
+    """
+
+    def __init__(self, web3, path=None):
+        self.web3 = web3
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._chain = None
+        self._entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    @property
+    def chain(self):
+        """Chain id and genesis hash as "<id>:<hash>", read once per cache"""
+        if self._chain is None:
+            chain_id, genesis = batch_request(
+                self.web3,
+                [("eth_chainId", []), ("eth_getBlockByNumber", ["0x0", False])],
+            )
+            self._chain = f"{int(chain_id, 16)}:{genesis['hash']}"
+        return self._chain
+
+    def _markets(self):
+        return self._entries.setdefault(self.chain, {})
+
+    def get(self, address, field=None):
+        """All the metadata of a market, or one field of it"""
+        address = to_checksum_address(address)
+        with self._lock:
+            entry = self._markets().get(address)
+        if entry is None:
+            entry = self.prefetch([address])[address]
+        else:
+            self.hits += 1
+        return entry[field] if field else entry
+
+    def prefetch(self, addresses):
+        """Reads the metadata of all the uncached markets in one batch"""
+        addresses = [to_checksum_address(address) for address in addresses]
+        with self._lock:
+            markets = self._markets()
+            missing = list(dict.fromkeys(a for a in addresses if a not in markets))
+        fetched = {}
+        if missing:
+            self.misses += len(missing)
+            calls = [
+                (address, SELECTORS[field]) for address in missing for field in FIELDS
+            ]
+            results = iter(batch_call(self.web3, calls))
+            for address in missing:
+                fetched[address] = {
+                    field: _decode(abi_type, next(results))
+                    for field, abi_type in FIELDS.items()
+                }
+            with self._lock:
+                for address, entry in fetched.items():
+                    if not any(_empty(value) for value in entry.values()):
+                        markets[address] = entry
+        with self._lock:
+            markets = self._markets()
+            return {
+                address: markets.get(address) or fetched[address]
+                for address in addresses
+            }
+
+    def invalidate(self, address=None):
+        """Forgets one market, or every market of the chain"""
+        with self._lock:
+            if address is None:
+                self._entries.pop(self.chain, None)
+            else:
+                self._markets().pop(to_checksum_address(address), None)
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self._entries, indent=2)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+def _decode(abi_type, data):
+    if data is None:
+        return None
+    try:
+        value = decode_single(abi_type, data)
+    except DecodingError:
+        return None
+    return to_checksum_address(value) if abi_type == "address" else value
@@ -0,0 +1,60 @@
+import heapq
+import threading
+
+NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "invalid nonce",
+    "replacement transaction underpriced",
+)
+# The node already has this exact transaction, the send succeeded
+KNOWN_TRANSACTION_ERRORS = ("already known", "known transaction")
+
+
+def is_nonce_error(e):
+    message = str(e).lower()
+    return any(error in message for error in NONCE_ERRORS)
+
+
+class NonceManager:
+    """
+    Hands out nonces locally so that many transactions from the same account
+    can be in flight at once. Nonces of transactions that never made it to the
+    node are released and reused first, so a failed send doesn't leave a gap.
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self._lock = threading.Lock()
+        self._next = {}
+        self._released = {}
+
+    def next_nonce(self, address):
+        with self._lock:
+            released = self._released.get(address)
+            if released:
+                return heapq.heappop(released)
+            if address not in self._next:
+                self._next[address] = self._chain_nonce(address)
+            nonce = self._next[address]
+            self._next[address] += 1
+            return nonce
+
+    def release(self, address, nonce):
+        # The transaction with this nonce was never accepted by the node
+        with self._lock:
+            if self._next.get(address) == nonce + 1:
+                self._next[address] = nonce
+            else:
+                heapq.heappush(self._released.setdefault(address, []), nonce)
+
+    def resync(self, address):
+        # The node disagrees with us (e.g. "nonce too low"), trust the chain
+        with self._lock:
+            chain_nonce = self._chain_nonce(address)
+            self._released.pop(address, None)
+            self._next[address] = chain_nonce
+            return chain_nonce
+
+    def _chain_nonce(self, address):
+        return self.web3.eth.getTransactionCount(address, "pending")
@@ -0,0 +1,343 @@
+"""
+Operational CLI for one-off admin actions against a deployment. Addresses and
+ABIs come from the deployment manifest (manifest.py), so brownie and its
+project are never loaded and web3 isn't needed either: calls are encoded with
+eth_abi, signed with eth_account and sent as plain JSON-RPC, each imported
+only by the commands that use it.
+
+    python -m scripts.ops --network arb-goerli list
+    python -m scripts.ops --network arb-goerli --pool 0x6Ec7... list
+    python -m scripts.ops --network arb-goerli call router isKeeper 0x11E7...
+    python -m scripts.ops --network arb-goerli transact ETHUSD.config \\
+        setMinFee 1000000
+    python -m scripts.ops --profile-startup --network arb-goerli call ...
+
+The RPC endpoint is --rpc, $RPC_URL or the host of the network in brownie's
+network-config.yaml. Transactions are signed with the key in $BFR_PK (see
+--key-env).
+"""
+
+import time
+
+_started = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+import urllib.request
+from decimal import Decimal
+
+from .manifest import load_manifest
+
+NETWORK_CONFIG = os.path.expanduser("~/.brownie/network-config.yaml")
+
+
+class StartupProfile:
+    """Time spent in each phase of a command, printed by --profile-startup"""
+
+    def __init__(self, started):
+        self.started = started
+        self.last = time.perf_counter()
+        self.phases = [("imports", self.last - started)]
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [
+            f"  {seconds * 1000:8.1f}ms  {phase}" for phase, seconds in self.phases
+        ]
+        lines.append(f"  {(self.last - self.started) * 1000:8.1f}ms  total")
+        return "Startup profile:\n" + "\n".join(lines)
+
+
+class RPCError(Exception):
+    pass
+
+
+class RPC:
+    """
+    Minimal JSON-RPC client. Also has the bits of the web3 interface that
+    fee_strategy.FeeOracle uses, so the oracle works on it unchanged.
+    """
+
+    def __init__(self, endpoint, timeout=30):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._id = 0
+
+    def make_request(self, method, params):
+        self._id += 1
+        body = json.dumps(
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": self._id}
+        ).encode()
+        request = urllib.request.Request(
+            self.endpoint, body, {"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def request(self, method, *params):
+        response = self.make_request(method, list(params))
+        if "error" in response:
+            raise RPCError(f"{method}: {response['error'].get('message')}")
+        return response["result"]
+
+    @property
+    def provider(self):
+        return self
+
+    @property
+    def eth(self):
+        return self
+
+    @property
+    def gas_price(self):
+        return int(self.request("eth_gasPrice"), 16)
+
+
+def rpc_endpoint(network, rpc=None):
+    """--rpc, $RPC_URL or the host brownie has configured for the network"""
+    endpoint = rpc or os.environ.get("RPC_URL")
+    if endpoint:
+        return endpoint
+    if os.path.exists(NETWORK_CONFIG):
+        import yaml
+
+        with open(NETWORK_CONFIG) as f:
+            config = yaml.safe_load(f)
+        networks = list(config.get("development") or [])
+        for group in config.get("live") or []:
+            networks += group.get("networks") or []
+        for entry in networks:
+            if entry.get("id") == network and entry.get("host"):
+                return os.path.expandvars(entry["host"])
+    raise SystemExit(f"No RPC endpoint for {network}, pass --rpc or set RPC_URL")
+
+
+def resolve(manifest, target):
+    """
+    (address, abi) of `target`: a contract name of the manifest ("router"),
+    "<asset>.<name>" for market contracts ("ETHUSD.options") or
+    "<address>:<contract type>".
+    """
+    if ":" in target:
+        address, contract_type = target.split(":", 1)
+        return address, manifest.abi(contract_type)
+    if "." in target:
+        asset, name = target.split(".", 1)
+        if asset not in manifest.markets or name not in manifest.markets[asset]:
+            raise SystemExit(f"{target} is not in the manifest of {manifest.network}")
+        return manifest.markets[asset][name]["address"], manifest.abi(name, asset)
+    if target not in manifest.contracts:
+        raise SystemExit(f"{target} is not in the manifest of {manifest.network}")
+    return manifest.address(target), manifest.abi(target)
+
+
+def _type_string(param):
+    """ABI type of an input or output, tuples spelled out"""
+    if param["type"].startswith("tuple"):
+        inner = ",".join(_type_string(c) for c in param["components"])
+        return f"({inner}){param['type'][len('tuple'):]}"
+    return param["type"]
+
+
+def signature(fn):
+    return f"{fn['name']}({','.join(_type_string(i) for i in fn['inputs'])})"
+
+
+def find_function(abi, method, arg_count):
+    """
+    The ABI entry of `method`, a name or, for overloaded functions, a full
+    signature such as "setKeeper(address,bool)"
+    """
+    functions = [entry for entry in abi if entry.get("type") == "function"]
+    if "(" in method:
+        matches = [fn for fn in functions if signature(fn) == method]
+    else:
+        matches = [
+            fn
+            for fn in functions
+            if fn["name"] == method and len(fn["inputs"]) == arg_count
+        ]
+    if len(matches) != 1:
+        name = method.split("(")[0]
+        candidates = [signature(fn) for fn in functions if fn["name"] == name]
+        raise SystemExit(
+            f"No unique function {method} with {arg_count} arguments, "
+            f"candidates: {', '.join(candidates) or 'none'}"
+        )
+    return matches[0]
+
+
+def coerce(abi_type, value):
+    """Converts a command line argument to the python value eth_abi expects"""
+    if abi_type.endswith("]") or abi_type.startswith("("):
+        return json.loads(value)
+    if abi_type.startswith(("uint", "int")):
+        # Allows 1e18 and 1_000_000 style amounts
+        if "e" in value.lower() and not value.lower().startswith("0x"):
+            return int(Decimal(value))
+        return int(value, 0)
+    if abi_type == "bool":
+        if value.lower() not in ("true", "false", "1", "0"):
+            raise SystemExit(f"{value} is not a bool")
+        return value.lower() in ("true", "1")
+    if abi_type.startswith("bytes"):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return value
+
+
+def encode_call(fn, args):
+    from eth_abi import encode_abi
+    from eth_utils import function_signature_to_4byte_selector
+
+    types = [_type_string(i) for i in fn["inputs"]]
+    values = [coerce(abi_type, arg) for abi_type, arg in zip(types, args)]
+    selector = function_signature_to_4byte_selector(signature(fn))
+    return "0x" + (selector + encode_abi(types, values)).hex()
+
+
+def decode_output(fn, data):
+    from eth_abi import decode_abi
+
+    types = [_type_string(o) for o in fn["outputs"]]
+    values = decode_abi(types, bytes.fromhex(data[2:]))
+    return [v.hex() if isinstance(v, bytes) else v for v in values]
+
+
+def do_list(manifest, rpc, args, profile):
+    print(
+        f"{manifest.network} (chain {manifest.chain_id}), "
+        f"revision {manifest.revision}, pool {manifest.pool}"
+    )
+    for name, asset, entry in manifest.entries():
+        label = f"{asset}.{name}" if asset else name
+        print(f"  {label:32} {entry['address']}  {entry['type']}")
+
+
+def do_call(manifest, rpc, args, profile):
+    address, abi = resolve(manifest, args.contract)
+    fn = find_function(abi, args.method, len(args.args))
+    data = encode_call(fn, args.args)
+    profile.mark("encode")
+    block = hex(int(args.block)) if args.block.isdigit() else args.block
+    result = rpc.request("eth_call", {"to": address, "data": data}, block)
+    profile.mark("eth_call")
+    values = decode_output(fn, result)
+    print(values[0] if len(values) == 1 else values)
+
+
+def do_transact(manifest, rpc, args, profile):
+    from eth_account import Account
+
+    from .fee_strategy import FeeOracle
+
+    account = Account.from_key(os.environ[args.key_env])
+    profile.mark("load signer")
+
+    address, abi = resolve(manifest, args.contract)
+    fn = find_function(abi, args.method, len(args.args))
+    transaction = {
+        "from": account.address,
+        "to": address,
+        "data": encode_call(fn, args.args),
+        "value": coerce("uint256", args.value),
+    }
+    profile.mark("encode")
+    call = {**transaction, "value": hex(transaction["value"])}
+    if args.dry_run:
+        rpc.request("eth_call", call)
+        print(f"{signature(fn)} on {address} from {account.address} would succeed")
+        return
+
+    gas = args.gas or int(int(rpc.request("eth_estimateGas", call), 16) * 1.2)
+    nonce = int(rpc.request("eth_getTransactionCount", account.address, "pending"), 16)
+    fees = FeeOracle(rpc).estimate()
+    transaction.pop("from")
+    transaction.update(chainId=manifest.chain_id, nonce=nonce, gas=gas, **fees)
+    raw_transaction = account.sign_transaction(transaction).rawTransaction
+    txn_hash = rpc.request("eth_sendRawTransaction", "0x" + raw_transaction.hex())
+    profile.mark("send")
+    print(f"{signature(fn)} sent: {txn_hash}")
+    if args.no_wait:
+        return
+
+    deadline = time.time() + args.timeout
+    receipt = None
+    while receipt is None:
+        if time.time() > deadline:
+            raise SystemExit(f"{txn_hash} not mined after {args.timeout} seconds")
+        time.sleep(0.5)
+        receipt = rpc.request("eth_getTransactionReceipt", txn_hash)
+    profile.mark("confirm")
+    status = "succeeded" if int(receipt["status"], 16) else "reverted"
+    print(
+        f"{status} in block {int(receipt['blockNumber'], 16)}, "
+        f"gas used {int(receipt['gasUsed'], 16)}"
+    )
+    if status == "reverted":
+        raise SystemExit(1)
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog="python -m scripts.ops", description=__doc__)
+    parser.add_argument("--network", default=os.environ.get("NETWORK"))
+    parser.add_argument("--manifest", help="defaults to the network's manifest")
+    parser.add_argument("--pool", help="pool address, defaults to the last deployed")
+    parser.add_argument("--rpc", help="JSON-RPC endpoint")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print the time spent importing, loading and in each request",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="contracts of the manifest").set_defaults(
+        run=do_list
+    )
+
+    call = commands.add_parser("call", help="read a view function")
+    call.add_argument("--block", default="latest")
+    call.set_defaults(run=do_call)
+
+    transact = commands.add_parser("transact", help="send a transaction")
+    transact.add_argument("--key-env", default="BFR_PK")
+    transact.add_argument("--gas", type=int)
+    transact.add_argument("--value", default="0")
+    transact.add_argument("--timeout", type=int, default=120)
+    transact.add_argument("--no-wait", action="store_true")
+    transact.add_argument(
+        "--dry-run", action="store_true", help="only simulate with eth_call"
+    )
+    transact.set_defaults(run=do_transact)
+
+    for command in (call, transact):
+        command.add_argument("contract", help="router, ETHUSD.options, 0x..:Type")
+        command.add_argument("method", help="name or signature")
+        command.add_argument("args", nargs="*")
+    return parser
+
+
+def main(argv=None):
+    profile = StartupProfile(_started)
+    args = parser().parse_args(argv)
+    if not args.network and not args.manifest:
+        raise SystemExit("Pass --network or --manifest")
+    manifest = load_manifest(args.network, args.manifest, args.pool)
+    profile.mark("load manifest")
+    rpc = None
+    if args.command != "list":
+        rpc = RPC(rpc_endpoint(args.network or manifest.network, args.rpc))
+    try:
+        args.run(manifest, rpc, args, profile)
+    finally:
+        if args.profile_startup:
+            print(profile.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import threading
+from collections import Counter
+
+from eth_abi import decode_abi, encode_abi
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+from .market_metadata import MetadataCache
+from .rpc_batch import batch_request
+from .utility import encode_call
+
+PASS = "pass"
+DEFER = "defer"
+DROP = "drop"
+PERMIT = (
+    "permit(address,address,uint256,uint256,uint8,bytes32,bytes32)",
+    ["address", "address", "uint256", "uint256", "uint8", "bytes32", "bytes32"],
+)
+
+
+def _calldata(signature, types, args):
+    selector = function_signature_to_4byte_selector(signature)
+    return "0x" + (selector + encode_abi(types, args)).hex()
+
+
+def _bytes(value):
+    if isinstance(value, int):
+        return value.to_bytes(32, "big")
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _decode(types, data):
+    if data is None:
+        return None
+    try:
+        return decode_abi(types, data)
+    except DecodingError:
+        return None
+
+
+def _verdicts(output):
+    """[(is valid, reason), ...] from the output of router.verifyTrades"""
+    decoded = _decode(
+        ["uint256[]", "string[]"],
+        None if output is None else bytes.fromhex(output[2:]),
+    )
+    if decoded is None:
+        return None
+    bitmap, reasons = decoded
+    return [
+        (bool(bitmap[i // 256] >> (i % 256) & 1), reason)
+        for i, reason in enumerate(reasons)
+    ]
+
+
+def _result(verdict, simulation_failure, should_approve=False):
+    """Mirrors the order of the checks of openTrades"""
+    if verdict is None:
+        # Not decodable, e.g. the node failed the call, openTrades may still
+        # open the trade so it is checked again later
+        return (DEFER, "Preflight: verifyTrades call failed")
+    is_valid, reason = verdict
+    if reason == "Router: Incorrect allowance" and should_approve:
+        # The signed permit value is below the amount to pay, waiting can't fix
+        # the allowance
+        return (DROP, reason)
+    if reason in ("Router: Insufficient balance", "Router: Incorrect allowance"):
+        return (DEFER, reason)
+    if simulation_failure:
+        return (DROP, simulation_failure)
+    if not is_valid:
+        return (DROP, reason)
+    return (PASS, None)
+
+
+class PreflightFilter:
+    """
+    Predicts which trades of an openTrades batch would end in FailResolve or
+    CancelTrade, so the keeper only pays gas for trades that open. One batched
+    RPC round trip against the latest block holds:
+
+    - router.verifyTrades over the whole batch: balance, allowance, signature
+      reuse, user/sf/publisher signatures, timestamps, slippage and
+      evaluateParams.
+    - eth_call simulations of the registrations and permits from the router,
+      which the view can't verify.
+
+    `check` returns one (PASS | DEFER | DROP, reason) per trade. Balance and
+    allowance failures (unless the trade carries its own permit) and failed
+    verifyTrades calls are deferred, anything else needs a new signature and
+    is dropped. Only one trade per user is let through per batch, the others
+    are deferred without a reason, so that spends, permit nonces and
+    registrations of a batch don't depend on each other.
+    """
+
+    def __init__(self, router, web3, metadata=None):
+        self.router = router
+        self.web3 = web3
+        self.metadata = metadata or MetadataCache(web3)
+        self.registrar = to_checksum_address(router.accountRegistrar())
+        self.stats = Counter()
+        self.reasons = Counter()
+        self._lock = threading.Lock()
+
+    def check(self, txns):
+        results = [None] * len(txns)
+        users = set()
+        candidates = []
+        for index, txn in enumerate(txns):
+            user = to_checksum_address(txn[3])
+            if user in users:
+                results[index] = (DEFER, None)
+            else:
+                users.add(user)
+                candidates.append(index)
+
+        if candidates:
+            simulations = self._simulations(txns, candidates)
+            outputs = batch_request(
+                self.web3,
+                [self._verify_call([txns[i] for i in candidates])]
+                + [("eth_call", [call, "latest"]) for _, _, call in simulations],
+            )
+            failed = {}
+            for (index, reason, _), output in zip(simulations, outputs[1:]):
+                if output is None:
+                    failed.setdefault(index, reason)
+            verdicts = _verdicts(outputs[0])
+            if verdicts is None and len(candidates) > 1:
+                # A trade that reverts the view would revert openTrades too,
+                # find it with one call per trade
+                verdicts = [
+                    (_verdicts(output) or [None])[0]
+                    for output in batch_request(
+                        self.web3,
+                        [self._verify_call([txns[i]]) for i in candidates],
+                    )
+                ]
+            for position, index in enumerate(candidates):
+                results[index] = _result(
+                    verdicts[position] if verdicts else None,
+                    failed.get(index),
+                    # permit.shouldApprove
+                    bool(txns[index][2][-1]),
+                )
+
+        self._record(results)
+        return results
+
+    def _simulations(self, txns, candidates):
+        """(index, reason, eth_call) of the registrations and permits"""
+        router = self.router.address
+        markets = self.metadata.prefetch(
+            [txns[i][0][3] for i in candidates if txns[i][2][-1]]
+        )
+        simulations = []
+        for index in candidates:
+            trade_params, register, permit, user = txns[index]
+            user = to_checksum_address(user)
+            if permit[-1]:
+                token = markets[to_checksum_address(trade_params[3])]["tokenX"]
+                # Unknown markets are rejected by verifyTrades
+                if token:
+                    data = _calldata(
+                        *PERMIT,
+                        [
+                            user,
+                            router,
+                            permit[0],
+                            permit[1],
+                            permit[2],
+                            _bytes(permit[3]),
+                            _bytes(permit[4]),
+                        ],
+                    )
+                    simulations.append(
+                        (
+                            index,
+                            "Router: Permit did not succeed",
+                            {"from": router, "to": token, "data": data},
+                        )
+                    )
+            if register[-1]:
+                data = _calldata(
+                    "registerAccount(address,address,bytes)",
+                    ["address", "address", "bytes"],
+                    [register[0], user, _bytes(register[1])],
+                )
+                simulations.append(
+                    (
+                        index,
+                        "Router: Registration failed",
+                        {"from": router, "to": self.registrar, "data": data},
+                    )
+                )
+        return simulations
+
+    def _verify_call(self, txns):
+        router, calldata = encode_call(
+            self.router.address, self.router.abi, "verifyTrades", txns
+        )
+        return ("eth_call", [{"to": router, "data": calldata}, "latest"])
+
+    def _record(self, results):
+        with self._lock:
+            for status, reason in results:
+                self.stats["checked"] += 1
+                self.stats[status] += 1
+                if reason:
+                    self.reasons[reason] += 1
+
+    @property
+    def hit_rate(self):
+        """Fraction of the checked trades held back from openTrades"""
+        checked = self.stats["checked"]
+        return (self.stats[DROP] + self.stats[DEFER]) / checked if checked else 0.0
+
+    def report(self):
+        with self._lock:
+            lines = [
+                f"preflight: {self.stats['checked']} checks, {self.stats[PASS]} "
+                f"passed, {self.stats[DROP]} dropped, {self.stats[DEFER]} deferred "
+                f"(hit rate {self.hit_rate:.1%})"
+            ]
+            for reason, count in self.reasons.most_common():
+                lines.append(f"  {count} x {reason}")
+        return "\n".join(lines)
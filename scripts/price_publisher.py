@@ -0,0 +1,191 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from eth_utils import keccak, to_bytes
+
+try:
+    import coincurve
+except ImportError:  # Falls back to eth_keys, much slower without coincurve
+    coincurve = None
+
+SIGNED_MESSAGE_PREFIX = b"\x19Ethereum Signed Message:\n32"
+
+
+def price_hash(asset_pair, timestamp, price):
+    """keccak256(abi.encodePacked(assetPair, timestamp, price)) of Validator.sol"""
+    return keccak(
+        asset_pair.encode()
+        + int(timestamp).to_bytes(32, "big")
+        + int(price).to_bytes(32, "big")
+    )
+
+
+class PriceSigner:
+    """
+    Signs prices the way Validator.verifyPublisher checks them: an
+    eth_sign (personal message) signature of the packed price hash. Uses
+    coincurve (libsecp256k1) when it is installed.
+    """
+
+    def __init__(self, key):
+        secret = to_bytes(hexstr=key) if isinstance(key, str) else bytes(key)
+        if coincurve:
+            self._key = coincurve.PrivateKey(secret)
+            self.backend = "coincurve"
+        else:
+            from eth_keys import keys
+
+            self._key = keys.PrivateKey(secret)
+            self.backend = "eth_keys"
+
+    def sign_hash(self, digest):
+        if coincurve:
+            signature = self._key.sign_recoverable(digest, hasher=None)
+            return signature[:64] + bytes([signature[64] + 27])
+        signature = self._key.sign_msg_hash(digest)
+        return signature.to_bytes()[:64] + bytes([signature.v + 27])
+
+    def sign(self, asset_pair, timestamp, price):
+        digest = price_hash(asset_pair, timestamp, price)
+        return self.sign_hash(keccak(SIGNED_MESSAGE_PREFIX + digest))
+
+    def sign_many(self, prices):
+        return [self.sign(*price) for price in prices]
+
+
+# Signer of a pool worker, the key is sent once per process by the initializer
+_signer = None
+
+
+def _init_worker(key):
+    global _signer
+    _signer = PriceSigner(key)
+
+
+def _sign_chunk(prices):
+    return _signer.sign_many(prices)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class PublisherEngine:
+    """
+    Stand-in price publisher for keepers and load tests. Signs arrays or
+    streams of (asset pair, timestamp, price) tuples, fanned out in chunks of
+    `chunk_size` over a pool of `processes` worker processes. Inputs smaller
+    than one chunk are signed in this process, the pool isn't worth it for
+    them. Signatures come back in input order.
+
+        with PublisherEngine(publisher.private_key) as engine:
+            signatures = engine.sign([("ETHUSD", timestamp, 1800e8), ...])
+        print(engine.report())
+    """
+
+    def __init__(self, key, processes=None, chunk_size=1000):
+        self.key = key
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.signer = PriceSigner(key)
+        self.signed = 0
+        self.elapsed = 0.0
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.processes, initializer=_init_worker, initargs=(self.key,)
+            )
+        return self._pool
+
+    def sign(self, prices):
+        """Signatures of a list of prices"""
+        prices = list(prices)
+        if len(prices) <= self.chunk_size or self.processes == 1:
+            start = time.perf_counter()
+            signatures = self.signer.sign_many(prices)
+            self._count(len(signatures), start)
+            return signatures
+        return list(self.stream(prices))
+
+    def stream(self, prices):
+        """
+        Yields the signatures of an iterable of prices as they are signed,
+        keeping at most two chunks per process in flight
+        """
+        start = time.perf_counter()
+        pending = []
+        try:
+            for chunk in _chunks(prices, self.chunk_size):
+                pending.append(self.pool.submit(_sign_chunk, chunk))
+                while len(pending) > 2 * self.processes:
+                    yield from self._collect(pending.pop(0), start)
+                    start = time.perf_counter()
+            while pending:
+                yield from self._collect(pending.pop(0), start)
+                start = time.perf_counter()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _collect(self, future, start):
+        signatures = future.result()
+        self._count(len(signatures), start)
+        return signatures
+
+    def _count(self, count, start):
+        self.signed += count
+        self.elapsed += time.perf_counter() - start
+
+    @property
+    def rate(self):
+        return self.signed / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        return (
+            f"{self.signed} price signatures in {self.elapsed:.2f}s "
+            f"({self.rate:.0f}/s, {self.processes} processes, "
+            f"{self.signer.backend})"
+        )
+
+
+def benchmark(count=20000, processes=None):
+    """
+    python -m scripts.price_publisher
+
+    Signatures per second of a single process and of the process pool.
+    """
+    key = "0x" + os.urandom(32).hex()
+    now = int(time.time())
+    prices = [("ETHUSD", now + i, int(1800e8) + i) for i in range(int(count))]
+
+    single = PublisherEngine(key, processes=1)
+    single.sign(prices[: int(count) // 10])
+    print("single process:", single.report())
+    with PublisherEngine(key, processes=processes) as engine:
+        engine.sign(prices)
+    print("process pool:  ", engine.report())
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+
+@dataclass
+class TxResult:
+    label: str
+    txn_hash: str
+    nonce: int
+    sender: str
+    sent_at: float
+    confirmed_at: float
+    block_number: int
+    gas_used: int
+    effective_gas_price: int
+    status: int
+    contract_address: str = None
+    # Kept so that callers decoding events don't fetch the receipt again
+    logs: list = field(default=None, repr=False)
+
+    @property
+    def latency(self):
+        return self.confirmed_at - self.sent_at
+
+    @property
+    def succeeded(self):
+        return self.status == 1
+
+    @classmethod
+    def from_receipt(cls, receipt, label, txn_hash, nonce, sender, sent_at):
+        return cls(
+            label=label,
+            txn_hash=txn_hash,
+            nonce=nonce,
+            sender=sender,
+            sent_at=sent_at,
+            confirmed_at=time.time(),
+            block_number=receipt["blockNumber"],
+            gas_used=receipt["gasUsed"],
+            effective_gas_price=receipt.get("effectiveGasPrice", 0),
+            status=receipt["status"],
+            contract_address=receipt.get("contractAddress"),
+            logs=receipt.get("logs"),
+        )
+
+    def to_dict(self):
+        result = dict(asdict(self), latency=self.latency)
+        del result["logs"]
+        return result
+
+    def __str__(self):
+        state = "confirmed" if self.succeeded else "REVERTED"
+        target = f" -> {self.contract_address}" if self.contract_address else ""
+        return (
+            f"{self.label} {state}{target}  tx: {self.txn_hash}  nonce: {self.nonce}"
+            f"  block: {self.block_number}  gas used: {self.gas_used}"
+            f"  latency: {self.latency:.2f}s"
+        )
+
+
+def format_results(results):
+    lines = [str(result) for result in results]
+    if results:
+        lines.append(
+            f"{len(results)} transactions  gas used: {sum(r.gas_used for r in results)}"
+            f"  max latency: {max(r.latency for r in results):.2f}s"
+        )
+    return "\n".join(lines)
+
+
+class ReceiptTracker:
+    """
+    Tracks receipts of in-flight transactions concurrently on an asyncio loop
+    running in a background thread, so confirmation starts as soon as a
+    transaction is sent and many receipts are polled at the same time.
+    """
+
+    def __init__(self, web3, poll_interval=0.25, timeout=120, max_concurrency=32):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._executor = None
+        self._semaphore = None
+        # Futures still waiting for their receipt, for wait_all
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def track(self, txn_hash, label="", nonce=None, sender=None, sent_at=None):
+        sent_at = sent_at or time.time()
+        future = asyncio.run_coroutine_threadsafe(
+            self._wait_for_receipt(txn_hash, label, nonce, sender, sent_at),
+            self._ensure_loop(),
+        )
+        with self._lock:
+            self._futures[future] = None
+        # Long running senders (keeper, settlement) never call wait_all
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.pop(future, None)
+
+    def wait_all(self):
+        """Waits for the receipts still pending and returns their results"""
+        with self._lock:
+            futures = list(self._futures)
+        return [future.result() for future in futures]
+
+    def close(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._executor.shutdown(wait=False)
+        self._loop = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._run_loop, daemon=True).start()
+            return self._loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        # Created here so that it binds to the tracker's loop on older pythons
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop.run_forever()
+
+    async def _get_receipt(self, txn_hash):
+        async with self._semaphore:
+            try:
+                return await self._loop.run_in_executor(
+                    self._executor, self.web3.eth.get_transaction_receipt, txn_hash
+                )
+            except TransactionNotFound:
+                return None
+
+    async def _wait_for_receipt(self, txn_hash, label, nonce, sender, sent_at):
+        deadline = sent_at + self.timeout
+        while True:
+            receipt = await self._get_receipt(txn_hash)
+            if receipt is not None:
+                break
+            if time.time() > deadline:
+                raise TimeExhausted(
+                    f"{label} ({txn_hash}) not mined after {self.timeout} seconds"
+                )
+            await asyncio.sleep(self.poll_interval)
+
+        return TxResult.from_receipt(receipt, label, txn_hash, nonce, sender, sent_at)
@@ -0,0 +1,180 @@
+from eth_abi import decode_single
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+from .market_catalog import MARKET_OI_FIELDS, config_state
+from .rpc_batch import batch_call
+from .utility import TransactionPipeline, transact
+
+# Desired-state key -> (getter, setter, abi type) of OptionsConfig. The keys
+# follow the deployed markets of the catalog (see market_catalog.py).
+OPTIONS_CONFIG_FIELDS = {
+    "booster": ("boosterContract", "setBoosterContract", "address"),
+    "creationWindow": (
+        "creationWindowContract",
+        "setCreationWindowContract",
+        "address",
+    ),
+    "settlementFeeDisbursal": (
+        "settlementFeeDisbursalContract",
+        "setSettlementFeeDisbursalContract",
+        "address",
+    ),
+    "optionStorage": ("optionStorageContract", "setOptionStorageContract", "address"),
+    "poolOIStorage": ("poolOIStorageContract", "setPoolOIStorageContract", "address"),
+    "poolOIConfig": ("poolOIConfigContract", "setPoolOIConfigContract", "address"),
+    "marketOIaddress": (
+        "marketOIConfigContract",
+        "setMarketOIConfigContract",
+        "address",
+    ),
+    "earlyCloseThreshold": ("earlyCloseThreshold", "setEarlyCloseThreshold", "uint32"),
+    "isEarlyCloseEnabled": ("isEarlyCloseAllowed", "toggleEarlyClose", "bool"),
+    "platformFee": ("platformFee", "setPlatformFee", "uint256"),
+    "minFee": ("minFee", "setMinFee", "uint256"),
+    "minPeriod": ("minPeriod", "setMinPeriod", "uint32"),
+    "maxPeriod": ("maxPeriod", "setMaxPeriod", "uint32"),
+    "iv": ("iv", "setIV", "uint256"),
+}
+
+
+def _selector(getter):
+    return "0x" + function_signature_to_4byte_selector(f"{getter}()").hex()
+
+
+def read_config_state(web3, config_addresses, fields=OPTIONS_CONFIG_FIELDS):
+    """
+    Reads every field of every OptionsConfig in one batched request.
+    Returns {config address: {field: value}}.
+    """
+    calls = [
+        (address, _selector(getter))
+        for address in config_addresses
+        for getter, _, _ in fields.values()
+    ]
+    results = iter(batch_call(web3, calls))
+
+    state = {}
+    for address in config_addresses:
+        state[address] = {}
+        for field, (_, _, abi_type) in fields.items():
+            data = next(results)
+            state[address][field] = (
+                None if data is None else decode_single(abi_type, data)
+            )
+    return state
+
+
+def _normalize(abi_type, value):
+    if abi_type == "address":
+        return value.lower() if value else value
+    if abi_type == "bool":
+        return value in (True, "true", "True", 1)
+    return int(value)
+
+
+def diff_config(current, desired, fields=OPTIONS_CONFIG_FIELDS):
+    """
+    Returns the [(setter, args)] needed to bring one OptionsConfig from the
+    current to the desired state, split into the independent setters and the
+    period setters (in the order they have to be sent), and the fields whose
+    current value couldn't be read. Those are left alone: a toggle sent
+    without knowing the current value may flip a correct setting. Fields
+    missing from `desired` are ignored.
+    """
+    changes = []
+    unknown = []
+    for field, value in desired.items():
+        if field not in fields or value is None:
+            continue
+        _, setter, abi_type = fields[field]
+        current_value = current.get(field)
+        if current_value is None:
+            unknown.append(field)
+            continue
+        if _normalize(abi_type, current_value) == _normalize(abi_type, value):
+            continue
+        if abi_type == "bool":
+            args = ()
+        elif abi_type == "address":
+            args = (to_checksum_address(value),)
+        else:
+            args = (int(value),)
+        changes.append((setter, args))
+
+    # Only setMaxPeriod checks against the minPeriod on chain (setMinPeriod
+    # just requires >= 1 minute), so the new minPeriod goes first
+    periods = [c for c in changes if c[0] in ("setMinPeriod", "setMaxPeriod")]
+    periods.sort(key=lambda c: c[0] != "setMinPeriod")
+    changes = [c for c in changes if c not in periods]
+    return changes, periods, unknown
+
+
+def reconcile_configs(
+    web3, abi, desired_states, sender, dry_run=False, current_states=None
+):
+    """
+    desired_states: {config address: {field: desired value}}. Only the
+    setters whose on-chain value differs are sent. current_states can be
+    passed in from a snapshot (snapshot.py) instead of being read again.
+    """
+    addresses = [to_checksum_address(address) for address in desired_states]
+    desired_states = dict(zip(addresses, desired_states.values()))
+    if current_states is None or not all(a in current_states for a in addresses):
+        current_states = read_config_state(web3, addresses)
+
+    plan = {}
+    for address in addresses:
+        changes, periods, unknown = diff_config(
+            current_states[address], desired_states[address]
+        )
+        if unknown:
+            print(f"{address}: couldn't read {', '.join(unknown)}, left unchanged")
+        if changes or periods:
+            plan[address] = (changes, periods)
+        for setter, args in changes + periods:
+            print(f"{address}: {setter}{tuple(args)}")
+    print(
+        f"{len(plan)}/{len(addresses)} configs out of sync, "
+        f"{sum(len(c) + len(p) for c, p in plan.values())} transactions needed"
+    )
+    if dry_run:
+        return plan
+
+    with TransactionPipeline() as pipeline:
+        for address, (changes, _) in plan.items():
+            for setter, args in changes:
+                pipeline.transact(address, abi, setter, *args, sender=sender)
+    # The period setters depend on each other's on-chain value, send in order
+    for address, (_, periods) in plan.items():
+        for setter, args in periods:
+            transact(address, abi, setter, *args, sender=sender)
+    return plan
+
+
+def reconfigure_market(
+    web3, market, contracts, fields, sender, config_abi, market_oi_abi, dry_run=False
+):
+    """
+    Applies the changed catalog `fields` of an already deployed market:
+    OptionsConfig fields are reconciled, MarketOIConfig limits are set
+    directly.
+    """
+    plan = {}
+    desired = config_state(market, fields)
+    if desired:
+        plan = reconcile_configs(
+            web3, config_abi, {contracts["config"]: desired}, sender, dry_run=dry_run
+        )
+    for field, setter in MARKET_OI_FIELDS.items():
+        if field not in fields:
+            continue
+        print(f"{contracts['market_oi_config']}: {setter}({market[field]},)")
+        if not dry_run:
+            transact(
+                contracts["market_oi_config"],
+                market_oi_abi,
+                setter,
+                market[field],
+                sender=sender,
+            )
+    return plan
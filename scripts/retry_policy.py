@@ -0,0 +1,169 @@
+import random
+import re
+import threading
+from collections import Counter
+from time import sleep
+
+from .nonce_manager import KNOWN_TRANSACTION_ERRORS, NONCE_ERRORS
+
+KNOWN = "known"
+REVERT = "revert"
+UNDERPRICED = "underpriced"
+NONCE = "nonce"
+TIMEOUT = "timeout"
+TRANSPORT = "transport"
+UNKNOWN = "unknown"
+
+# Checked in this order, the first class with a matching message wins. A
+# "replacement transaction underpriced" at a locally assigned nonce means our
+# view of the nonce is wrong, so nonce errors come before underpriced ones.
+ERROR_PATTERNS = (
+    (KNOWN, KNOWN_TRANSACTION_ERRORS),
+    (NONCE, NONCE_ERRORS),
+    (
+        UNDERPRICED,
+        (
+            "underpriced",
+            "fee too low",
+            "max fee per gas less than block base fee",
+            "gas price too low",
+        ),
+    ),
+    # Deterministic, retrying can't help
+    (
+        REVERT,
+        (
+            "revert",
+            "invalid opcode",
+            "insufficient funds",
+            "gas required exceeds allowance",
+            "out of gas",
+        ),
+    ),
+    (TIMEOUT, ("timed out", "timeout", "timeexhausted")),
+    (
+        TRANSPORT,
+        (
+            "connection",
+            "too many requests",
+            "bad gateway",
+            "service unavailable",
+            "remote end closed",
+        ),
+    ),
+)
+# HTTP statuses of transport errors. Matched as whole numbers in messages,
+# digits inside hashes and addresses don't count.
+TRANSPORT_STATUSES = (429, 502, 503, 504)
+STATUS_PATTERN = re.compile(
+    r"\b(?:{})\b".format("|".join(str(status) for status in TRANSPORT_STATUSES))
+)
+
+# Failures of each class after which the policy gives up
+MAX_ATTEMPTS = {
+    KNOWN: 1,
+    REVERT: 1,
+    UNDERPRICED: 5,
+    NONCE: 5,
+    TIMEOUT: 4,
+    TRANSPORT: 8,
+    UNKNOWN: 3,
+}
+
+
+def classify(e):
+    # requests' HTTPError carries the response
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status in TRANSPORT_STATUSES:
+        return TRANSPORT
+    message = f"{type(e).__name__} {e}".lower()
+    for error_class, patterns in ERROR_PATTERNS:
+        if any(pattern in message for pattern in patterns):
+            return error_class
+    if STATUS_PATTERN.search(message):
+        return TRANSPORT
+    return UNKNOWN
+
+
+class Attempt:
+    def __init__(self):
+        self.number = 0
+        self.failures = Counter()
+        self.fee_multiplier = 1.0
+
+    def gas_price(self, gas_price):
+        """The gas price to use for this attempt, bumped after underpriced errors"""
+        return int(gas_price * self.fee_multiplier)
+
+
+class RetryPolicy:
+    """
+    Retries a send according to the class of the error: deterministic
+    reverts fail immediately, nonce conflicts are retried right away (after
+    the caller resynced the nonce), underpriced transactions are retried with
+    a bumped fee and timeouts/transport errors back off exponentially.
+    Counts every failure per class.
+    """
+
+    def __init__(
+        self,
+        max_attempts=None,
+        base_delay=0.5,
+        max_delay=16,
+        fee_bump=1.125,
+    ):
+        self.max_attempts = dict(MAX_ATTEMPTS, **(max_attempts or {}))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.fee_bump = fee_bump
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def delay(self, error_class, attempt_number):
+        if error_class == NONCE:
+            return 0
+        if error_class == UNDERPRICED:
+            return self.base_delay
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt_number - 1))
+        # Jitter, so that parallel senders don't retry in lockstep
+        return delay * random.uniform(0.5, 1)
+
+    def execute(self, fn, on_error=None, label=""):
+        """
+        Calls fn(attempt) until it succeeds or the policy gives up, in which
+        case the last error is raised. on_error(error_class, e) runs after
+        every failure, e.g. to release or resync the nonce.
+        """
+        attempt = Attempt()
+        while True:
+            try:
+                return fn(attempt)
+            except Exception as e:
+                error_class = classify(e)
+                attempt.number += 1
+                attempt.failures[error_class] += 1
+                with self._lock:
+                    self.counters[error_class] += 1
+                if on_error:
+                    on_error(error_class, e)
+                if attempt.failures[error_class] >= self.max_attempts[error_class]:
+                    with self._lock:
+                        self.counters["gave_up"] += 1
+                    print(f"{label} failed ({error_class}): {e}")
+                    raise
+                if error_class == UNDERPRICED:
+                    attempt.fee_multiplier *= self.fee_bump
+                delay = self.delay(error_class, attempt.failures[error_class])
+                print(
+                    f"{label} failed ({error_class}), retry {attempt.number} "
+                    f"in {delay:.1f}s: {e}"
+                )
+                sleep(delay)
+
+    def report(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return "Retries: " + (
+            ", ".join(f"{name}: {count}" for name, count in sorted(counters.items()))
+            or "none"
+        )
@@ -0,0 +1,56 @@
+import itertools
+
+import requests
+
+_ids = itertools.count()
+
+
+def batch_request(web3, calls):
+    """
+    Sends [(method, params), ...] as a single JSON-RPC array request and
+    returns the results in the same order. Entries the node answered with an
+    error come back as None. Providers without an HTTP endpoint fall back to
+    one request per call.
+    """
+    if not calls:
+        return []
+    if hasattr(web3.provider, "batch"):
+        # Pooled provider (rpc_provider.py), reuses its connections and metrics
+        return [response.get("result") for response in web3.provider.batch(calls)]
+    endpoint = getattr(web3.provider, "endpoint_uri", None)
+    if not endpoint or not str(endpoint).startswith("http"):
+        return [_single_request(web3, method, params) for method, params in calls]
+
+    payload = [
+        {"jsonrpc": "2.0", "id": next(_ids), "method": method, "params": params}
+        for method, params in calls
+    ]
+    response = requests.post(str(endpoint), json=payload, timeout=30)
+    response.raise_for_status()
+    body = response.json()
+    if not isinstance(body, list):
+        # Some nodes reject batches as a whole
+        return [_single_request(web3, method, params) for method, params in calls]
+
+    by_id = {item.get("id"): item for item in body}
+    return [by_id.get(request["id"], {}).get("result") for request in payload]
+
+
+def _single_request(web3, method, params):
+    response = web3.provider.make_request(method, params)
+    return response.get("result")
+
+
+def batch_call(web3, calls, block="latest"):
+    """
+    Batched eth_call of [(address, calldata), ...]. Returns the raw return
+    data as bytes, or None for calls that reverted.
+    """
+    results = batch_request(
+        web3,
+        [
+            ("eth_call", [{"to": address, "data": data}, block])
+            for address, data in calls
+        ],
+    )
+    return [None if result is None else bytes.fromhex(result[2:]) for result in results]
@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+# Read-only methods that are safe to coalesce into JSON-RPC array requests
+BATCHABLE_METHODS = {
+    "eth_call",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_getTransactionByHash",
+    "eth_getCode",
+    "eth_getBalance",
+    "eth_getStorageAt",
+    "eth_blockNumber",
+    "eth_getBlockByNumber",
+    "eth_chainId",
+    "eth_gasPrice",
+}
+
+
+class RPCMetrics:
+    """Request counts and latencies of a provider, per JSON-RPC method."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.latency = defaultdict(float)
+        self.max_latency = defaultdict(float)
+        self.http_requests = 0
+        self.batches = 0
+        self.batched_calls = 0
+        self.largest_batch = 0
+
+    def record(self, methods, elapsed):
+        with self._lock:
+            self.http_requests += 1
+            if len(methods) > 1:
+                self.batches += 1
+                self.batched_calls += len(methods)
+                self.largest_batch = max(self.largest_batch, len(methods))
+            for method in methods:
+                self.calls[method] += 1
+                self.latency[method] += elapsed
+                self.max_latency[method] = max(self.max_latency[method], elapsed)
+
+    def reset(self):
+        self.__init__()
+
+    def report(self):
+        with self._lock:
+            total = sum(self.calls.values())
+            lines = [
+                f"{total} RPC calls in {self.http_requests} HTTP requests "
+                f"({self.batches} batches, largest {self.largest_batch})"
+            ]
+            for method, count in self.calls.most_common():
+                lines.append(
+                    f"  {method}: {count} calls, "
+                    f"avg {self.latency[method] / count * 1000:.1f}ms, "
+                    f"max {self.max_latency[method] * 1000:.1f}ms"
+                )
+        return "\n".join(lines)
+
+
+class _PendingCall:
+    def __init__(self, request):
+        self.request = request
+        self.response = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    HTTP provider with a keep-alive connection pool shared by all threads and
+    transparent JSON-RPC batching: read calls made concurrently (e.g. by the
+    receipt tracker, the nonce manager and the deploy graph threads) within
+    `batch_window` seconds of each other are sent as one array request. Writes
+    always go out on their own. A `batch_window` of 0 disables batching.
+    """
+
+    def __init__(
+        self,
+        endpoint_uri,
+        pool_size=32,
+        batch_window=0.002,
+        max_batch=100,
+        timeout=30,
+    ):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        super().__init__(endpoint_uri, request_kwargs={"timeout": timeout})
+        self.session = session
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.metrics = RPCMetrics()
+        self._lock = threading.Lock()
+        self._queue = []
+
+    def _post(self, payload, methods):
+        start = time.time()
+        response = self.session.post(
+            self.endpoint_uri,
+            data=json.dumps(payload),
+            **self.get_request_kwargs(),
+        )
+        self.metrics.record(methods, time.time() - start)
+        response.raise_for_status()
+        return response.json()
+
+    def _request(self, method, params):
+        return {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params or [],
+            "id": next(self.request_counter),
+        }
+
+    def make_request(self, method, params):
+        request = self._request(method, params)
+        if self.batch_window <= 0 or method not in BATCHABLE_METHODS:
+            return self._post(request, [method])
+
+        pending = _PendingCall(request)
+        with self._lock:
+            self._queue.append(pending)
+            leader = len(self._queue) == 1
+        if leader:
+            # The first caller waits for others to join, then sends for all
+            time.sleep(self.batch_window)
+            with self._lock:
+                batch, self._queue = self._queue, []
+            for start in range(0, len(batch), self.max_batch):
+                self._flush(batch[start : start + self.max_batch])
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    def _flush(self, batch):
+        try:
+            if len(batch) == 1:
+                batch[0].response = self._post(
+                    batch[0].request, [batch[0].request["method"]]
+                )
+            else:
+                responses = self.make_batch_request([p.request for p in batch])
+                for pending, response in zip(batch, responses):
+                    pending.response = response
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def make_batch_request(self, payload):
+        """
+        Sends the JSON-RPC requests as one array request and returns the
+        responses in the same order. Nodes that reject batches get one request
+        per call.
+        """
+        body = self._post(payload, [request["method"] for request in payload])
+        if not isinstance(body, list):
+            return [self._post(request, [request["method"]]) for request in payload]
+        by_id = {item.get("id"): item for item in body}
+        missing = {"error": {"message": "missing from the batch response"}}
+        return [by_id.get(request["id"], missing) for request in payload]
+
+    def batch(self, calls):
+        """[(method, params)] as one array request, returns the responses"""
+        return self.make_batch_request(
+            [self._request(method, params) for method, params in calls]
+        )
+
+
+def benchmark(calls=200, threads=16):
+    """
+    brownie run scripts/rpc_provider.py benchmark
+
+    Compares the provider brownie connected with against the pooled provider
+    for concurrent nonce reads.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from brownie import accounts, web3
+
+    addresses = [account.address for account in accounts]
+    endpoint = str(web3.provider.endpoint_uri)
+
+    def run(provider):
+        def read(i):
+            provider.make_request(
+                "eth_getTransactionCount", [addresses[i % len(addresses)], "latest"]
+            )
+
+        start = time.time()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(read, range(calls)))
+        return time.time() - start
+
+    default_time = run(HTTPProvider(endpoint))
+    pooled = PooledHTTPProvider(endpoint)
+    pooled_time = run(pooled)
+    print(f"default provider: {calls} calls in {default_time:.3f}s")
+    print(f"pooled provider:  {calls} calls in {pooled_time:.3f}s")
+    print(pooled.metrics.report())
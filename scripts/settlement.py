@@ -0,0 +1,422 @@
+import heapq
+import threading
+import time
+from collections import Counter
+
+from eth_abi import decode_abi, encode_abi
+from eth_abi.exceptions import DecodingError
+from eth_utils import (
+    event_signature_to_log_topic,
+    function_signature_to_4byte_selector,
+    to_checksum_address,
+)
+
+from .keeper import BASE_GAS, _percentile
+from .market_metadata import MetadataCache
+from .price_publisher import PriceSigner
+from .rpc_batch import batch_call
+from .utility import receipt_tracker, send_transaction, tracer
+
+CREATE_TOPIC = event_signature_to_log_topic("Create(address,uint256,uint256,uint256)")
+FAIL_UNLOCK_TOPIC = event_signature_to_log_topic("FailUnlock(uint256,address,string)")
+OPTIONS_SELECTOR = function_signature_to_4byte_selector("options(uint256)")
+# BufferBinaryOptions.Option: state, strike, amount, lockedAmount, premium,
+# expiration, totalFee, createdAt
+OPTION_TYPES = ["uint8"] + ["uint256"] * 7
+ACTIVE = 1
+# Reasons worth trying again later, the others need new signatures
+RETRYABLE = {"Router: Wrong closing time"}
+
+
+def _topic_bytes(topic):
+    return bytes.fromhex(topic[2:]) if isinstance(topic, str) else bytes(topic)
+
+
+def _options_calldata(option_id):
+    return "0x" + (OPTIONS_SELECTOR + encode_abi(["uint256"], [option_id])).hex()
+
+
+def failed_unlocks(result, router_address):
+    """{(market, option id): reason} from the FailUnlock logs of a TxResult"""
+    failed = {}
+    for log in result.logs:
+        if log["address"].lower() != router_address.lower() or not log["topics"]:
+            continue
+        if _topic_bytes(log["topics"][0]) != FAIL_UNLOCK_TOPIC:
+            continue
+        option_id, market, reason = decode_abi(
+            ["uint256", "address", "string"], _topic_bytes(log["data"])
+        )
+        failed[(to_checksum_address(market), option_id)] = reason
+    return failed
+
+
+class SettlementMetrics:
+    """Settled options and settlement lag, in chain seconds after expiry"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.settled = 0
+        self.failures = Counter()
+        self.deferred = Counter()
+        # Expiry to submission, and expiry to the block that settled it
+        self.delays = []
+        self.lags = []
+        self.batches = 0
+        self.gas_used = 0
+
+    def record_scheduled(self):
+        with self._lock:
+            self.scheduled += 1
+
+    def record_submitted(self, delays):
+        with self._lock:
+            self.delays.extend(delays)
+
+    def record_batch(self, gas_used):
+        with self._lock:
+            self.batches += 1
+            self.gas_used += gas_used
+
+    def record_settled(self, lag):
+        with self._lock:
+            self.settled += 1
+            self.lags.append(lag)
+
+    def record_failure(self, reason):
+        with self._lock:
+            self.failures[reason] += 1
+
+    def record_deferred(self, reason):
+        with self._lock:
+            self.deferred[reason] += 1
+
+    def report(self):
+        with self._lock:
+            lines = [
+                f"{self.scheduled} options scheduled, {self.settled} settled, "
+                f"{sum(self.failures.values())} failed in {self.batches} batches",
+                f"submission delay: p50 {_percentile(self.delays, 0.5):.1f}s, "
+                f"max {max(self.delays, default=0):.1f}s",
+                f"settlement lag: p50 {_percentile(self.lags, 0.5):.1f}s, "
+                f"p95 {_percentile(self.lags, 0.95):.1f}s, "
+                f"max {max(self.lags, default=0):.1f}s",
+            ]
+            if self.batches:
+                lines.append(f"gas: {self.gas_used // self.batches} per batch")
+            for reason, count in self.failures.most_common():
+                lines.append(f"  {count} x {reason}")
+            for reason, count in self.deferred.most_common():
+                lines.append(f"  {count} x deferred: {reason}")
+        return "\n".join(lines)
+
+
+class SettlementScheduler:
+    """
+    Settles options at their expiry. Active options are read from the Create
+    events of `markets` into a min-heap keyed by expiration. At each expiry
+    the due options of all the markets are signed with the closing price at
+    the expiration second (the router only accepts a publisher timestamp
+    equal to the expiration) and sent in executeOptions batches sized by the
+    measured gas per option.
+
+    `price_source(asset_pair, timestamp)` returns the closing price of a
+    market and `direction_source(market, option_id)` the
+    (is_above, [signature, timestamp]) market direction signed by the user,
+    both held off chain. Options either of them can't provide yet, or whose
+    batch wasn't sent or reverted, are tried again `retry_interval` seconds
+    later, up to `max_retries` times before they are recorded as failed.
+    `clock` is the time the expirations are compared to, pass chain.time on a
+    dev chain.
+
+        scheduler = SettlementScheduler(
+            router, markets, keeper, publisher_key, prices, directions, web3
+        )
+        scheduler.sync()
+        scheduler.start()
+        ...
+        scheduler.stop()
+        print(scheduler.metrics.report())
+    """
+
+    def __init__(
+        self,
+        router,
+        markets,
+        keeper,
+        publisher_key,
+        price_source,
+        direction_source,
+        web3,
+        gas_per_option=300_000,
+        gas_fraction=0.5,
+        max_batch=100,
+        retry_interval=5,
+        max_retries=60,
+        poll_interval=1.0,
+        clock=time.time,
+    ):
+        self.router = router
+        self.markets = [to_checksum_address(market) for market in markets]
+        self.keeper = keeper
+        self.signer = PriceSigner(publisher_key)
+        self.price_source = price_source
+        self.direction_source = direction_source
+        self.web3 = web3
+        self.gas_per_option = gas_per_option
+        self.gas_fraction = gas_fraction
+        self.max_batch = max_batch
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.metadata = MetadataCache(web3)
+        self.metrics = SettlementMetrics()
+        self.block_gas_limit = web3.eth.get_block("latest")["gasLimit"]
+        # (due at, expiration, market, option id)
+        self._heap = []
+        self._scheduled = set()
+        # (market, option id): retries so far
+        self._retries = Counter()
+        self._lock = threading.Lock()
+        self._next_block = 0
+        # (market, option id) created but not read yet, read again on the next sync
+        self._unread = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, market, option_id, expiration):
+        key = (to_checksum_address(market), option_id)
+        with self._lock:
+            if key in self._scheduled:
+                return
+            self._scheduled.add(key)
+            heapq.heappush(self._heap, (expiration, expiration, *key))
+        self.metrics.record_scheduled()
+
+    def sync(self, to_block="latest"):
+        """
+        Schedules the options created since the last sync, and those whose
+        read failed on an earlier sync
+        """
+        to_block = self.web3.eth.block_number if to_block == "latest" else int(to_block)
+        if to_block < self._next_block and not self._unread:
+            return 0
+        logs = []
+        if to_block >= self._next_block:
+            logs = self.web3.eth.get_logs(
+                {
+                    "address": self.markets,
+                    "fromBlock": self._next_block,
+                    "toBlock": to_block,
+                    "topics": ["0x" + CREATE_TOPIC.hex()],
+                }
+            )
+            self._next_block = to_block + 1
+        created = self._unread + [
+            (
+                to_checksum_address(log["address"]),
+                int.from_bytes(_topic_bytes(log["topics"][2]), "big"),
+            )
+            for log in logs
+        ]
+        # Kept until read, _next_block is already past their logs
+        self._unread = created
+        options = batch_call(
+            self.web3,
+            [(market, _options_calldata(option_id)) for market, option_id in created],
+        )
+        self._unread = []
+        count = 0
+        for (market, option_id), data in zip(created, options):
+            try:
+                option = decode_abi(OPTION_TYPES, data) if data else None
+            except DecodingError:
+                option = None
+            if option is None:
+                # The read failed, the option may well be active
+                self._unread.append((market, option_id))
+                continue
+            # Closed before we saw it, through closeAnytime or another keeper
+            if option[0] != ACTIVE:
+                continue
+            self.schedule(market, option_id, option[5])
+            count += 1
+        return count
+
+    def next_expiry(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def due(self, now):
+        """Pops the options due at `now`, earliest first"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def batch_size(self):
+        budget = self.block_gas_limit * self.gas_fraction - BASE_GAS
+        return max(1, min(self.max_batch, int(budget // self.gas_per_option)))
+
+    def settle(self, now=None):
+        """Sends executeOptions batches for every due option, returns the count"""
+        now = self.clock() if now is None else now
+        params, entries = self._close_params(self.due(now), now)
+        futures = []
+        size = self.batch_size()
+        for start in range(0, len(params), size):
+            batch = (params[start : start + size], entries[start : start + size])
+            futures.append(self._send(*batch, now))
+        for future, (batch_params, batch_entries) in futures:
+            self._confirm(future, batch_params, batch_entries)
+        return len(params)
+
+    def _close_params(self, due, now):
+        if not due:
+            return [], []
+        metadata = self.metadata.prefetch({market for _, _, market, _ in due})
+        ready, prices = [], []
+        for entry in due:
+            _, expiration, market, option_id = entry
+            asset_pair = metadata[market]["assetPair"]
+            price = self.price_source(asset_pair, expiration)
+            direction = self.direction_source(market, option_id)
+            if price is None or direction is None:
+                self._retry(entry, now, "Settlement: price or direction missing")
+                continue
+            ready.append((entry, direction))
+            prices.append((asset_pair, expiration, int(price)))
+
+        # All the due options are signed before the first batch is sent
+        signatures = self.signer.sign_many(prices)
+        params = []
+        for (entry, direction), price, signature in zip(ready, prices, signatures):
+            _, expiration, market, option_id = entry
+            is_above, direction_sign_info = direction
+            params.append(
+                [
+                    option_id,
+                    market,
+                    price[2],
+                    is_above,
+                    direction_sign_info,
+                    [signature, expiration],
+                ]
+            )
+        return params, [entry for entry, _ in ready]
+
+    def _send(self, params, entries, now):
+        sent_at = time.time()
+        gas = int(BASE_GAS + self.gas_per_option * len(params) * 1.25)
+        gas = min(gas, self.block_gas_limit)
+        try:
+            txn_hash, nonce = send_transaction(
+                self.router.address,
+                self.router.abi,
+                "executeOptions",
+                params,
+                sender=self.keeper,
+                gas=gas,
+            )
+        except Exception as e:
+            print(f"executeOptions of {len(params)} options not sent: {e}")
+            for entry in entries:
+                self._retry(entry, now, "Settlement: executeOptions not sent")
+            return None, (params, entries)
+        self.metrics.record_submitted(
+            [now - expiration for _, expiration, _, _ in entries]
+        )
+        future = receipt_tracker.track(
+            txn_hash,
+            label=f"executeOptions x{len(params)}",
+            nonce=nonce,
+            sender=self.keeper.address,
+            sent_at=sent_at,
+        )
+        return future, (params, entries)
+
+    def _confirm(self, future, params, entries):
+        if future is None:
+            return
+        now = self.clock()
+        try:
+            result = future.result()
+        except Exception as e:
+            for entry in entries:
+                self._retry(entry, now, f"Settlement: {e}")
+            return
+        tracer.record_result(result, kind="settlement", options=len(params))
+        self.metrics.record_batch(result.gas_used)
+        if not result.succeeded:
+            self.gas_per_option = int(self.gas_per_option * 1.5)
+            for entry in entries:
+                self._retry(entry, now, "Settlement: executeOptions reverted")
+            return
+        measured = (result.gas_used - BASE_GAS) / len(params)
+        self.gas_per_option = int(0.7 * self.gas_per_option + 0.3 * max(measured, 1))
+
+        mined_at = self.web3.eth.get_block(result.block_number)["timestamp"]
+        failed = failed_unlocks(result, self.router.address)
+        for entry in entries:
+            _, expiration, market, option_id = entry
+            reason = failed.get((market, option_id))
+            if reason is None:
+                self._done(market, option_id)
+                self.metrics.record_settled(mined_at - expiration)
+            elif reason in RETRYABLE:
+                self._retry(entry, now, reason)
+            else:
+                self._done(market, option_id)
+                self.metrics.record_failure(reason)
+
+    def _retry(self, entry, now, reason):
+        _, expiration, market, option_id = entry
+        with self._lock:
+            self._retries[(market, option_id)] += 1
+            retries = self._retries[(market, option_id)]
+        if retries > self.max_retries:
+            print(f"Giving up on option {option_id} of {market}: {reason}")
+            self._done(market, option_id)
+            self.metrics.record_failure(reason)
+            return
+        self.metrics.record_deferred(reason)
+        with self._lock:
+            heapq.heappush(
+                self._heap, (now + self.retry_interval, expiration, market, option_id)
+            )
+
+    def _done(self, market, option_id):
+        with self._lock:
+            self._scheduled.discard((market, option_id))
+            self._retries.pop((market, option_id), None)
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.sync()
+                self.settle()
+            except Exception as e:
+                print(f"Settlement round failed: {e}")
+            # Wake up at the next expiry, or to pick up new options
+            next_expiry = self.next_expiry()
+            wait = self.poll_interval
+            if next_expiry is not None:
+                wait = min(wait, max(0, next_expiry - self.clock()))
+            self._stopped.wait(wait)
@@ -0,0 +1,272 @@
+import json
+import os
+import time
+
+from eth_abi import decode_single, encode_abi
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+from .reconcile import OPTIONS_CONFIG_FIELDS
+from .rpc_batch import batch_call, batch_request
+
+SNAPSHOT_PATH = "deployments/snapshot_{network}.json"
+
+# Contract kind -> {field: (getter, abi type)} read for every contract of that
+# kind. The OptionsConfig fields use the desired-state keys of reconcile.py.
+READS = {
+    "router": {
+        "publisher": ("publisher", "address"),
+        "sfPublisher": ("sfPublisher", "address"),
+        "admin": ("admin", "address"),
+        "accountRegistrar": ("accountRegistrar", "address"),
+        "maxDelayForOpenTrade": ("MAX_DELAY_FOR_OPEN_TRADE", "uint16"),
+        "maxDelayForAssetPrice": ("MAX_DELAY_FOR_ASSET_PRICE", "uint16"),
+    },
+    "options": {
+        "assetPair": ("assetPair", "string"),
+        "assetCategory": ("assetCategory", "uint8"),
+        "isPaused": ("isPaused", "bool"),
+        "totalMarketOI": ("totalMarketOI", "uint256"),
+        "nextTokenId": ("nextTokenId", "uint256"),
+        "maxTradeSize": ("getMaxTradeSize", "uint256"),
+        "maxOI": ("getMaxOI", "uint256"),
+        "config": ("config", "address"),
+        "pool": ("pool", "address"),
+    },
+    "config": {
+        field: (getter, abi_type)
+        for field, (getter, _, abi_type) in OPTIONS_CONFIG_FIELDS.items()
+    },
+    "market_oi_config": {
+        "maxMarketOI": ("_maxMarketOI", "uint256"),
+        "maxTradeSize": ("_maxTradeSize", "uint256"),
+        "marketOICap": ("getMarketOICap", "uint256"),
+    },
+    "pool": {
+        "totalSupply": ("totalSupply", "uint256"),
+        "totalTokenXBalance": ("totalTokenXBalance", "uint256"),
+        "availableBalance": ("availableBalance", "uint256"),
+        "lockedAmount": ("lockedAmount", "uint256"),
+        "lockedPremium": ("lockedPremium", "uint256"),
+        "maxLiquidity": ("maxLiquidity", "uint256"),
+        "lockupPeriod": ("lockupPeriod", "uint32"),
+    },
+    "pool_oi_config": {
+        "maxPoolOI": ("_maxPoolOI", "uint256"),
+        "poolOICap": ("getPoolOICap", "uint256"),
+    },
+    "pool_oi_storage": {
+        "totalPoolOI": ("totalPoolOI", "uint256"),
+    },
+}
+
+# (kind, field) -> kind of the contract at the address read from that field.
+# Contracts found this way are read in the next round.
+LINKS = {
+    ("options", "config"): "config",
+    ("options", "pool"): "pool",
+    ("config", "marketOIaddress"): "market_oi_config",
+    ("config", "poolOIConfig"): "pool_oi_config",
+    ("config", "poolOIStorage"): "pool_oi_storage",
+}
+
+ZERO_ADDRESS = "0x" + "0" * 40
+
+
+def _calldata(signature, arg_types=(), args=()):
+    selector = function_signature_to_4byte_selector(signature)
+    return "0x" + (selector + encode_abi(list(arg_types), list(args))).hex()
+
+
+def _decode(abi_type, data):
+    if data is None:
+        return None
+    try:
+        value = decode_single(abi_type, data)
+    except DecodingError:
+        # Not a contract of the expected kind (or not initialized)
+        return None
+    if abi_type == "address":
+        return to_checksum_address(value)
+    return value
+
+
+class SnapshotReader:
+    """
+    Reads the live state of a deployment: the router, every market (options,
+    config, market OI config), the pool and the pool OI contracts. Contracts
+    are discovered from the options addresses and all getters of one round
+    are sent together, either as JSON-RPC batches of `batch_size` calls or, if
+    `aggregator` (a deployed BatchExecutor) is given, as a single
+    BatchExecutor.aggregate eth_call. A full snapshot takes three rounds, all
+    pinned to the same block.
+    """
+
+    def __init__(self, web3, aggregator=None, batch_size=500):
+        self.web3 = web3
+        self.aggregator = aggregator
+        self.batch_size = batch_size
+        self.requests = 0
+
+    def _call(self, calls, block):
+        if not calls:
+            return []
+        if self.aggregator:
+            return self._aggregate(calls, block)
+        results = []
+        for start in range(0, len(calls), self.batch_size):
+            results += batch_call(
+                self.web3, calls[start : start + self.batch_size], block
+            )
+            self.requests += 1
+        return results
+
+    def _aggregate(self, calls, block):
+        data = _calldata(
+            "aggregate((address,bytes)[])",
+            ["(address,bytes)[]"],
+            [[(address, bytes.fromhex(data[2:])) for address, data in calls]],
+        )
+        (result,) = batch_call(self.web3, [(self.aggregator, data)], block)
+        self.requests += 1
+        if result is None:
+            raise ValueError(f"aggregate call to {self.aggregator} failed")
+        return [
+            returned if success else None
+            for success, returned in decode_single("(bool,bytes)[]", result)
+        ]
+
+    def read(self, router, options, keepers=(), block=None):
+        """
+        router: router address, options: addresses of the options contracts
+        of all markets, keepers: addresses whose keeper flag is read.
+        """
+        started = time.time()
+        self.requests = 0
+        if block is None:
+            (block,) = batch_request(self.web3, [("eth_blockNumber", [])])
+            block = int(block, 16)
+            self.requests += 1
+        tag = hex(block)
+
+        router = to_checksum_address(router)
+        options = [to_checksum_address(address) for address in options]
+        contracts = {kind: {} for kind in READS}
+        pending = [("router", router)]
+        pending += [("options", address) for address in options]
+
+        # The router's mappings for the markets and keepers
+        mappings = [("contractRegistry", address) for address in options] + [
+            ("isKeeper", to_checksum_address(keeper)) for keeper in keepers
+        ]
+        mapping_calls = [
+            (router, _calldata(f"{mapping}(address)", ["address"], [key]))
+            for mapping, key in mappings
+        ]
+
+        rounds = 0
+        while pending:
+            rounds += 1
+            calls = [
+                (address, _calldata(f"{getter}()"))
+                for kind, address in pending
+                for getter, _ in READS[kind].values()
+            ]
+            if rounds == 1:
+                calls += mapping_calls
+            results = iter(self._call(calls, tag))
+
+            found = []
+            for kind, address in pending:
+                state = contracts[kind][address] = {}
+                for field, (_, abi_type) in READS[kind].items():
+                    state[field] = _decode(abi_type, next(results))
+                    linked = LINKS.get((kind, field))
+                    if linked and state[field] not in (None, ZERO_ADDRESS):
+                        found.append((linked, state[field]))
+            if rounds == 1:
+                registry = contracts["router"][router]
+                registry["contractRegistry"] = {}
+                registry["isKeeper"] = {}
+                for mapping, key in mappings:
+                    registry[mapping][key] = _decode("bool", next(results))
+            pending = [
+                (kind, address)
+                for kind, address in dict.fromkeys(found)
+                if address not in contracts[kind]
+            ]
+
+        schema = {
+            kind: {field: abi_type for field, (_, abi_type) in fields.items()}
+            for kind, fields in READS.items()
+        }
+        for mapping, _ in mappings:
+            schema["router"][mapping] = "mapping(address => bool)"
+        return {
+            "version": 1,
+            "chain_id": self.web3.eth.chain_id,
+            "block": block,
+            "taken_at": int(started),
+            "duration": round(time.time() - started, 3),
+            "rounds": rounds,
+            "requests": self.requests,
+            "schema": schema,
+            "contracts": contracts,
+        }
+
+
+def _json_value(value):
+    # uint256 values don't fit in a double, keep them exact for JS readers
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and abs(value) >= 2**53:
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _json_value(item) for key, item in value.items()}
+    return value
+
+
+def save_snapshot(snapshot, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_json_value(snapshot), f, indent=2)
+    os.replace(tmp, path)
+
+
+def main():
+    """
+    brownie run scripts/snapshot.py --network <network>
+
+    ROUTER: router address. OPTIONS: comma separated options addresses,
+    defaults to the markets recorded for POOL in deployments/markets.json.
+    KEEPERS: comma separated keeper addresses. AGGREGATOR: a deployed
+    BatchExecutor to aggregate the calls with. SNAPSHOT: output path.
+    """
+    from brownie import network, web3
+
+    from .market_catalog import AppliedMarkets
+
+    if os.environ.get("OPTIONS"):
+        options = os.environ["OPTIONS"].split(",")
+    else:
+        applied = AppliedMarkets(network.show_active(), os.environ["POOL"])
+        options = [
+            market["contracts"]["options"] for market in applied.markets.values()
+        ]
+    keepers = [k for k in os.environ.get("KEEPERS", "").split(",") if k]
+
+    reader = SnapshotReader(web3, aggregator=os.environ.get("AGGREGATOR"))
+    snapshot = reader.read(os.environ["ROUTER"], options, keepers)
+    snapshot["network"] = network.show_active()
+    path = os.environ.get(
+        "SNAPSHOT", SNAPSHOT_PATH.format(network=network.show_active())
+    )
+    save_snapshot(snapshot, path)
+    print(
+        f"Snapshot of {sum(len(c) for c in snapshot['contracts'].values())} "
+        f"contracts at block {snapshot['block']} in {snapshot['duration']}s "
+        f"({snapshot['requests']} requests), saved to {path}"
+    )
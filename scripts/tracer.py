@@ -0,0 +1,137 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .journal import current_scope
+
+
+class Tracer:
+    """
+    Timing instrumentation of deployment and admin runs. Every traced step
+    (deployment, transaction, anything wrapped in `span` or `trace`) becomes
+    one record with its duration, gas used, block and number of send
+    attempts, written as a JSON line to `path` if one is set. `summary` shows
+    where the time and the gas went.
+
+        with tracer.span("seed pool", kind="admin") as record:
+            ...
+            record["gas"] = receipt["gasUsed"]
+    """
+
+    def __init__(self, path=None):
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = None
+        if path:
+            self.open(path)
+
+    def open(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a")
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        """The innermost open span of this thread, or None"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, step, **fields):
+        record = {"step": step, "scope": current_scope(), **fields}
+        stack = self._stack()
+        stack.append(record)
+        start = time.time()
+        try:
+            yield record
+            record["status"] = "ok"
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = str(e)[:200]
+            raise
+        finally:
+            stack.pop()
+            record["started_at"] = start
+            record["duration"] = round(time.time() - start, 4)
+            self.emit(record)
+
+    def trace(self, step=None, **fields):
+        """Decorator version of span, named after the function by default"""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(step or fn.__name__, **fields):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def record_result(self, result, **fields):
+        """Record of a transaction tracked elsewhere (receipt_tracker.TxResult)"""
+        record = {"step": result.label, "scope": current_scope(), **fields}
+        record.update(
+            started_at=result.sent_at,
+            duration=round(result.latency, 4),
+            status="ok" if result.succeeded else "reverted",
+        )
+        add_result(record, result)
+        self.emit(record)
+
+    def emit(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self._file:
+                self._file.write(json.dumps(record, default=str) + "\n")
+                self._file.flush()
+
+    def summary(self, top=10):
+        with self._lock:
+            records = list(self.records)
+        if not records:
+            return "No traced steps"
+        gas = sum(r.get("gas") or 0 for r in records)
+        retries = sum(max(r.get("attempts", 1) - 1, 0) for r in records)
+        start = min(r["started_at"] for r in records)
+        end = max(r["started_at"] + r["duration"] for r in records)
+        failed = [r for r in records if r["status"] != "ok"]
+        lines = [
+            f"{len(records)} steps in {end - start:.1f}s, {gas} gas, "
+            f"{retries} retries, {len(failed)} failed",
+            f"Slowest {min(top, len(records))} steps:",
+        ]
+        for r in sorted(records, key=lambda r: r["duration"], reverse=True)[:top]:
+            scope = f"[{r['scope']}] " if r.get("scope") else ""
+            lines.append(
+                f"  {r['duration']:8.2f}s  {scope}{r['step']}"
+                f"  gas: {r.get('gas') or '-'}  attempts: {r.get('attempts', 1)}"
+            )
+        return "\n".join(lines)
+
+
+def add_result(record, result):
+    """Copies gas, block and hash of a mined transaction into a record"""
+    record.update(
+        txn_hash=result.txn_hash,
+        gas=result.gas_used,
+        block=result.block_number,
+    )
+    # Only set for deployments, results of other senders may not have it
+    if getattr(result, "contract_address", None):
+        record["address"] = result.contract_address
+    return record
@@ -1,17 +1,42 @@
+import hashlib
 import json
-from time import sleep
-
-import brownie
-from brownie import (
-    accounts,
-    network,
-    web3,
-)
-from colorama import Fore, Style
+import os
+import threading
+from time import strftime, time
+
+from brownie import network, web3
+from brownie._config import CONFIG
 from web3 import Web3
+from web3._utils.transactions import fill_transaction_defaults
+
+from .bundle import BUNDLE_PATH, DeploymentBundle
+from .contract_cache import ContractCache
+from .fee_strategy import FeeEscalator, FeeOracle
+from .journal import DeploymentJournal, current_scope, journal_path
+from .manifest import write_manifest
+from .nonce_manager import NonceManager
+from .receipt_tracker import ReceiptTracker, TxResult
+from .retry_policy import KNOWN, NONCE, TIMEOUT, TRANSPORT, RetryPolicy, classify
+from .rpc_provider import PooledHTTPProvider
+from .tracer import Tracer, add_result
+from .verification_queue import VerificationQueue
 
 BOLD = "\033[1m"
 
+nonce_manager = NonceManager(web3)
+receipt_tracker = ReceiptTracker(web3)
+retry_policy = RetryPolicy()
+contract_cache = ContractCache(web3)
+fee_oracle = FeeOracle(web3)
+tracer = Tracer()
+journal = None
+bundle = None
+verification_queue = None
+
+_step_counts = {}
+_step_lock = threading.Lock()
+_verification_lock = threading.Lock()
+
 
 def save_flat(container, name):
     code = container.get_verification_info()
@@ -21,84 +46,671 @@ def save_flat(container, name):
         outfile.write(code)
 
 
-def deploy_contract(_from, network, contract, args):
-    deployed_contract = None
-    attempts = 0
-    max_attempts = 5
-    delay = 2
-    publish_source = (
+def use_journal(script, network_name, run_id=None):
+    """
+    Records every deployment and transaction of this run of `script` from here
+    on. A new run starts with an empty journal, a previous (partially failed)
+    run is resumed by passing its `run_id`: its completed steps are skipped.
+    """
+    global journal
+    resume = run_id is not None
+    run_id = run_id or strftime("%Y%m%d-%H%M%S")
+    path = journal_path(script, network_name, run_id)
+    if resume and not os.path.exists(path):
+        raise Exception(f"No journal of run {run_id} at {path}")
+    journal = DeploymentJournal(network_name, path)
+    if resume:
+        journal.verify(web3)
+    else:
+        print(f"Journal of run {run_id} in {path}, resume it with RESUME={run_id}")
+    return journal
+
+
+def finish_journal():
+    """Clears the journal of a run that completed"""
+    global journal
+    if journal:
+        journal.finish()
+        journal = None
+
+
+def use_tracer(path):
+    """Writes a JSON line per deployment/transaction to `path`, see Tracer."""
+    tracer.open(path)
+    return tracer
+
+
+def save_manifest(network_name, contracts, markets, path=None):
+    """
+    Records the pool in the deployment manifest of the network (see
+    manifest.py). contracts: {name: (contract container, address)} of the
+    shared contracts, including the "pool", markets: {asset: {name: (contract
+    container, address)}}. The deploy blocks come from the deployments traced
+    during this run.
+    """
+
+    def describe(entries):
+        described = {}
+        for name, (container, address) in entries.items():
+            address = getattr(address, "address", address)
+            described[name] = (container._name, address, container.abi)
+        return described
+
+    blocks = {
+        record["address"].lower(): record["block"]
+        for record in tracer.records
+        if record.get("address") and record.get("block") is not None
+    }
+    pool = contracts["pool"][1]
+    manifest = write_manifest(
+        network_name,
+        web3.eth.chain_id,
+        getattr(pool, "address", pool),
+        describe(contracts),
+        {asset: describe(market) for asset, market in markets.items()},
+        blocks,
+        path,
+    )
+    print(
+        f"Saved manifest revision {manifest.revision} of {network_name}, pool "
+        f"{manifest.pool} ({len(manifest.contracts)} contracts, "
+        f"{len(manifest.markets)} markets)"
+    )
+    return manifest
+
+
+def use_pooled_provider(**kwargs):
+    """
+    Replaces the provider brownie connected with by a PooledHTTPProvider on
+    the same endpoint: keep-alive connections and concurrent reads batched
+    into JSON-RPC array requests. Returns the provider's metrics, or None if
+    the endpoint isn't HTTP.
+    """
+    provider = web3.provider
+    if isinstance(provider, PooledHTTPProvider):
+        return provider.metrics
+    endpoint = getattr(provider, "endpoint_uri", None)
+    if not endpoint or not str(endpoint).startswith("http"):
+        return None
+    web3.provider = PooledHTTPProvider(str(endpoint), **kwargs)
+    return web3.provider.metrics
+
+
+def rpc_report():
+    metrics = getattr(web3.provider, "metrics", None)
+    return metrics.report() if metrics else ""
+
+
+def record_bundle(path=BUNDLE_PATH):
+    """
+    Records every transaction sent from here on into a deployment bundle.
+    Meant to run against a fork of the target network, see DeploymentBundle.
+    A recording isn't journaled: resuming it would leave the skipped steps
+    out of the bundle, it is recorded again from scratch instead.
+    """
+    global bundle
+    bundle = DeploymentBundle(web3.eth.chain_id, path)
+    return bundle
+
+
+def _step_key(kind, name, args):
+    digest = hashlib.sha256(json.dumps(list(args), default=str).encode()).hexdigest()[
+        :16
+    ]
+    key = f"{kind}:{name}:{digest}"
+    if current_scope():
+        key = f"{current_scope()}/{key}"
+    # The same call can legitimately happen more than once (e.g. OptionStorage)
+    with _step_lock:
+        occurrence = _step_counts.get(key, 0)
+        _step_counts[key] = occurrence + 1
+    return f"{key}#{occurrence}"
+
+
+def get_verification_queue():
+    """
+    Process-wide source verification queue of the active network, drained by
+    a background thread. Whatever isn't verified when the script ends stays
+    queued for `brownie run scripts/utility.py drain_verification_queue`.
+    """
+    global verification_queue
+    with _verification_lock:
+        if verification_queue is None:
+            verification_queue = VerificationQueue(
+                CONFIG.active_network.get("explorer"),
+                os.environ.get("ARBISCAN_TOKEN"),
+                path=f"deployments/verification_queue_{network.show_active()}.json",
+            )
+            verification_queue.start()
+    return verification_queue
+
+
+def _verification(container, args):
+    """Arguments of VerificationQueue.enqueue besides the address"""
+    bytecode = container.bytecode.replace("0x", "", 1)
+    data = container.deploy.encode_input(*args).replace("0x", "", 1)
+    return {
+        "contract_name": container._name,
+        "source_path": container._build["sourcePath"],
+        "verification_info": container.get_verification_info(),
+        "constructor_args": data[len(bytecode) :],
+    }
+
+
+def queue_verification(container, contract, args):
+    get_verification_queue().enqueue(contract.address, **_verification(container, args))
+
+
+def drain_verification_queue():
+    print(get_verification_queue().drain(wait=True))
+
+
+def should_publish_source(network):
+    return (
         True
         if network.show_active() != "development"
         and "fork" not in network.show_active()
         else False
     )
 
-    while attempts < max_attempts:
+
+def deploy_contract(_from, network, contract, args):
+    with tracer.span(f"deploy {contract._name}", kind="deploy") as record:
+        deployed_contract = _deploy_contract(_from, network, contract, args, record)
+        record["address"] = deployed_contract.address
+        return deployed_contract
+
+
+def _deploy_contract(_from, network, contract, args, record):
+    if journal:
+        key = _step_key("deploy", contract._name, args)
+        recorded = journal.completed(key)
+        if recorded:
+            print(f"Skipping {key}, already deployed at {recorded['address']}")
+            record["skipped"] = True
+            return contract.at(recorded["address"])
+
+    if bundle:
+        return _deploy_bundled(_from, contract, args, record)
+
+    def deploy(attempt):
+        record["attempts"] = attempt.number + 1
+        nonce = nonce_manager.next_nonce(_from.address)
+        kwargs = {}
+        if attempt.fee_multiplier != 1:
+            kwargs["gas_price"] = attempt.gas_price(web3.eth.gas_price)
         try:
-            # Attempt to execute the transaction
-            deployed_contract = _from.deploy(
+            return _from.deploy(
                 contract,
                 *args,
+                nonce=nonce,
                 allow_revert=True,
-                publish_source=publish_source,
                 # gas_limit=20_000_000,
+                **kwargs,
             )
         except Exception as e:
-            # If the transaction fails, wait for a short delay before retrying
-            print(e)
-            sleep(delay)
-            attempts += 1
+            # A deployment that was mined and reverted used its nonce
+            txn_hash = getattr(e, "txid", None)
+            if not (txn_hash and _was_broadcast(txn_hash, e)):
+                _recover_nonce(_from.address, nonce, classify(e))
+            raise
+
+    deployed_contract = retry_policy.execute(deploy, label=f"deploy {contract._name}")
+    if deployed_contract.tx:
+        record.update(
+            txn_hash=deployed_contract.tx.txid,
+            gas=deployed_contract.tx.gas_used,
+            block=deployed_contract.tx.block_number,
+        )
+    if should_publish_source(network):
+        queue_verification(contract, deployed_contract, args)
+    if journal:
+        journal.record_deploy(
+            key,
+            contract._name,
+            deployed_contract.address,
+            deployed_contract.tx.txid if deployed_contract.tx else None,
+        )
+    return deployed_contract
+
+
+def _deploy_bundled(_from, contract, args, record):
+    # Signed by us so that the raw transaction ends up in the bundle
+    txn_hash, nonce = send_deployment(contract, *args, sender=_from)
+    result = receipt_tracker.track(
+        txn_hash, label=f"deploy {contract._name}", nonce=nonce, sender=_from.address
+    ).result()
+    print(result)
+    add_result(record, result)
+    if not result.succeeded:
+        raise Exception(f"Deployment of {contract._name} reverted")
+    # The fork isn't verified, the target network is once the bundle is broadcast
+    bundle.add_verification(txn_hash, _verification(contract, args))
+    return contract.at(result.contract_address)
+
+
+def _recover_nonce(address, nonce, error_class):
+    if error_class == NONCE:
+        nonce_manager.resync(address)
+    elif error_class in (TIMEOUT, TRANSPORT):
+        # The node may have the transaction, only the chain knows the nonce
+        nonce_manager.resync(address)
+    else:
+        # Rejected by the node, the nonce is free
+        nonce_manager.release(address, nonce)
+
+
+def _was_broadcast(txn_hash, e):
+    """Whether the node has the transaction even though sending it failed"""
+    if classify(e) == KNOWN:
+        return True
+    try:
+        return web3.eth.get_transaction(txn_hash) is not None
+    except Exception:
+        return False
+
+
+def _send(build, sender, gas=None, gas_price=None, value=None, label=None):
+    # Attempts are counted on the deploy_contract/transact record, if any
+    record = tracer.current()
+    if record is not None and record.get("kind") not in ("deploy", "transact"):
+        record = None
+
+    # Transaction of an attempt that timed out, the node may have it so it is
+    # sent again as is rather than rebuilt at another nonce
+    unconfirmed = []
+
+    def send(attempt):
+        if record is not None:
+            record["attempts"] = attempt.number + 1
+        if unconfirmed:
+            tx, signed_txn, nonce = unconfirmed.pop()
         else:
-            # If the transaction succeeds, return the result
-            return deployed_contract
+            nonce = nonce_manager.next_nonce(sender.address)
+            try:
+                params = {"from": sender.address, "nonce": nonce}
+                if gas is not None:
+                    params["gas"] = gas
+                if gas_price is not None:
+                    params["gasPrice"] = attempt.gas_price(gas_price)
+                else:
+                    params.update(fee_oracle.fees(attempt.fee_multiplier))
+                if value is not None:
+                    params["value"] = value
+                tx = build(params)
+                signed_txn = web3.eth.account.sign_transaction(
+                    tx, private_key=sender.private_key
+                )
+            except Exception:
+                nonce_manager.release(sender.address, nonce)
+                raise
+        txn_hash = web3.toHex(Web3.keccak(signed_txn.rawTransaction))
+        try:
+            web3.eth.sendRawTransaction(signed_txn.rawTransaction)
+        except Exception as e:
+            error_class = classify(e)
+            if _was_broadcast(txn_hash, e):
+                pass
+            elif error_class in (TIMEOUT, TRANSPORT):
+                unconfirmed.append((tx, signed_txn, nonce))
+                raise
+            else:
+                _recover_nonce(sender.address, nonce, error_class)
+                raise
+        if bundle:
+            if record is not None:
+                record["bundled"] = True
+            bundle.add(
+                label,
+                sender.address,
+                nonce,
+                tx.get("to"),
+                web3.toHex(signed_txn.rawTransaction),
+                txn_hash,
+            )
+        return txn_hash, nonce
 
-    # If the transaction has failed after the maximum number of attempts, raise an error
-    raise Exception("Transaction failed after {} attempts".format(max_attempts))
+    try:
+        return retry_policy.execute(send, label=label)
+    except Exception:
+        if unconfirmed:
+            # Gave up without knowing whether the node got it
+            nonce_manager.resync(sender.address)
+        raise
 
 
-def transact(
+def _call_builder(contract_address, abi, method, args, gas=None, value=None):
+    calldata = contract_cache.encode(contract_address, abi, method, args)
+
+    def build(params):
+        params = dict(params, to=contract_address, data=calldata)
+        if gas is not None:
+            params["gas"] = gas
+        if value is not None:
+            params["value"] = value
+        return fill_transaction_defaults(web3, params)
+
+    return build
+
+
+def _send_with_replacement(build, sender, deadline, label):
+    """
+    Sends with fees from the fee oracle and replaces the transaction with
+    escalating fees while it isn't mined within `deadline` seconds.
+    """
+    nonce = nonce_manager.next_nonce(sender.address)
+
+    def sign(fees):
+        tx = build(dict({"from": sender.address, "nonce": nonce}, **fees))
+        return web3.eth.account.sign_transaction(
+            tx, private_key=sender.private_key
+        ).rawTransaction
+
+    sent_at = time()
+    try:
+        txn_hash, receipt, replacements = FeeEscalator(
+            web3, fee_oracle, deadline=deadline
+        ).send(sign, label)
+    except Exception:
+        # Whether anything is pending at this nonce is only known to the node
+        nonce_manager.resync(sender.address)
+        raise
+    if replacements:
+        print(f"{label} mined after {replacements} replacements")
+        if tracer.current() is not None:
+            tracer.current()["replacements"] = replacements
+    return TxResult.from_receipt(
+        receipt, label, txn_hash, nonce, sender.address, sent_at
+    )
+
+
+def send_transaction(
     contract_address, abi, method, *args, sender, gas=None, gas_price=None, value=None
 ):
-    contract = web3.eth.contract(abi=abi, address=contract_address)
-    attempts = 0
-    max_attempts = 10
-    delay = 2
-    gasPrice = int(3e9)
-    while attempts < max_attempts:
-        try:
-            nonce = web3.eth.getTransactionCount(sender.address)
-            tx = getattr(contract.functions, method)(*args)
-            tx = tx.buildTransaction(
-                {
-                    "from": sender.address,
-                    # "gasPrice": gasPrice,
-                    "nonce": nonce,
-                }
-            )
-            signed_txn = web3.eth.account.sign_transaction(
-                tx, private_key=sender.private_key
-            )
-            tx = web3.eth.sendRawTransaction(signed_txn.rawTransaction)
-            txn_hash = web3.toHex(Web3.keccak(signed_txn.rawTransaction))
-            web3.eth.wait_for_transaction_receipt(txn_hash)
-            receipt = web3.eth.get_transaction_receipt(txn_hash)
-            print(
-                f"Transaction sent: {Fore.BLUE}{BOLD}{txn_hash}{Style.RESET_ALL}",
-            )
-            print(
-                f"  Gas price: {Fore.BLUE}{BOLD}{gasPrice/1e9}{Style.RESET_ALL} gwei  Nonce: {Fore.BLUE}{BOLD}{nonce}{Style.RESET_ALL}"
-            )
-            print(
-                f"  {method} confirmed   Block: {Fore.BLUE}{BOLD}{receipt.blockNumber}{Style.RESET_ALL}   Gas used: {Fore.BLUE}{BOLD}{receipt.gasUsed}{Style.RESET_ALL}"
+    """
+    Builds, signs and broadcasts the transaction with a locally assigned nonce
+    without waiting for it to be mined. Returns the transaction hash and nonce.
+    """
+    return _send(
+        _call_builder(contract_address, abi, method, args),
+        sender,
+        gas,
+        gas_price,
+        value,
+        label=method,
+    )
+
+
+def send_deployment(contract, *args, sender, gas=None, gas_price=None):
+    """
+    Same as send_transaction for the deployment of a brownie contract container
+    """
+    factory = web3.eth.contract(abi=contract.abi, bytecode=contract.bytecode)
+    return _send(
+        lambda params: factory.constructor(*args).buildTransaction(params),
+        sender,
+        gas,
+        gas_price,
+        label=f"deploy {contract._name}",
+    )
+
+
+def _journal_transaction_key(contract_address, method, args):
+    if not journal:
+        return None, None
+    key = _step_key("call", f"{contract_address}.{method}", args)
+    recorded = journal.completed(key)
+    if recorded:
+        print(f"Skipping {key}, already sent in {recorded['txn_hash']}")
+    return key, recorded
+
+
+def transact(
+    contract_address,
+    abi,
+    method,
+    *args,
+    sender,
+    gas=None,
+    gas_price=None,
+    value=None,
+    deadline=None,
+):
+    """
+    Sends the transaction and waits for it to be mined. With a `deadline` (in
+    seconds) it is replaced with escalating fees whenever it isn't mined in
+    time, for time sensitive transactions.
+    """
+    with tracer.span(method, kind="transact", to=contract_address) as record:
+        return _transact(
+            record,
+            contract_address,
+            abi,
+            method,
+            args,
+            sender,
+            gas,
+            gas_price,
+            value,
+            deadline,
+        )
+
+
+def _transact(
+    record, contract_address, abi, method, args, sender, gas, gas_price, value, deadline
+):
+    key, recorded = _journal_transaction_key(contract_address, method, args)
+    if recorded:
+        record["skipped"] = True
+        return recorded["txn_hash"]
+    # Fees of a bundle are fixed when it is signed, the fork can't replace them
+    if deadline and not bundle:
+        record["deadline"] = deadline
+        result = _send_with_replacement(
+            _call_builder(contract_address, abi, method, args, gas, value),
+            sender,
+            deadline,
+            method,
+        )
+        txn_hash = result.txn_hash
+    else:
+        txn_hash, nonce = send_transaction(
+            contract_address,
+            abi,
+            method,
+            *args,
+            sender=sender,
+            gas=gas,
+            gas_price=gas_price,
+            value=value,
+        )
+        result = receipt_tracker.track(
+            txn_hash, label=method, nonce=nonce, sender=sender.address
+        ).result()
+    print(result)
+    add_result(record, result)
+    if journal and result.succeeded:
+        journal.record_transaction(key, method, txn_hash)
+    return txn_hash
+
+
+def encode_call(contract_address, abi, method, *args):
+    """
+    Returns the (target, calldata) pair of a call, as expected by
+    BatchExecutor.execute/aggregate.
+    """
+    return (
+        contract_address,
+        contract_cache.encode(contract_address, abi, method, args),
+    )
+
+
+def batch_transact(executor, calls, sender, batch_size=None, gas=None):
+    """
+    Sends the (target, calldata) calls through the BatchExecutor, `batch_size`
+    calls per transaction (all of them in one by default). The calls run in
+    order and a failing call reverts its whole batch. Returns the transaction
+    hashes.
+    """
+    batch_size = batch_size or len(calls)
+    return [
+        transact(
+            executor.address,
+            executor.abi,
+            "execute",
+            calls[start : start + batch_size],
+            sender=sender,
+            gas=gas,
+        )
+        for start in range(0, len(calls), batch_size)
+    ]
+
+
+class PendingDeployment:
+    def __init__(self, container, txn_hash, args=()):
+        self.container = container
+        self.txn_hash = txn_hash
+        self.args = args
+        self.contract = None
+
+    @property
+    def address(self):
+        return self.contract.address
+
+
+class TransactionPipeline:
+    """
+    Sends transactions back to back while their receipts are tracked
+    concurrently in the background. Transactions of one sender are still mined
+    in the order they were sent, so only pipeline calls whose gas estimation
+    doesn't depend on an earlier transaction of the same pipeline (or pass
+    `gas` explicitly).
+
+        with TransactionPipeline() as pipeline:
+            pipeline.transact(config.address, config.abi, "setMinFee", fee, sender=admin)
+            pending = pipeline.deploy(OptionStorage, sender=admin)
+        option_storage = pending.contract
+    """
+
+    def __init__(self, tracker=None):
+        self.tracker = tracker or receipt_tracker
+        self.results = []
+        self._pending = []
+        self._deployments = {}
+        self._journal_keys = {}
+
+    def transact(
+        self,
+        contract_address,
+        abi,
+        method,
+        *args,
+        sender,
+        gas=None,
+        gas_price=None,
+        value=None,
+    ):
+        key, recorded = _journal_transaction_key(contract_address, method, args)
+        if recorded:
+            return recorded["txn_hash"]
+        txn_hash, nonce = send_transaction(
+            contract_address,
+            abi,
+            method,
+            *args,
+            sender=sender,
+            gas=gas,
+            gas_price=gas_price,
+            value=value,
+        )
+        self._track(txn_hash, method, nonce, sender)
+        if key:
+            self._journal_keys[txn_hash] = key
+        return txn_hash
+
+    def deploy(self, contract, *args, sender, gas=None, gas_price=None):
+        key = _step_key("deploy", contract._name, args) if journal else None
+        recorded = journal.completed(key) if journal else None
+        if recorded:
+            print(f"Skipping {key}, already deployed at {recorded['address']}")
+            pending = PendingDeployment(contract, recorded["txn_hash"])
+            pending.contract = contract.at(recorded["address"])
+            return pending
+
+        txn_hash, nonce = send_deployment(
+            contract, *args, sender=sender, gas=gas, gas_price=gas_price
+        )
+        self._track(txn_hash, f"deploy {contract._name}", nonce, sender)
+        pending = PendingDeployment(contract, txn_hash, args)
+        self._deployments[txn_hash] = pending
+        if key:
+            self._journal_keys[txn_hash] = key
+        return pending
+
+    def _track(self, txn_hash, label, nonce, sender):
+        self._pending.append(
+            self.tracker.track(
+                txn_hash, label=label, nonce=nonce, sender=sender.address
             )
-            print(" ")
-            return txn_hash
+        )
 
-        except Exception as e:
-            # If the transaction fails, wait for a short delay before retrying
-            print(f"{Fore.RED}{e}{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}Retry attempt {attempts}...{Style.RESET_ALL}")
-            sleep(delay)
-            attempts += 1
+    def wait(self):
+        """
+        Waits for every transaction sent so far, journals the successful ones
+        and then raises the first tracking error or the reverts, if any.
+        """
+        pending, self._pending = self._pending, []
+        results = []
+        errors = []
+        # Every receipt is collected even if one fails, so that what was mined
+        # is journaled and a resume doesn't send it again
+        for future in pending:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        for result in results:
+            print(result)
+            tracer.record_result(result, kind="pipeline")
+            deployment = self._deployments.pop(result.txn_hash, None)
+            key = self._journal_keys.pop(result.txn_hash, None)
+            if not result.succeeded:
+                continue
+            if deployment:
+                deployment.contract = deployment.container.at(result.contract_address)
+                if should_publish_source(network):
+                    queue_verification(
+                        deployment.container, deployment.contract, deployment.args
+                    )
+            if key and deployment:
+                journal.record_deploy(
+                    key,
+                    deployment.container._name,
+                    result.contract_address,
+                    result.txn_hash,
+                )
+            elif key:
+                journal.record_transaction(key, result.label, result.txn_hash)
+        self.results.extend(results)
+
+        if errors:
+            raise errors[0]
+        failed = [f"{r.label} ({r.txn_hash})" for r in results if not r.succeeded]
+        if failed:
+            raise Exception("Transactions reverted: {}".format(", ".join(failed)))
+        return results
 
-    raise Exception("Transaction failed after {} attempts".format(max_attempts))
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.wait()
+            return False
+        # Transactions sent before the error are still journaled, the original
+        # error is the one raised
+        try:
+            self.wait()
+        except Exception as e:
+            print(f"Pipeline: {e}")
+        return False
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+QUEUE_PATH = "deployments/verification_queue.json"
+
+QUEUED = "queued"
+SUBMITTED = "submitted"
+VERIFIED = "verified"
+FAILED = "failed"
+
+
+class VerificationQueue:
+    """
+    Persistent queue of contracts waiting for source verification on an
+    etherscan compatible explorer. Deployments only enqueue their verification
+    info, the queue is drained by a background thread or on a later run, so
+    explorer latency and outages never block a deployment.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        api_key=None,
+        path=QUEUE_PATH,
+        poll_interval=5,
+        max_attempts=5,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Passes of the background thread and explicit drains don't overlap
+        self._drain_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)["entries"]
+
+    def enqueue(
+        self, address, contract_name, source_path, verification_info, constructor_args
+    ):
+        with self._lock:
+            if self.entries.get(address, {}).get("state") == VERIFIED:
+                return
+            self.entries[address] = {
+                "state": QUEUED,
+                "contract_name": contract_name,
+                "source_path": source_path,
+                "compiler_version": verification_info["compiler_version"],
+                "optimizer_enabled": verification_info["optimizer_enabled"],
+                "optimizer_runs": verification_info["optimizer_runs"],
+                "license_identifier": verification_info.get("license_identifier"),
+                "standard_json_input": verification_info["standard_json_input"],
+                "constructor_args": constructor_args,
+                "guid": None,
+                "attempts": 0,
+                "last_error": None,
+            }
+            self._save()
+
+    def pending(self):
+        with self._lock:
+            return [
+                address
+                for address, entry in self.entries.items()
+                if entry["state"] in (QUEUED, SUBMITTED)
+            ]
+
+    def drain(self, wait=False):
+        """
+        One pass over the pending entries: submits the queued ones and polls
+        the status of the submitted ones. With `wait` it keeps polling until
+        nothing is pending anymore.
+        """
+        while True:
+            with self._drain_lock:
+                for address in self.pending():
+                    self._process(address)
+            if not wait or not self.pending() or self._stop.is_set():
+                break
+            time.sleep(self.poll_interval)
+        return self.summary()
+
+    def start(self):
+        """Drains the queue in a background thread until stop() is called."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def summary(self):
+        with self._lock:
+            states = [entry["state"] for entry in self.entries.values()]
+        return {
+            state: states.count(state)
+            for state in (QUEUED, SUBMITTED, VERIFIED, FAILED)
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                # e.g. the queue file couldn't be written, the next pass retries
+                print(f"Verification queue: {type(e).__name__}: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def _process(self, address):
+        entry = self.entries[address]
+        try:
+            if entry["state"] == QUEUED:
+                state, result = self._submit(address, entry)
+            else:
+                state, result = self._check(entry)
+        except Exception as e:
+            # Transport errors as well as unexpected responses (e.g. an HTML
+            # error page), only this entry is retried
+            state, result = entry["state"], f"{type(e).__name__}: {e}"
+
+        with self._lock:
+            if state == SUBMITTED and entry["state"] == QUEUED:
+                entry["guid"] = result
+                result = None
+            if state in (QUEUED, SUBMITTED) and result is not None:
+                # The explorer can't handle the request (yet), e.g. it hasn't
+                # indexed the contract. Retried on the next pass.
+                entry["attempts"] += 1
+                entry["last_error"] = result
+                if entry["attempts"] >= self.max_attempts:
+                    state = FAILED
+            elif state == FAILED:
+                entry["last_error"] = result
+            entry["state"] = state
+            self._save()
+        print(f"Verification of {entry['contract_name']} at {address}: {state}")
+
+    def _submit(self, address, entry):
+        response = requests.post(
+            self.api_url,
+            data={
+                "apikey": self.api_key,
+                "module": "contract",
+                "action": "verifysourcecode",
+                "contractaddress": address,
+                "sourceCode": json.dumps(entry["standard_json_input"]),
+                "codeformat": "solidity-standard-json-input",
+                "contractname": f"{entry['source_path']}:{entry['contract_name']}",
+                "compilerversion": f"v{entry['compiler_version']}",
+                "optimizationUsed": int(entry["optimizer_enabled"]),
+                "runs": entry["optimizer_runs"],
+                "constructorArguements": entry["constructor_args"],
+                "licenseType": entry["license_identifier"],
+            },
+            timeout=30,
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body["status"] == "1":
+            return SUBMITTED, body["result"]
+        if "already verified" in body["result"].lower():
+            return VERIFIED, None
+        return QUEUED, body["result"]
+
+    def _check(self, entry):
+        response = requests.get(
+            self.api_url,
+            params={
+                "apikey": self.api_key,
+                "module": "contract",
+                "action": "checkverifystatus",
+                "guid": entry["guid"],
+            },
+            timeout=30,
+        )
+        response.raise_for_status()
+        result = response.json()["result"]
+        if result.startswith("Pass") or "already verified" in result.lower():
+            return VERIFIED, None
+        if result.startswith("Pending"):
+            return SUBMITTED, None
+        return FAILED, result
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": 1, "entries": self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
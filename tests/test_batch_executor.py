@@ -0,0 +1,155 @@
+import brownie
+from brownie import (
+    BatchExecutor,
+    BufferBinaryOptions,
+    MarketOIConfig,
+    OptionsConfig,
+    OptionStorage,
+    PoolOIStorage,
+)
+
+
+def deploy_market(contracts, accounts):
+    pool = contracts["binary_pool_atm"]
+    config = OptionsConfig.deploy(pool.address, {"from": accounts[0]})
+    options = BufferBinaryOptions.deploy({"from": accounts[0]})
+    option_storage = OptionStorage.deploy({"from": accounts[0]})
+    market_oi_config = MarketOIConfig.deploy(
+        int(50000e6), int(1000e6), options.address, {"from": accounts[0]}
+    )
+    return config, options, option_storage, market_oi_config
+
+
+def market_setup_calls(contracts, market, pool_oi_storage, sfd):
+    config, options, option_storage, market_oi_config = market
+    router = contracts["router"]
+    return [
+        (
+            options,
+            "initialize",
+            [
+                contracts["tokenX"].address,
+                contracts["binary_pool_atm"].address,
+                config.address,
+                contracts["referral_contract"].address,
+                1,
+                "BTC",
+                "USD",
+            ],
+        ),
+        (options, "approvePoolToTransferTokenX", []),
+        (options, "grantRole", [options.ROUTER_ROLE(), router.address]),
+        (
+            pool_oi_storage,
+            "grantRole",
+            [pool_oi_storage.UPDATOR_ROLE(), options.address],
+        ),
+        (router, "setContractRegistry", [options.address, True]),
+        (config, "setSettlementFeeDisbursalContract", [sfd]),
+        (config, "setOptionStorageContract", [option_storage.address]),
+        (config, "setPoolOIStorageContract", [pool_oi_storage.address]),
+        (config, "setMarketOIConfigContract", [market_oi_config.address]),
+        (config, "setMinFee", [int(1e6)]),
+        (config, "setPlatformFee", [int(1e5)]),
+        (config, "setMinPeriod", [3 * 60]),
+        (config, "setMaxPeriod", [4 * 60 * 60]),
+        (config, "toggleEarlyClose", []),
+    ]
+
+
+def encode(calls):
+    return [
+        (contract.address, getattr(contract, method).encode_input(*args))
+        for contract, method, args in calls
+    ]
+
+
+def test_batched_market_setup(contracts, accounts, chain):
+    router = contracts["router"]
+    sfd = contracts["settlement_fee_disbursal"]
+    pool_oi_storage = PoolOIStorage.deploy({"from": accounts[0]})
+    executor = BatchExecutor.deploy({"from": accounts[0]})
+
+    # One transaction per call
+    market = deploy_market(contracts, accounts)
+    calls = market_setup_calls(contracts, market, pool_oi_storage, sfd)
+    sequential_gas = 0
+    for contract, method, args in calls:
+        txn = getattr(contract, method)(*args, {"from": accounts[0]})
+        sequential_gas += txn.gas_used
+
+    # The same setup through the executor
+    market = deploy_market(contracts, accounts)
+    config, options, option_storage, market_oi_config = market
+    for contract in [router, pool_oi_storage, options]:
+        contract.grantRole(
+            contract.DEFAULT_ADMIN_ROLE(), executor.address, {"from": accounts[0]}
+        )
+    config.transferOwnership(executor.address, {"from": accounts[0]})
+
+    calls = market_setup_calls(contracts, market, pool_oi_storage, sfd)
+    txn = executor.execute(encode(calls), {"from": accounts[0]})
+    assert txn.events["ExecuteBatch"]["calls"] == len(calls), "Wrong call count"
+    print(
+        f"{len(calls)} setup calls: {sequential_gas} gas in {len(calls)} "
+        f"transactions, {txn.gas_used} gas batched"
+    )
+    assert txn.gas_used < sequential_gas, "Batching should save gas"
+
+    assert options.config() == config.address, "Not initialized"
+    assert options.hasRole(options.ROUTER_ROLE(), router.address), "Wrong role"
+    assert pool_oi_storage.hasRole(
+        pool_oi_storage.UPDATOR_ROLE(), options.address
+    ), "Wrong role"
+    assert router.contractRegistry(options.address), "Not registered"
+    assert config.optionStorageContract() == option_storage.address, "Wrong config"
+    assert config.marketOIConfigContract() == market_oi_config.address, "Wrong config"
+    assert config.minPeriod() == 3 * 60, "Wrong config"
+    assert config.maxPeriod() == 4 * 60 * 60, "Wrong config"
+    assert config.isEarlyCloseAllowed(), "Wrong config"
+
+    # Hand everything back in a single batch
+    calls = [(config, "transferOwnership", [accounts[0].address])] + [
+        (contract, "renounceRole", [contract.DEFAULT_ADMIN_ROLE(), executor.address])
+        for contract in [router, pool_oi_storage, options]
+    ]
+    executor.execute(encode(calls), {"from": accounts[0]})
+    assert config.owner() == accounts[0], "Ownership not returned"
+    assert not options.hasRole(
+        options.DEFAULT_ADMIN_ROLE(), executor.address
+    ), "Role not renounced"
+
+
+def test_batch_reverts(contracts, accounts, chain):
+    executor = BatchExecutor.deploy({"from": accounts[0]})
+    config = OptionsConfig.deploy(
+        contracts["binary_pool_atm"].address, {"from": accounts[0]}
+    )
+    config.transferOwnership(executor.address, {"from": accounts[0]})
+
+    calls = encode([(config, "setMinFee", [int(2e6)]), (config, "setMinPeriod", [1])])
+    with brownie.reverts("MinPeriod needs to be greater than 1 minute"):
+        executor.execute(calls, {"from": accounts[0]})
+    assert config.minFee() != int(2e6), "Batch should be atomic"
+
+    with brownie.reverts("Ownable: caller is not the owner"):
+        executor.execute(calls[:1], {"from": accounts[1]})
+
+
+def test_aggregate(contracts, accounts, chain):
+    executor = BatchExecutor.deploy({"from": accounts[0]})
+    config = contracts["binary_options_config_atm"]
+    options = contracts["binary_european_options_atm"]
+
+    results = executor.aggregate(
+        encode(
+            [
+                (config, "minPeriod", []),
+                (options, "config", []),
+                (options, "initialize", [*[options.address] * 4, 1, "A", "B"]),
+            ]
+        )
+    )
+    assert results[0][0] and int(results[0][1].hex(), 16) == config.minPeriod()
+    assert results[1][0] and results[1][1].hex()[-40:] == config.address[2:].lower()
+    assert not results[2][0], "State changing call should fail"
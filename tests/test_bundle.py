@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+
+from scripts.bundle import DeploymentBundle, create_address
+from scripts.receipt_tracker import TxResult
+
+SENDER = "0x" + "11" * 20
+
+
+class Eth:
+    chain_id = 42161
+
+    def __init__(self):
+        self.sent = []
+
+    def getTransactionCount(self, sender, block):
+        return 0
+
+    def sendRawTransaction(self, raw):
+        self.sent.append(raw)
+
+
+class Web3:
+    def __init__(self):
+        self.eth = Eth()
+
+
+class Tracker:
+    def track(self, txn_hash, label, nonce, sender):
+        future = Future()
+        future.set_result(
+            TxResult(
+                label=label,
+                txn_hash=txn_hash,
+                nonce=nonce,
+                sender=sender,
+                sent_at=0,
+                confirmed_at=0,
+                block_number=1,
+                gas_used=21000,
+                effective_gas_price=0,
+                status=1,
+                contract_address=create_address(sender, nonce),
+            )
+        )
+        return future
+
+
+class Queue:
+    def __init__(self):
+        self.entries = {}
+
+    def enqueue(self, address, **verification):
+        self.entries[address] = verification
+
+
+def test_bundled_deployment_queued_for_verification(tmp_path):
+    path = str(tmp_path / "bundle.json")
+    bundle = DeploymentBundle(42161, path=path)
+    bundle.add("deploy OptionRouter", SENDER, 0, None, "0x01", "0xaa")
+    bundle.add("setKeeper", SENDER, 1, SENDER, "0x02", "0xbb")
+    verification = {"contract_name": "OptionRouter", "constructor_args": "00"}
+    bundle.add_verification("0xaa", verification)
+    # Saved as recorded
+    assert DeploymentBundle.load(path).transactions == bundle.transactions
+
+    queue = Queue()
+    bundle.broadcast(Web3(), tracker=Tracker(), verification_queue=queue)
+    assert queue.entries == {create_address(SENDER, 0): verification}
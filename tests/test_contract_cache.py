@@ -0,0 +1,33 @@
+from brownie import OptionsConfig, web3
+
+from scripts.contract_cache import ContractCache
+
+
+def test_contract_cache(contracts, accounts, chain):
+    cache = ContractCache(web3)
+    config = contracts["binary_options_config_atm"]
+    options = contracts["binary_european_options_atm"]
+
+    assert cache.contract(config.address, config.abi) is cache.contract(
+        config.address, config.abi
+    ), "Contract objects should be reused"
+    assert cache.stats["contract_misses"] == 1
+
+    calldata = cache.encode(config.address, config.abi, "setMinFee", [int(1e6)])
+    assert calldata == config.setMinFee.encode_input(int(1e6))
+    assert cache.selector(config.abi, "setMinFee") == [calldata[:10]]
+
+    # The same setter on another config is served from the cache
+    other_config = OptionsConfig.deploy(
+        contracts["binary_pool_atm"].address, {"from": accounts[0]}
+    )
+    assert (
+        cache.encode(other_config.address, other_config.abi, "setMinFee", (int(1e6),))
+        == calldata
+    )
+    assert cache.stats["calldata_hits"] == 1
+
+    role = options.ROUTER_ROLE()
+    assert cache.encode(
+        options.address, options.abi, "grantRole", [role, accounts[1].address]
+    ) == options.grantRole.encode_input(role, accounts[1].address)
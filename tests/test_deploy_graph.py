@@ -0,0 +1,100 @@
+import pytest
+
+from scripts.deploy_graph import DeploymentGraph
+
+
+def test_levels():
+    graph = DeploymentGraph()
+    graph.add("router", lambda results: "router")
+    graph.add("pool", lambda results: "pool")
+    graph.add("ETHUSD:options", lambda results: None, deps=["router", "pool"])
+    graph.add("ETHUSD:config", lambda results: None, deps=["ETHUSD:options"])
+    graph.add("BTCUSD:options", lambda results: None, deps=["pool"])
+    assert graph.levels() == [
+        ["router", "pool"],
+        ["ETHUSD:options", "BTCUSD:options"],
+        ["ETHUSD:config"],
+    ]
+
+
+def test_invalid_graph():
+    graph = DeploymentGraph()
+    graph.add("options", lambda results: None, deps=["config"])
+    graph.add("config", lambda results: None, deps=["options"])
+    with pytest.raises(ValueError, match="Dependency cycle"):
+        graph.run()
+
+    graph = DeploymentGraph()
+    graph.add("options", lambda results: None, deps=["router"])
+    with pytest.raises(ValueError, match="unknown step router"):
+        graph.levels()
+
+    with pytest.raises(ValueError, match="already defined"):
+        graph.add("options", lambda results: None)
+
+
+def test_results_passed_to_dependents():
+    graph = DeploymentGraph()
+    graph.add("pool", lambda results: "pool")
+    graph.add("options", lambda results: results["pool"] + ":options", deps=["pool"])
+    assert graph.run() == {"pool": "pool", "options": "pool:options"}
+
+
+def test_failure_stops_dependents():
+    ran = []
+    graph = DeploymentGraph()
+
+    def deploy_options(results):
+        raise ValueError("deployment reverted")
+
+    graph.add("ETHUSD:options", deploy_options)
+    graph.add(
+        "ETHUSD:config", lambda results: ran.append("config"), deps=["ETHUSD:options"]
+    )
+    graph.add("BTCUSD:options", lambda results: ran.append("BTCUSD"))
+    with pytest.raises(ValueError, match="deployment reverted"):
+        graph.run(max_workers=2)
+    # Steps already started finish, dependents of the failure never start
+    assert "config" not in ran
+    assert "ETHUSD:options" in graph.durations
+
+
+def test_finalizer_runs_after_failed_step():
+    revoked = []
+    graph = DeploymentGraph()
+    graph.add("market_factory", lambda results: "factory")
+    graph.add("ETHUSD:market", lambda results: "market", deps=["market_factory"])
+
+    def create_market(results):
+        raise ValueError("createMarket reverted")
+
+    graph.add("BTCUSD:market", create_market, deps=["market_factory"])
+    graph.add_finalizer(
+        "revoke_market_factory",
+        lambda results: revoked.append(results["market_factory"]),
+        deps=["market_factory"],
+    )
+    with pytest.raises(ValueError, match="createMarket reverted"):
+        graph.run()
+    assert revoked == ["factory"]
+
+
+def test_finalizer_skipped_without_dependencies():
+    revoked = []
+    graph = DeploymentGraph()
+
+    def deploy_market_factory(results):
+        raise ValueError("deployment reverted")
+
+    graph.add("market_factory", deploy_market_factory)
+    graph.add_finalizer(
+        "revoke_market_factory", revoked.append, deps=["market_factory"]
+    )
+    with pytest.raises(ValueError):
+        graph.run()
+    assert revoked == []
+
+    graph = DeploymentGraph()
+    graph.add("market_factory", lambda results: "factory")
+    graph.add_finalizer("revoke", lambda results: "revoked", deps=["market_factory"])
+    assert graph.run()["revoke"] == "revoked"
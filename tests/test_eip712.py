@@ -0,0 +1,118 @@
+import re
+import time
+
+from eth_account import Account
+from eth_account.messages import encode_structured_data
+
+from scripts import eip712
+
+ROUTER = "0x0e0A1241C9cE6649d5D30134a194BA3E24130305"
+USER = "0x11E7d4D9a78DF6A70D45CFEc6002bA18868b93eB"
+KEY = "0x" + "42" * 32
+STRUCTS = [
+    eip712.USER_TRADE,
+    eip712.USER_TRADE_WITH_SF,
+    eip712.MARKET_DIRECTION,
+    eip712.MARKET_DIRECTION_WITH_SF,
+    eip712.CLOSE_ANYTIME,
+    eip712.SETTLEMENT_FEE,
+    eip712.REGISTER_ACCOUNT,
+    eip712.DEREGISTER_ACCOUNT,
+]
+TRADE = {
+    "user": USER,
+    "totalFee": int(1e6),
+    "period": 300,
+    "targetContract": ROUTER,
+    "strike": int(400e8),
+    "slippage": 100,
+    "allowPartialFill": True,
+    "referralCode": "",
+    "traderNFTId": 0,
+    "isAbove": False,
+    "timestamp": 1682269200,
+    "settlementFee": 1500,
+}
+
+
+def test_type_strings_match_validator():
+    with open("contracts/core/Validator.sol") as f:
+        source = f.read()
+    type_strings = set(re.findall(r'keccak256\(\s*"([^"]+)"\s*\)', source))
+    assert {struct.encode_type for struct in STRUCTS} | {
+        eip712.DOMAIN_TYPE
+    } == type_strings
+
+
+def structured_data(struct, message):
+    return {
+        "types": {
+            "EIP712Domain": [
+                {"name": "name", "type": "string"},
+                {"name": "version", "type": "string"},
+                {"name": "chainId", "type": "uint256"},
+                {"name": "verifyingContract", "type": "address"},
+            ],
+            struct.name: [{"name": n, "type": t} for n, t in struct.fields],
+        },
+        "primaryType": struct.name,
+        "domain": {
+            "name": "Validator",
+            "version": "1",
+            "chainId": 1,
+            "verifyingContract": ROUTER,
+        },
+        "message": message,
+    }
+
+
+def test_signatures_match_eth_account():
+    domain = eip712.validator_domain(ROUTER)
+    assert domain is eip712.validator_domain(ROUTER)
+    for struct in [eip712.USER_TRADE, eip712.MARKET_DIRECTION_WITH_SF]:
+        message = {name: TRADE[name] for name, _ in struct.fields}
+        expected = Account.sign_message(
+            encode_structured_data(structured_data(struct, message)), KEY
+        )
+        signed = domain.sign(struct, message, KEY)
+        assert signed.signature == expected.signature
+        assert (signed.v, signed.r, signed.s) == (expected.v, expected.r, expected.s)
+        # Field order values hash the same as the dict
+        assert domain.sign(struct, list(message.values()), KEY) == signed
+
+    message = {
+        "assetPair": "ETHBTC",
+        "expiryTimestamp": 1682269500,
+        "settlementFee": 1500,
+    }
+    expected = Account.sign_message(
+        encode_structured_data(structured_data(eip712.SETTLEMENT_FEE, message)), KEY
+    )
+    signed = domain.sign(eip712.SETTLEMENT_FEE, message, KEY)
+    assert signed.signature == expected.signature
+    assert (
+        Account.recover_message(
+            encode_structured_data(structured_data(eip712.SETTLEMENT_FEE, message)),
+            signature=signed.signature,
+        )
+        == Account.from_key(KEY).address
+    )
+
+
+def test_hashing_is_faster_than_encode_structured_data():
+    struct = eip712.USER_TRADE_WITH_SF
+    message = {name: TRADE[name] for name, _ in struct.fields}
+    domain = eip712.validator_domain(ROUTER)
+    runs = 200
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        encode_structured_data(structured_data(struct, message))
+    baseline = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        domain.digest(struct, message)
+    compiled = time.perf_counter() - start
+    print(f"encode_structured_data: {baseline:.3f}s, compiled: {compiled:.3f}s")
+    assert compiled < baseline
@@ -0,0 +1,69 @@
+import threading
+
+from brownie import web3
+
+from scripts.fee_strategy import FeeEscalator, FeeOracle, replacement_fees
+
+
+def test_replacement_fees():
+    previous = {"maxFeePerGas": 100, "maxPriorityFeePerGas": 10}
+    assert replacement_fees(previous, {}, 1.125) == {
+        "maxFeePerGas": 112,
+        "maxPriorityFeePerGas": 11,
+    }
+    # A jump of the market fee wins over the bump
+    fees = replacement_fees(previous, {"maxFeePerGas": 300}, 1.125)
+    assert fees["maxFeePerGas"] == 300
+
+
+def test_fee_oracle(accounts, chain):
+    oracle = FeeOracle(web3, ttl=60)
+    fees = oracle.estimate()
+    if "gasPrice" in fees:
+        assert fees["gasPrice"] > 0
+    else:
+        assert fees["maxFeePerGas"] >= fees["maxPriorityFeePerGas"]
+    assert oracle.estimate() == fees, "Estimates are reused within the ttl"
+    assert all(value == int(fees[field] * 2) for field, value in oracle.fees(2).items())
+
+
+def test_stuck_transaction_is_replaced(accounts, chain):
+    sender = accounts.add()
+    accounts[0].transfer(sender, "1 ether")
+    nonce = sender.nonce
+    signed_fees = []
+
+    def sign(fees):
+        signed_fees.append(fees)
+        tx = dict(
+            to=accounts[1].address,
+            value=1,
+            gas=21000,
+            nonce=nonce,
+            chainId=chain.id,
+            **fees,
+        )
+        return web3.eth.account.sign_transaction(tx, sender.private_key).rawTransaction
+
+    # Nothing gets mined until the miner is restarted, the escalator has to
+    # replace the transaction in the meantime
+    web3.provider.make_request("miner_stop", [])
+    restart = threading.Timer(
+        1.5, lambda: web3.provider.make_request("miner_start", [])
+    )
+    restart.start()
+    try:
+        escalator = FeeEscalator(
+            web3, FeeOracle(web3, ttl=0), deadline=0.5, poll_interval=0.1
+        )
+        txn_hash, receipt, replacements = escalator.send(sign, "transfer")
+    finally:
+        restart.join()
+
+    assert replacements >= 1, "Transaction should have been replaced"
+    assert len(signed_fees) == replacements + 1
+    field = next(iter(signed_fees[0]))
+    assert signed_fees[-1][field] > signed_fees[0][field], "Fees should escalate"
+    assert receipt["status"] == 1
+    assert web3.eth.get_transaction(txn_hash)["nonce"] == nonce
+    assert sender.nonce == nonce + 1, "Only one transaction should be mined"
@@ -0,0 +1,77 @@
+import os
+
+from scripts.journal import DeploymentJournal, journal_path
+
+ROUTER = "0x" + "11" * 20
+GONE = "0x" + "22" * 20
+
+
+class Provider:
+    """Answers the journal's batched eth_getCode/eth_getTransactionReceipt"""
+
+    def __init__(self, code, receipts):
+        self.code = code
+        self.receipts = receipts
+
+    def batch(self, calls):
+        responses = []
+        for method, params in calls:
+            if method == "eth_getCode":
+                responses.append({"result": self.code.get(params[0], "0x")})
+            else:
+                responses.append({"result": self.receipts.get(params[0])})
+        return responses
+
+
+class Web3:
+    def __init__(self, code=None, receipts=None):
+        self.provider = Provider(code or {}, receipts or {})
+
+
+def recorded_journal(path):
+    journal = DeploymentJournal("arbitrum-test", path)
+    journal.record_deploy("deploy:BufferRouter:0#0", "BufferRouter", ROUTER, "0xaa")
+    journal.record_deploy("deploy:OptionStorage:0#0", "OptionStorage", GONE, "0xbb")
+    journal.record_transaction("call:setKeeper:0#0", "setKeeper", "0xcc")
+    journal.record_transaction("call:setPublisher:0#0", "setPublisher", "0xdd")
+    return journal
+
+
+def test_resume(tmp_path):
+    path = journal_path("deploy_v2", "arbitrum-test", "run")
+    path = str(tmp_path / path)
+    recorded_journal(path)
+
+    journal = DeploymentJournal("arbitrum-test", path)
+    assert journal.completed("deploy:BufferRouter:0#0") is None, "Not verified yet"
+    verified = journal.verify(
+        Web3(
+            code={ROUTER: "0x6080"},
+            receipts={"0xcc": {"status": "0x1"}, "0xdd": {"status": "0x0"}},
+        )
+    )
+    assert verified == {"deploy:BufferRouter:0#0", "call:setKeeper:0#0"}
+    assert journal.completed("deploy:BufferRouter:0#0")["address"] == ROUTER
+    assert journal.completed("call:setKeeper:0#0")["txn_hash"] == "0xcc"
+
+    # Steps that couldn't be verified are dropped from the file and redone
+    assert journal.completed("deploy:OptionStorage:0#0") is None
+    assert set(DeploymentJournal("arbitrum-test", path).steps) == verified
+
+
+def test_runs_are_separate(tmp_path):
+    path = str(tmp_path / "deploy_v2_arbitrum-test_1.json")
+    recorded_journal(path)
+    journal = DeploymentJournal(
+        "arbitrum-test", str(tmp_path / "deploy_new_pool_arbitrum-test_2.json")
+    )
+    assert journal.steps == {}
+    assert journal.verify(Web3(code={ROUTER: "0x6080"})) == set()
+
+
+def test_finish(tmp_path):
+    path = str(tmp_path / "journal" / "deploy_v2_arbitrum-test_1.json")
+    journal = recorded_journal(path)
+    assert os.path.exists(path)
+    journal.finish()
+    assert not os.path.exists(path)
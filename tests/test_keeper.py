@@ -0,0 +1,138 @@
+import copy
+
+from brownie import web3
+
+from scripts.keeper import (
+    FAILED,
+    OPENED,
+    OpenTradeKeeper,
+    QueuedOpen,
+    TradeQueue,
+    unique_trades,
+)
+from scripts.preflight import DROP, PreflightFilter
+from utility import utility
+
+TRADES = 40
+
+
+def signed_trades(b, accounts, count, first_queue_id=0, fund=True):
+    """One trade per user, each user with its own one click trading key"""
+    trades = []
+    for queue_id in range(first_queue_id, first_queue_id + count):
+        user = accounts.add()
+        one_ct = accounts.add()
+        if fund:
+            b.tokenX.transfer(user, b.total_fee * 10, {"from": accounts[0]})
+        # web3 encodes the calldata, it doesn't take floats for uint256
+        params = b.trade_params[:-1] + [int(b.trade_params[-1])]
+        trades.append(
+            b.get_trade_params(user, one_ct, params=params, queue_id=queue_id)[0]
+        )
+    return trades
+
+
+def keeper_accounts(b, accounts, count):
+    keepers = []
+    for _ in range(count):
+        keeper = accounts.add()
+        accounts[0].transfer(keeper, "10 ether")
+        b.router.setKeeper(keeper, True, {"from": accounts[0]})
+        keepers.append(keeper)
+    return keepers
+
+
+def test_trade_queue():
+    queue = TradeQueue()
+    for i in range(5):
+        queue.put(i)
+    queue.put(-1, front=True)
+    assert queue.take(3, 0) == [-1, 0, 1]
+    assert queue.take(10, 0) == [2, 3, 4]
+    assert queue.take(10, 0.01) == []
+
+
+def test_unique_trades():
+    items = [QueuedOpen([[queue_id]]) for queue_id in (0, 1, 0, 2, 1)]
+    unique, duplicates = unique_trades(items)
+    assert [item.queue_id for item in unique] == [0, 1, 2]
+    assert duplicates == [items[2], items[4]]
+
+
+def test_keeper_load(contracts, accounts, chain):
+    b = utility(contracts, accounts, chain)
+    trades = signed_trades(b, accounts, TRADES)
+    # Resending an opened trade fails, the others open
+    duplicate = copy.deepcopy(trades[0])
+    duplicate[1][-1] = duplicate[2][-1] = False
+    trades.append(duplicate)
+    resolved = {}
+
+    keeper = OpenTradeKeeper(
+        b.router,
+        keeper_accounts(b, accounts, 2),
+        on_resolved=lambda item, status, detail: resolved.setdefault(
+            item.queue_id, []
+        ).append((status, detail)),
+    )
+    keeper.start()
+    for txn in trades:
+        keeper.submit(txn)
+    keeper.stop(timeout=300)
+    print(keeper.metrics.report())
+
+    metrics = keeper.metrics
+    assert metrics.statuses[OPENED] == TRADES
+    assert metrics.statuses[FAILED] == 1
+    assert (FAILED, "Router: Trade has already been opened") in resolved[0]
+    assert metrics.batches < TRADES and metrics.throughput > 0
+    assert keeper.gas_per_trade != 600_000, "Batches should be sized by measured gas"
+    assert (
+        keeper.batch_size() * keeper.gas_per_trade
+        <= web3.eth.get_block("latest")["gasLimit"]
+    )
+    for queue_id in range(TRADES):
+        assert b.router.queuedTrades(queue_id)["isTradeResolved"]
+
+
+def test_keeper_preflight(contracts, accounts, chain):
+    b = utility(contracts, accounts, chain)
+    trades = signed_trades(b, accounts, 4)
+    duplicate = copy.deepcopy(trades[0])
+    duplicate[1][-1] = duplicate[2][-1] = False
+    wrong_price = signed_trades(b, accounts, 1, first_queue_id=4)[0]
+    wrong_price[0][9] += 1
+    no_balance = signed_trades(b, accounts, 1, first_queue_id=5, fund=False)[0]
+    resolved = {}
+
+    preflight = PreflightFilter(b.router, web3)
+    # One batch in flight, the duplicate is checked after the original is mined
+    keeper = OpenTradeKeeper(
+        b.router,
+        keeper_accounts(b, accounts, 1),
+        max_in_flight=1,
+        preflight=preflight,
+        defer_interval=0.1,
+        max_deferrals=1,
+        on_resolved=lambda item, status, detail: resolved.setdefault(
+            item.queue_id, []
+        ).append((status, detail)),
+    )
+    keeper.start()
+    for txn in trades + [duplicate, wrong_price, no_balance]:
+        keeper.submit(txn)
+    keeper.stop(timeout=300)
+    print(keeper.report())
+
+    assert keeper.metrics.statuses[OPENED] == 4
+    assert (FAILED, "Router: Trade has already been opened") in resolved[0]
+    assert resolved[4] == [(FAILED, "Router: Publisher signature didn't match")]
+    assert resolved[5] == [(FAILED, "Router: Insufficient balance")]
+    # Gas was only spent on the trades that opened
+    assert sum(keeper.metrics.batch_sizes) == 4
+    assert (
+        preflight.stats[DROP] == 2
+        and preflight.reasons["Router: Insufficient balance"] == 2
+    )
+    assert preflight.hit_rate > 0
+    assert not b.router.queuedTrades(4)["isTradeResolved"]
@@ -0,0 +1,105 @@
+import subprocess
+import sys
+
+import pytest
+
+from scripts.manifest import Manifest, ManifestError, load_manifest, write_manifest
+
+ROUTER = "0x0e0A1241C9cE6649d5D30134a194BA3E24130305"
+POOL = "0x6Ec7B10bF7331794adAaf235cb47a2A292cD9c7e"
+OPTIONS = "0xA2D8f5Bb4dDd1eE7bD5A1A2cd5e4E7B9A1E5a1c1"
+ROUTER_ABI = [{"type": "function", "name": "openTrades", "inputs": []}]
+OPTIONS_ABI = [{"type": "function", "name": "assetPair", "inputs": []}]
+POOL_ABI = [{"type": "function", "name": "totalSupply", "inputs": []}]
+
+
+def test_manifest_round_trip(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = write_manifest(
+        "arb-goerli",
+        421613,
+        POOL,
+        {
+            "router": ("BufferRouter", ROUTER, ROUTER_ABI),
+            "pool": ("BufferBinaryPool", POOL, POOL_ABI),
+            "faucet": ("Faucet", "", []),
+        },
+        {"ETHUSD": {"options": ("BufferBinaryOptions", OPTIONS, OPTIONS_ABI)}},
+        blocks={ROUTER.lower(): 100, OPTIONS.lower(): 101},
+        path=path,
+    )
+    assert manifest.revision == 1 and "faucet" not in manifest.contracts
+
+    loaded = load_manifest(path=path)
+    assert loaded is load_manifest(path=path), "Unchanged file should not be reparsed"
+    assert loaded.address("router") == ROUTER
+    assert loaded.contract_type("pool") == "BufferBinaryPool"
+    assert loaded.market("ETHUSD") == {"options": OPTIONS}
+    assert loaded.assets == ["ETHUSD"]
+    assert loaded.abi("router") == ROUTER_ABI
+    assert loaded.abi("options", "ETHUSD") == OPTIONS_ABI
+    assert loaded.abi("BufferBinaryPool") == POOL_ABI
+    assert loaded.contracts["router"]["block"] == 100
+    assert loaded.contracts["pool"]["block"] is None
+    assert len(list(loaded.entries())) == 3
+
+
+def test_manifest_keeps_blocks_of_unchanged_contracts(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    contracts = {"router": ("BufferRouter", ROUTER, ROUTER_ABI)}
+    write_manifest(
+        "arb-goerli", 421613, POOL, contracts, {}, {ROUTER.lower(): 100}, path
+    )
+
+    manifest = write_manifest("arb-goerli", 421613, POOL, contracts, {}, path=path)
+    assert manifest.revision == 2
+    assert manifest.contracts["router"]["block"] == 100
+
+    # A redeployed contract doesn't inherit the old block
+    contracts = {"router": ("BufferRouter", POOL, ROUTER_ABI)}
+    manifest = write_manifest("arb-goerli", 421613, POOL, contracts, {}, path=path)
+    assert manifest.revision == 3
+    assert manifest.contracts["router"]["block"] is None
+
+
+def test_manifest_keeps_other_pools(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    usdc_pool = POOL
+    arb_pool = "0x" + "11" * 20
+    arb_options = "0x" + "22" * 20
+    write_manifest(
+        "arb-goerli",
+        421613,
+        usdc_pool,
+        {"pool": ("BufferBinaryPool", usdc_pool, POOL_ABI)},
+        {"ETHUSD": {"options": ("BufferBinaryOptions", OPTIONS, OPTIONS_ABI)}},
+        {OPTIONS.lower(): 101},
+        path,
+    )
+    # Another pool listing the same asset
+    manifest = write_manifest(
+        "arb-goerli",
+        421613,
+        arb_pool,
+        {"pool": ("BufferBinaryPool", arb_pool, POOL_ABI)},
+        {"ETHUSD": {"options": ("BufferBinaryOptions", arb_options, OPTIONS_ABI)}},
+        path=path,
+    )
+    assert manifest.pools == [usdc_pool, arb_pool]
+    assert load_manifest(path=path).market("ETHUSD") == {"options": arb_options}
+    usdc = load_manifest(path=path, pool=usdc_pool)
+    assert usdc.market("ETHUSD") == {"options": OPTIONS}
+    assert usdc.markets["ETHUSD"]["options"]["block"] == 101
+    assert usdc.abi("options", "ETHUSD") == OPTIONS_ABI
+    with pytest.raises(ManifestError):
+        load_manifest(path=path, pool=ROUTER)
+
+
+def test_unsupported_manifest_version():
+    with pytest.raises(ManifestError):
+        Manifest({"version": 1})
+
+
+def test_manifest_does_not_import_brownie():
+    code = "import sys, scripts.manifest; assert 'brownie' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from scripts.market_catalog import (
+    AppliedMarkets,
+    CatalogError,
+    MarketCatalog,
+    config_state,
+    diff_markets,
+    load_catalog,
+)
+
+
+def catalog_data(**defaults):
+    return {
+        "version": 1,
+        "pools": {"USDC": {"decimals": 6}, "BFR": {"decimals": 18}},
+        "defaults": {
+            "payout": 65,
+            "minFee": "1",
+            "platformFee": "0.1",
+            "minPeriod": 180,
+            "maxPeriod": 14400,
+            "max_trade_size": "1000",
+            "max_market_oi": "50000",
+            "is_early_close_allowed": True,
+            "early_close_threshold": 60,
+            **defaults,
+        },
+        "markets": [
+            {
+                "token1": "BTC",
+                "token2": "USD",
+                "full_name": "Bitcoin",
+                "asset_category": 1,
+            },
+            {
+                "token1": "EUR",
+                "token2": "USD",
+                "full_name": "Euro",
+                "asset_category": 0,
+            },
+        ],
+    }
+
+
+def test_repo_catalog_is_valid():
+    catalog = load_catalog()
+    assert catalog is load_catalog(), "Unchanged catalog should not be reparsed"
+    for market, deployed in catalog.deployed_markets():
+        assert deployed["asset"] in catalog.markets
+
+
+def test_amounts_are_scaled_per_pool():
+    catalog = MarketCatalog(catalog_data())
+    usdc = catalog.market("BTCUSD", "USDC")
+    assert usdc["minFee"] == int(1e6) and usdc["platformFee"] == int(1e5)
+    assert usdc["max_market_oi"] == int(50000e6)
+    assert catalog.market("BTCUSD", "BFR")["minFee"] == int(1e18)
+    assert [m["token1"] for m in catalog.asset_pairs("USDC")] == ["BTC", "EUR"]
+    assert config_state(usdc, ["minFee", "full_name"]) == {"minFee": int(1e6)}
+
+
+def test_invalid_catalog_reports_every_problem():
+    data = catalog_data(minPeriod=600, maxPeriod=300)
+    data["markets"].append(
+        {"token1": "BTC", "token2": "USD", "full_name": "Bitcoin", "asset_category": 7}
+    )
+    data["markets"].append({"token1": "ETH", "token2": "USD", "color": "blue"})
+    with pytest.raises(CatalogError) as error:
+        MarketCatalog(data)
+    message = str(error.value)
+    assert "BTCUSD: minPeriod" in message
+    assert "BTCUSD: listed twice" in message
+    assert "asset_category should be one of" in message
+    assert "ETHUSD: missing full_name" in message
+    assert "ETHUSD: unknown field color" in message
+    with pytest.raises(CatalogError):
+        MarketCatalog(catalog_data()).asset_pairs("DAI")
+
+
+def test_diff_markets():
+    previous = MarketCatalog(catalog_data()).asset_pairs("USDC")
+    data = catalog_data(minFee="2")
+    data["markets"][0]["full_name"] = "Bitcoin Core"
+    data["markets"][1]["asset_category"] = 2
+    data["markets"].append(
+        {"token1": "XAU", "token2": "USD", "full_name": "Gold", "asset_category": 2}
+    )
+    current = MarketCatalog(data).asset_pairs("USDC")
+
+    changes = diff_markets(previous, current)
+    # The category is set at initialization, EURUSD needs a new market
+    assert changes.added == ["EURUSD", "XAUUSD"]
+    assert changes.changed == {"BTCUSD": ["minFee"]}
+    assert changes.removed == [] and changes.unchanged == []
+
+    changes = diff_markets(current, current[:1])
+    assert not changes.added and not changes.changed
+    assert changes.removed == ["EURUSD", "XAUUSD"] and changes
+    assert not diff_markets(current, current)
+
+
+def test_applied_markets(tmp_path):
+    path = str(tmp_path / "markets.json")
+    markets = MarketCatalog(catalog_data()).asset_pairs("USDC")
+    pool = "0x6Ec7B10bF7331794adAaf235cb47a2A292cD9c7e"
+
+    applied = AppliedMarkets("arb-goerli", pool, path)
+    assert applied.changes(markets).added == ["BTCUSD", "EURUSD"]
+    for market in markets:
+        applied.record(market, {"options": "0x1", "config": "0x2"})
+    applied.save(1)
+
+    applied = AppliedMarkets("arb-goerli", pool.lower(), path)
+    assert applied.changes(markets).unchanged == ["BTCUSD", "EURUSD"]
+    assert applied.contracts("EURUSD")["config"] == "0x2"
+    with open(path) as f:
+        assert (
+            json.load(f)["networks"]["arb-goerli"][pool.lower()]["catalog_version"] == 1
+        )
+    # Other pools and networks start from scratch
+    assert AppliedMarkets("arb-goerli", "0x0", path).changes(markets).added
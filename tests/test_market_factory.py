@@ -0,0 +1,140 @@
+import brownie
+from brownie import (
+    BufferBinaryOptions,
+    MarketFactory,
+    MarketOIConfig,
+    OptionsConfig,
+    OptionStorage,
+    PoolOIConfig,
+    PoolOIStorage,
+    web3,
+)
+from eth_abi import encode_abi
+
+from scripts.create2 import create2_address, market_salt
+
+
+def deploy_factory(contracts, accounts):
+    pool = contracts["binary_pool_atm"]
+    router = contracts["router"]
+    pool_oi_storage = PoolOIStorage.deploy({"from": accounts[0]})
+    pool_oi_config = PoolOIConfig.deploy(
+        100000e6, pool_oi_storage.address, {"from": accounts[0]}
+    )
+    factory = MarketFactory.deploy(
+        (
+            contracts["tokenX"].address,
+            pool.address,
+            contracts["referral_contract"].address,
+            router.address,
+            pool_oi_storage.address,
+            pool_oi_config.address,
+            contracts["settlement_fee_disbursal"],
+            accounts[8],
+            contracts["creation_window"].address,
+        ),
+        web3.keccak(hexstr="0x" + BufferBinaryOptions.bytecode),
+        {"from": accounts[0]},
+    )
+    for contract in [pool, router, pool_oi_storage]:
+        contract.grantRole(
+            contract.DEFAULT_ADMIN_ROLE(), factory.address, {"from": accounts[0]}
+        )
+    return factory, pool_oi_storage
+
+
+def market_params(token0, token1, category=1):
+    return (
+        market_salt(token0, token1),
+        token0,
+        token1,
+        category,
+        int(50000e6),
+        int(1000e6),
+        int(1e6),
+        int(1e5),
+        3 * 60,
+        4 * 60 * 60,
+        True,
+        60,
+    )
+
+
+def test_create_market(contracts, accounts, chain):
+    factory, pool_oi_storage = deploy_factory(contracts, accounts)
+    pool = contracts["binary_pool_atm"]
+    router = contracts["router"]
+    params = market_params("BTC", "USD")
+
+    # Offline precompute matches the factory
+    options_address = create2_address(
+        factory.address, params[0], bytes.fromhex(BufferBinaryOptions.bytecode)
+    )
+    config_address = create2_address(
+        factory.address,
+        params[0],
+        bytes.fromhex(OptionsConfig.bytecode) + encode_abi(["address"], [pool.address]),
+    )
+    expected = factory.computeMarket(params)
+    assert expected[0] == options_address, "Wrong options address"
+    assert expected[1] == config_address, "Wrong config address"
+
+    txn = factory.createMarket(
+        params, "0x" + BufferBinaryOptions.bytecode, {"from": accounts[0]}
+    )
+    event = txn.events["CreateMarket"]
+    assert event["options"] == expected[0], "Wrong options address"
+    assert event["config"] == expected[1], "Wrong config address"
+    assert event["marketOIConfig"] == expected[2], "Wrong market OI config address"
+    assert event["optionStorage"] == expected[3], "Wrong option storage address"
+    print(f"Market created in one transaction, {txn.gas_used} gas")
+
+    options = BufferBinaryOptions.at(event["options"])
+    config = OptionsConfig.at(event["config"])
+    market_oi_config = MarketOIConfig.at(event["marketOIConfig"])
+    assert options.assetPair() == "BTCUSD", "Not initialized"
+    assert options.config() == config.address, "Wrong config"
+    assert options.hasRole(options.ROUTER_ROLE(), router.address), "Wrong role"
+    assert pool.hasRole(pool.OPTION_ISSUER_ROLE(), options.address), "Wrong role"
+    assert pool_oi_storage.hasRole(
+        pool_oi_storage.UPDATOR_ROLE(), options.address
+    ), "Wrong role"
+    assert router.contractRegistry(options.address), "Not registered"
+    assert config.marketOIConfigContract() == market_oi_config.address
+    assert config.optionStorageContract() == event["optionStorage"]
+    assert config.creationWindowContract() == brownie.ZERO_ADDRESS
+    assert config.isEarlyCloseAllowed(), "Wrong config"
+    assert market_oi_config._marketContract() == options.address
+
+    # The factory keeps no rights on the market
+    assert config.owner() == accounts[0], "Wrong owner"
+    assert market_oi_config.owner() == accounts[0], "Wrong owner"
+    assert options.hasRole(options.DEFAULT_ADMIN_ROLE(), accounts[0])
+    assert not options.hasRole(options.DEFAULT_ADMIN_ROLE(), factory.address)
+
+    with brownie.reverts():
+        factory.createMarket(
+            params, "0x" + BufferBinaryOptions.bytecode, {"from": accounts[0]}
+        )
+
+
+def test_create_market_checks(contracts, accounts, chain):
+    factory, _ = deploy_factory(contracts, accounts)
+    params = market_params("EUR", "USD", category=0)
+
+    with brownie.reverts("MarketFactory: Wrong options code"):
+        factory.createMarket(
+            params, "0x" + OptionStorage.bytecode, {"from": accounts[0]}
+        )
+    with brownie.reverts("Ownable: caller is not the owner"):
+        factory.createMarket(
+            params, "0x" + BufferBinaryOptions.bytecode, {"from": accounts[1]}
+        )
+
+    factory.createMarket(
+        params, "0x" + BufferBinaryOptions.bytecode, {"from": accounts[0]}
+    )
+    config = OptionsConfig.at(factory.computeMarket(params)[1])
+    assert (
+        config.creationWindowContract() == contracts["creation_window"].address
+    ), "Forex markets need the creation window"
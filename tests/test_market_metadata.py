@@ -0,0 +1,45 @@
+import json
+
+from brownie import BufferBinaryOptions, web3
+
+from scripts.market_metadata import MetadataCache
+
+
+def test_metadata_cache(contracts, accounts, tmp_path):
+    options = contracts["binary_european_options_atm"]
+    options_2 = contracts["binary_european_options_atm_2"]
+    path = str(tmp_path / "metadata.json")
+
+    metadata = MetadataCache(web3, path)
+    metadata.prefetch([options.address, options_2.address])
+    assert metadata.misses == 2
+    assert metadata.get(options.address, "assetPair") == options.assetPair()
+    assert metadata.get(options_2.address.lower()) == {
+        "assetPair": options_2.assetPair(),
+        "tokenX": options_2.tokenX(),
+        "pool": options_2.pool(),
+        "config": options_2.config(),
+        "decimals": options_2.decimals(),
+    }
+    assert metadata.misses == 2 and metadata.hits == 2
+
+    # Uninitialized contracts are read every time until they are initialized
+    fresh = BufferBinaryOptions.deploy({"from": accounts[0]})
+    assert metadata.get(fresh.address, "assetPair") == ""
+    metadata.get(fresh.address)
+    assert metadata.misses == 4
+
+    metadata.save()
+    with open(path) as f:
+        (chain,) = json.load(f)
+    assert chain.startswith(f"{web3.eth.chain_id}:0x")
+
+    reloaded = MetadataCache(web3, path)
+    assert reloaded.get(options.address, "config") == options.config()
+    assert reloaded.misses == 0
+    reloaded.invalidate(options.address)
+    reloaded.get(options.address)
+    assert reloaded.misses == 1
+    reloaded.invalidate()
+    reloaded.get(options_2.address)
+    assert reloaded.misses == 2
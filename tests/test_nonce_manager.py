@@ -0,0 +1,50 @@
+from scripts.nonce_manager import NonceManager
+
+ADDRESS = "0x" + "11" * 20
+
+
+class Eth:
+    def __init__(self, nonce):
+        self.nonce = nonce
+
+    def getTransactionCount(self, address, block):
+        return self.nonce
+
+
+class Web3:
+    def __init__(self, nonce):
+        self.eth = Eth(nonce)
+
+
+def test_next_nonce():
+    nonces = NonceManager(Web3(5))
+    assert [nonces.next_nonce(ADDRESS) for _ in range(3)] == [5, 6, 7]
+
+
+def test_release():
+    nonces = NonceManager(Web3(0))
+    for _ in range(4):
+        nonces.next_nonce(ADDRESS)
+
+    # The last nonce handed out is simply taken back
+    nonces.release(ADDRESS, 3)
+    assert nonces.next_nonce(ADDRESS) == 3
+
+    # Gaps are filled first, lowest nonce first
+    nonces.release(ADDRESS, 2)
+    nonces.release(ADDRESS, 1)
+    assert [nonces.next_nonce(ADDRESS) for _ in range(3)] == [1, 2, 4]
+
+
+def test_resync():
+    web3 = Web3(0)
+    nonces = NonceManager(web3)
+    for _ in range(3):
+        nonces.next_nonce(ADDRESS)
+    nonces.release(ADDRESS, 1)
+
+    # Released nonces are dropped, the chain is trusted
+    web3.eth.nonce = 7
+    assert nonces.resync(ADDRESS) == 7
+    assert nonces.next_nonce(ADDRESS) == 7
+    assert nonces.next_nonce(ADDRESS) == 8
@@ -0,0 +1,96 @@
+import subprocess
+import sys
+
+import pytest
+
+from scripts.manifest import write_manifest
+from scripts.ops import coerce, find_function, resolve, signature
+
+ROUTER = "0x0e0A1241C9cE6649d5D30134a194BA3E24130305"
+OPTIONS = "0xA2D8f5Bb4dDd1eE7bD5A1A2cd5e4E7B9A1E5a1c1"
+POOL = "0x6Ec7B10bF7331794adAaf235cb47a2A292cD9c7e"
+ROUTER_ABI = [
+    {
+        "type": "function",
+        "name": "setKeeper",
+        "inputs": [{"type": "address"}, {"type": "bool"}],
+        "outputs": [],
+    },
+    {
+        "type": "function",
+        "name": "setKeeper",
+        "inputs": [{"type": "address"}],
+        "outputs": [],
+    },
+    {"type": "event", "name": "setKeeper", "inputs": []},
+]
+OPTIONS_ABI = [
+    {
+        "type": "function",
+        "name": "trade",
+        "inputs": [
+            {
+                "type": "tuple[]",
+                "components": [{"type": "uint256"}, {"type": "address"}],
+            }
+        ],
+        "outputs": [],
+    }
+]
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return write_manifest(
+        "arb-goerli",
+        421613,
+        POOL,
+        {"router": ("BufferRouter", ROUTER, ROUTER_ABI)},
+        {"ETHUSD": {"options": ("BufferBinaryOptions", OPTIONS, OPTIONS_ABI)}},
+        path=str(tmp_path / "manifest.json"),
+    )
+
+
+def test_resolve(manifest):
+    assert resolve(manifest, "router") == (ROUTER, ROUTER_ABI)
+    assert resolve(manifest, "ETHUSD.options") == (OPTIONS, OPTIONS_ABI)
+    assert resolve(manifest, f"{OPTIONS}:BufferRouter") == (OPTIONS, ROUTER_ABI)
+    with pytest.raises(SystemExit):
+        resolve(manifest, "BTCUSD.options")
+
+
+def test_find_function():
+    assert signature(find_function(ROUTER_ABI, "setKeeper", 2)) == (
+        "setKeeper(address,bool)"
+    )
+    assert find_function(ROUTER_ABI, "setKeeper(address)", 5) is ROUTER_ABI[1]
+    assert signature(OPTIONS_ABI[0]) == "trade((uint256,address)[])"
+    with pytest.raises(SystemExit):
+        find_function(ROUTER_ABI, "setKeeper", 3)
+
+
+def test_coerce():
+    assert coerce("uint256", "1e18") == 10**18
+    assert coerce("uint256", "1_000_000") == 10**6
+    assert coerce("int256", "-5") == -5
+    assert coerce("uint8", "0x10") == 16
+    assert coerce("bool", "true") is True and coerce("bool", "0") is False
+    assert coerce("bytes32", "0x" + "ab" * 32) == b"\xab" * 32
+    assert coerce("address[]", f'["{ROUTER}"]') == [ROUTER]
+    assert coerce("string", "ETHUSD") == "ETHUSD"
+    with pytest.raises(SystemExit):
+        coerce("bool", "yes")
+
+
+def test_list_is_brownie_free(manifest, tmp_path):
+    path = str(tmp_path / "manifest.json")
+    code = (
+        "import sys; from scripts.ops import main; "
+        f"main(['--profile-startup', '--manifest', {path!r}, 'list']); "
+        "assert not {'brownie', 'web3', 'eth_abi'} & set(sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    assert "ETHUSD.options" in output.stdout and OPTIONS in output.stdout
+    assert "Startup profile" in output.stderr and "load manifest" in output.stderr
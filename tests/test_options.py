@@ -167,6 +167,36 @@ def test_user_params(init, contracts, accounts, chain):
     ), "Wrong amount deducted"
 
 
+def test_verify_trades(init, contracts, accounts, chain):
+    b, user, one_ct, trade_params = init
+    no_balance = b.get_trade_params(accounts.add(), one_ct, queue_id=1)[0]
+    wrong_price = copy.deepcopy(trade_params[0])
+    wrong_price[0][0] = 2
+    wrong_price[0][9] += 1
+    batch = [trade_params[0], no_balance, wrong_price]
+
+    valid_trades, reasons = b.router.verifyTrades(batch)
+    assert valid_trades == [0b001]
+    assert reasons == [
+        "",
+        "Router: Insufficient balance",
+        "Router: Publisher signature didn't match",
+    ]
+
+    txn = b.router.openTrades([*trade_params], {"from": b.bot})
+    assert txn.events["OpenTrade"]["queueId"] == 0
+    valid_trades, reasons = b.router.verifyTrades([*trade_params])
+    assert valid_trades == [0]
+    assert reasons == ["Router: Trade has already been opened"]
+
+    # evaluateParams is checked as well
+    params = b.trade_params[:1] + [1] + b.trade_params[2:]
+    short_period = b.get_trade_params(user, one_ct, params=params, queue_id=3)[0]
+    assert b.router.verifyTrades([short_period]) == ([0], ["O21"])
+    txn = b.router.openTrades([short_period], {"from": b.bot})
+    assert txn.events["CancelTrade"]["reason"] == "O21"
+
+
 def test_lo(init_lo, contracts, accounts, chain):
     b, user, one_ct, trade_params = init_lo
     chain.snapshot()
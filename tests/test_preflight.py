@@ -0,0 +1,19 @@
+from scripts.preflight import DEFER, DROP, PASS, _result
+
+
+def test_result():
+    assert _result((True, ""), None) == (PASS, None)
+    assert _result((False, "Router: Invalid signature"), None) == (
+        DROP,
+        "Router: Invalid signature",
+    )
+    assert _result((False, "Router: Incorrect allowance"), None)[0] == DEFER
+    # With a permit the allowance is the signed value, it won't change
+    assert _result((False, "Router: Incorrect allowance"), None, True) == (
+        DROP,
+        "Router: Incorrect allowance",
+    )
+    assert _result((False, "Router: Insufficient balance"), None, True)[0] == DEFER
+    assert _result((True, ""), "Router: Permit did not succeed")[0] == DROP
+    # No verdict means the call failed, not that the trade is invalid
+    assert _result(None, None) == (DEFER, "Preflight: verifyTrades call failed")
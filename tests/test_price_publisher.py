@@ -0,0 +1,43 @@
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from web3 import Web3
+
+from scripts.price_publisher import PriceSigner, PublisherEngine, price_hash
+
+KEY = "0x" + "42" * 32
+
+
+def test_signature_matches_eth_account():
+    msg_hash = Web3.solidityKeccak(
+        ["string", "uint256", "uint256"], ["ETHBTC", 1682269200, int(400e8)]
+    )
+    assert price_hash("ETHBTC", 1682269200, 400e8) == bytes(msg_hash)
+    expected = Account.sign_message(encode_defunct(msg_hash), KEY).signature
+    assert PriceSigner(KEY).sign("ETHBTC", 1682269200, int(400e8)) == expected
+
+
+def test_engine_keeps_input_order():
+    prices = [("ETHUSD", 1682269200 + i, int(1800e8) + i) for i in range(250)]
+    expected = PriceSigner(KEY).sign_many(prices)
+    with PublisherEngine(KEY, processes=2, chunk_size=40) as engine:
+        assert engine.sign(prices) == expected
+        assert list(engine.stream(iter(prices[:90]))) == expected[:90]
+        # Below one chunk everything is signed in process
+        assert engine.sign(prices[:10]) == expected[:10]
+    assert engine.signed == 350 and engine.rate > 0
+    assert "350 price signatures" in engine.report()
+
+
+def test_signature_verifies_on_chain(contracts, accounts):
+    router = contracts["router"]
+    options = contracts["binary_european_options_atm"]
+    publisher = contracts["publisher"]
+    # Same check as Validator.verifyPublisher, recovered off chain
+    signature = PriceSigner(publisher.private_key).sign(
+        options.assetPair(), 1682269200, int(400e8)
+    )
+    msg_hash = price_hash(options.assetPair(), 1682269200, int(400e8))
+    assert (
+        Account.recover_message(encode_defunct(msg_hash), signature=signature)
+        == router.publisher()
+    )
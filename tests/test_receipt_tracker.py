@@ -0,0 +1,49 @@
+import pytest
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+from scripts.receipt_tracker import ReceiptTracker
+
+
+class Eth:
+    """Mines a transaction after it was polled `polls` times"""
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.calls = {}
+
+    def get_transaction_receipt(self, txn_hash):
+        self.calls[txn_hash] = self.calls.get(txn_hash, 0) + 1
+        if self.calls[txn_hash] <= self.polls.get(txn_hash, 0):
+            raise TransactionNotFound(f"Transaction with hash: {txn_hash} not found")
+        return {
+            "blockNumber": 1,
+            "gasUsed": 21000,
+            "status": 1,
+            "logs": [],
+        }
+
+
+class Web3:
+    def __init__(self, polls):
+        self.eth = Eth(polls)
+
+
+def test_polls_until_mined():
+    web3 = Web3({"0xaa": 3, "0xbb": 0})
+    tracker = ReceiptTracker(web3, poll_interval=0.01)
+    futures = [
+        tracker.track(txn_hash, label="setKeeper") for txn_hash in web3.eth.polls
+    ]
+    results = [future.result(timeout=5) for future in futures]
+    tracker.close()
+    assert [result.txn_hash for result in results] == ["0xaa", "0xbb"]
+    assert all(result.succeeded for result in results)
+    assert web3.eth.calls == {"0xaa": 4, "0xbb": 1}
+
+
+def test_timeout():
+    tracker = ReceiptTracker(Web3({"0xaa": 1000}), poll_interval=0.01, timeout=0.05)
+    future = tracker.track("0xaa", label="setKeeper")
+    with pytest.raises(TimeExhausted, match="not mined"):
+        future.result(timeout=5)
+    tracker.close()
@@ -0,0 +1,17 @@
+from scripts.reconcile import diff_config
+
+
+def test_diff_config_orders_periods():
+    current = {"minPeriod": 300, "maxPeriod": 3600, "minFee": 5e6}
+    desired = {"minPeriod": 7200, "maxPeriod": 14400, "minFee": 5e6}
+    changes, periods, unknown = diff_config(current, desired)
+    assert changes == [] and unknown == []
+    assert periods == [("setMinPeriod", (7200,)), ("setMaxPeriod", (14400,))]
+
+
+def test_diff_config_skips_unread_fields():
+    current = {"isEarlyCloseEnabled": None, "maxPeriod": None, "minFee": 1}
+    desired = {"isEarlyCloseEnabled": True, "maxPeriod": 3600, "minFee": 2}
+    changes, periods, unknown = diff_config(current, desired)
+    assert changes == [("setMinFee", (2,))] and periods == []
+    assert unknown == ["isEarlyCloseEnabled", "maxPeriod"]
@@ -0,0 +1,93 @@
+import pytest
+
+from scripts.retry_policy import (
+    KNOWN,
+    NONCE,
+    REVERT,
+    TIMEOUT,
+    TRANSPORT,
+    UNDERPRICED,
+    UNKNOWN,
+    RetryPolicy,
+    classify,
+)
+
+
+def test_classify():
+    assert classify(ValueError("execution reverted: Wrong role")) == REVERT
+    assert classify(ValueError({"message": "insufficient funds for gas"})) == REVERT
+    assert classify(ValueError("nonce too low")) == NONCE
+    assert classify(ValueError({"message": "already known"})) == KNOWN
+    assert classify(ValueError("replacement transaction underpriced")) == NONCE
+    assert classify(ValueError("transaction underpriced")) == UNDERPRICED
+    assert classify(TimeoutError("Read timed out")) == TIMEOUT
+    assert classify(ConnectionError("Connection aborted")) == TRANSPORT
+    assert classify(Exception("503 Server Error")) == TRANSPORT
+    assert classify(Exception("something else")) == UNKNOWN
+
+
+def test_classify_status_codes():
+    class Response:
+        status_code = 429
+
+    class HTTPError(Exception):
+        response = Response()
+
+    assert classify(HTTPError("Client Error for url")) == TRANSPORT
+    assert classify(Exception("429 Client Error: Too Many Requests")) == TRANSPORT
+    # Status codes in hashes and addresses
+    assert (
+        classify(Exception("Transaction with hash: '0x9a5e4290bd11' not found."))
+        == UNKNOWN
+    )
+    assert classify(Exception("contract at 0x5031504b not deployed")) == UNKNOWN
+
+
+def failing(*errors):
+    errors = list(errors)
+    attempts = []
+
+    def fn(attempt):
+        attempts.append(attempt.gas_price(100))
+        if errors:
+            raise errors.pop(0)
+        return "sent"
+
+    return fn, attempts
+
+
+def test_reverts_fail_fast():
+    policy = RetryPolicy(base_delay=0)
+    fn, attempts = failing(ValueError("execution reverted"), None)
+    with pytest.raises(ValueError):
+        policy.execute(fn)
+    assert len(attempts) == 1, "Reverts must not be retried"
+    assert policy.counters[REVERT] == 1 and policy.counters["gave_up"] == 1
+
+
+def test_retries_per_class():
+    policy = RetryPolicy(base_delay=0)
+    errored = []
+    fn, attempts = failing(
+        ConnectionError("connection refused"),
+        ValueError("nonce too low"),
+        ValueError("transaction underpriced"),
+        ValueError("transaction underpriced"),
+    )
+    assert (
+        policy.execute(fn, on_error=lambda error_class, e: errored.append(error_class))
+        == "sent"
+    )
+    assert errored == [TRANSPORT, NONCE, UNDERPRICED, UNDERPRICED]
+    # Only underpriced errors bump the fee
+    assert attempts == [100, 100, 100, 112, 126]
+    assert policy.counters == {TRANSPORT: 1, NONCE: 1, UNDERPRICED: 2}
+
+
+def test_gives_up_after_max_attempts():
+    policy = RetryPolicy(base_delay=0, max_attempts={TIMEOUT: 2})
+    fn, attempts = failing(*[TimeoutError("timed out")] * 3)
+    with pytest.raises(TimeoutError):
+        policy.execute(fn)
+    assert len(attempts) == 2
+    assert "timeout: 2" in policy.report()
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from brownie import web3
+
+from scripts.rpc_provider import PooledHTTPProvider
+
+
+def test_concurrent_reads_are_batched(accounts):
+    provider = PooledHTTPProvider(str(web3.provider.endpoint_uri), batch_window=0.05)
+
+    def nonce(account):
+        return provider.make_request(
+            "eth_getTransactionCount", [account.address, "latest"]
+        )["result"]
+
+    with ThreadPoolExecutor(len(accounts)) as executor:
+        nonces = list(executor.map(nonce, accounts))
+
+    assert [int(n, 16) for n in nonces] == [account.nonce for account in accounts]
+    metrics = provider.metrics
+    assert metrics.calls["eth_getTransactionCount"] == len(accounts)
+    assert metrics.http_requests < len(accounts), "Reads should share requests"
+    assert metrics.batches >= 1
+    assert "eth_getTransactionCount" in metrics.report()
+
+
+def test_writes_are_not_batched(accounts):
+    provider = PooledHTTPProvider(str(web3.provider.endpoint_uri))
+    provider.make_request("evm_mine", [])
+    assert provider.metrics.http_requests == 1 and provider.metrics.batches == 0
+
+    responses = provider.batch(
+        [("eth_chainId", []), ("eth_getBalance", [accounts[0].address, "latest"])]
+    )
+    assert int(responses[0]["result"], 16) == web3.eth.chain_id
+    assert int(responses[1]["result"], 16) == accounts[0].balance()
+    assert provider.metrics.http_requests == 2
@@ -0,0 +1,110 @@
+from brownie import web3
+
+from scripts.settlement import SettlementScheduler
+from utility import utility
+
+CLOSING_PRICE = int(300e8)
+
+
+def test_settlement_scheduler(contracts, accounts, chain):
+    b = utility(contracts, accounts, chain)
+    keeper = accounts.add()
+    accounts[0].transfer(keeper, "10 ether")
+    b.router.setKeeper(keeper, True, {"from": accounts[0]})
+
+    directions = {}
+    option_ids = []
+    for queue_id in range(4):
+        if queue_id == 3:
+            # Expires 30 seconds after the others
+            chain.sleep(30)
+        user = accounts.add()
+        b.tokenX.transfer(user, b.total_fee * 10, {"from": accounts[0]})
+        option_id, _, trade_params, _ = b.create(
+            user, accounts.add(), queue_id=queue_id
+        )
+        option_ids.append(option_id)
+        directions[(b.binary_options.address, option_id)] = (
+            b.is_above,
+            trade_params[-1],
+        )
+    last_option = option_ids[-1]
+    last_direction = directions.pop((b.binary_options.address, last_option))
+
+    scheduler = SettlementScheduler(
+        b.router,
+        [b.binary_options, contracts["binary_european_options_atm_2"]],
+        keeper,
+        b.publisher.private_key,
+        lambda asset_pair, timestamp: CLOSING_PRICE,
+        lambda market, option_id: directions.get((market, option_id)),
+        web3,
+        retry_interval=1,
+        clock=chain.time,
+    )
+    assert scheduler.sync() == 4 and scheduler.sync() == 0
+    first_expiry = scheduler.next_expiry()
+    assert first_expiry == b.binary_options.options(option_ids[0])[5]
+    assert scheduler.settle() == 0
+
+    # The first three expire together and go in one batch
+    chain.sleep(first_expiry - chain.time() + 1)
+    chain.mine()
+    assert scheduler.settle() == 3
+    for option_id in option_ids[:3]:
+        assert b.binary_options.options(option_id)[0] != 1, "Option not closed"
+    assert len(scheduler) == 1
+
+    # Without the market direction signature the option waits
+    chain.sleep(31)
+    chain.mine()
+    assert scheduler.settle() == 0
+    assert b.binary_options.options(last_option)[0] == 1
+
+    directions[(b.binary_options.address, last_option)] = last_direction
+    chain.sleep(2)
+    chain.mine()
+    assert scheduler.settle() == 1
+    assert b.binary_options.options(last_option)[0] != 1
+    assert len(scheduler) == 0
+
+    metrics = scheduler.metrics
+    print(metrics.report())
+    assert metrics.settled == 4 and metrics.batches == 2
+    assert not metrics.failures
+    assert metrics.deferred["Settlement: price or direction missing"] == 1
+    assert all(lag >= 0 for lag in metrics.lags)
+
+
+def test_settlement_gives_up(contracts, accounts, chain):
+    b = utility(contracts, accounts, chain)
+    keeper = accounts.add()
+    accounts[0].transfer(keeper, "10 ether")
+    b.router.setKeeper(keeper, True, {"from": accounts[0]})
+    user = accounts.add()
+    b.tokenX.transfer(user, b.total_fee * 10, {"from": accounts[0]})
+    option_id = b.create(user, accounts.add(), queue_id=0)[0]
+
+    # The market direction never arrives
+    scheduler = SettlementScheduler(
+        b.router,
+        [b.binary_options],
+        keeper,
+        b.publisher.private_key,
+        lambda asset_pair, timestamp: CLOSING_PRICE,
+        lambda market, option_id: None,
+        web3,
+        retry_interval=1,
+        max_retries=2,
+        clock=chain.time,
+    )
+    assert scheduler.sync() == 1
+    chain.sleep(scheduler.next_expiry() - chain.time() + 1)
+    for _ in range(3):
+        chain.sleep(2)
+        chain.mine()
+        assert scheduler.settle() == 0
+    assert len(scheduler) == 0
+    assert scheduler.metrics.deferred["Settlement: price or direction missing"] == 2
+    assert scheduler.metrics.failures["Settlement: price or direction missing"] == 1
+    assert b.binary_options.options(option_id)[0] == 1
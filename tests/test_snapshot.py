@@ -0,0 +1,57 @@
+import json
+
+from brownie import BatchExecutor, web3
+
+from scripts.snapshot import SnapshotReader, save_snapshot
+
+
+def test_snapshot(contracts, accounts, tmp_path):
+    router = contracts["router"]
+    options = contracts["binary_european_options_atm"]
+    config = contracts["binary_options_config_atm"]
+    pool = contracts["binary_pool_atm"]
+    router.setContractRegistry(options.address, True, {"from": accounts[0]})
+
+    reader = SnapshotReader(web3)
+    snapshot = reader.read(router.address, [options.address], keepers=[accounts[1]])
+    state = snapshot["contracts"]
+
+    # router + options, then config + pool, then the OI contracts
+    assert snapshot["rounds"] == 3
+    assert snapshot["requests"] == 4
+    assert state["router"][router.address]["publisher"] == router.publisher()
+    assert state["router"][router.address]["contractRegistry"] == {
+        options.address: True
+    }
+    assert state["router"][router.address]["isKeeper"] == {
+        accounts[1].address: router.isKeeper(accounts[1])
+    }
+    assert state["options"][options.address]["assetPair"] == options.assetPair()
+    assert state["options"][options.address]["maxOI"] == options.getMaxOI()
+    assert state["config"][config.address]["minFee"] == config.minFee()
+    assert state["pool"][pool.address]["totalSupply"] == pool.totalSupply()
+    market_oi_config = config.marketOIConfigContract()
+    assert state["market_oi_config"][market_oi_config]["maxTradeSize"] == int(1000e6)
+    assert len(state["pool_oi_storage"]) == 1
+
+    path = str(tmp_path / "snapshot.json")
+    save_snapshot(snapshot, path)
+    with open(path) as f:
+        saved = json.load(f)
+    assert saved["schema"]["pool"]["totalSupply"] == "uint256"
+    assert int(saved["contracts"]["pool"][pool.address]["totalSupply"]) == (
+        pool.totalSupply()
+    )
+
+
+def test_snapshot_through_aggregate(contracts, accounts):
+    executor = BatchExecutor.deploy({"from": accounts[0]})
+    router = contracts["router"]
+    options = contracts["binary_european_options_atm"]
+
+    batched = SnapshotReader(web3).read(router.address, [options.address])
+    aggregated = SnapshotReader(web3, aggregator=executor.address).read(
+        router.address, [options.address], block=batched["block"]
+    )
+    assert aggregated["contracts"] == batched["contracts"]
+    assert aggregated["requests"] == aggregated["rounds"]
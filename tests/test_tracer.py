@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from scripts.journal import scope
+from scripts.tracer import Tracer
+
+
+class Result:
+    label = "setMinFee"
+    txn_hash = "0x01"
+    sent_at = 100.0
+    latency = 2.5
+    succeeded = True
+    gas_used = 30000
+    block_number = 7
+
+
+def test_tracer(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    tracer = Tracer(path)
+
+    with scope("ETHUSD:set_configs"):
+        with tracer.span("deploy OptionsConfig", kind="deploy") as record:
+            assert tracer.current() is record
+            record.update(gas=1_000_000, attempts=2)
+    assert tracer.current() is None
+
+    @tracer.trace(kind="admin")
+    def seed_pool():
+        raise ValueError("execution reverted")
+
+    with pytest.raises(ValueError):
+        seed_pool()
+    tracer.record_result(Result(), kind="pipeline")
+    tracer.close()
+
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["step"] for line in lines] == [
+        "deploy OptionsConfig",
+        "seed_pool",
+        "setMinFee",
+    ]
+    assert lines[0]["scope"] == "ETHUSD:set_configs"
+    assert lines[0]["status"] == "ok" and lines[0]["attempts"] == 2
+    assert lines[1]["status"] == "error" and "reverted" in lines[1]["error"]
+    assert lines[2]["duration"] == 2.5 and lines[2]["block"] == 7
+
+    summary = tracer.summary()
+    assert "3 steps" in summary and "1030000 gas" in summary
+    assert "1 retries, 1 failed" in summary
+    # Slowest first
+    assert summary.index("setMinFee") < summary.index("deploy OptionsConfig")
@@ -0,0 +1,152 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from scripts.verification_queue import (
+    FAILED,
+    QUEUED,
+    SUBMITTED,
+    VERIFIED,
+    VerificationQueue,
+)
+
+VERIFICATION_INFO = {
+    "compiler_version": "0.8.4+commit.c7e474f2",
+    "optimizer_enabled": True,
+    "optimizer_runs": 1,
+    "license_identifier": "BUSL-1.1",
+    "standard_json_input": {"language": "Solidity", "sources": {}},
+}
+
+
+class Explorer(BaseHTTPRequestHandler):
+    """
+    Stand-in for the etherscan verification API. Addresses ending in "bad"
+    fail verification, "late" isn't indexed on the first submission, "html"
+    gets an error page instead of JSON, every submission is pending for one
+    status check.
+    """
+
+    submissions = []
+    checks = {}
+
+    def _reply(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        form = parse_qs(self.rfile.read(length).decode())
+        address = form["contractaddress"][0]
+        if address.endswith("html"):
+            self.send_response(200)
+            self.end_headers()
+            return self.wfile.write(b"<html>502 Bad Gateway</html>")
+        if address.endswith("late") and address not in self.submissions:
+            self.submissions.append(address)
+            return self._reply(
+                {"status": "0", "result": "Unable to locate ContractCode"}
+            )
+        self.submissions.append(address)
+        self._reply({"status": "1", "result": f"guid-{address}"})
+
+    def do_GET(self):
+        guid = parse_qs(urlparse(self.path).query)["guid"][0]
+        self.checks[guid] = self.checks.get(guid, 0) + 1
+        if self.checks[guid] == 1:
+            return self._reply({"status": "0", "result": "Pending in queue"})
+        if guid.endswith("bad"):
+            return self._reply({"status": "0", "result": "Fail - Unable to verify"})
+        self._reply({"status": "1", "result": "Pass - Verified"})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def explorer():
+    Explorer.submissions = []
+    Explorer.checks = {}
+    server = HTTPServer(("127.0.0.1", 0), Explorer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/api"
+    server.shutdown()
+
+
+def enqueue(queue, address):
+    queue.enqueue(
+        address, "OptionStorage", "contracts/OptionStorage.sol", VERIFICATION_INFO, ""
+    )
+
+
+def test_drain(explorer, tmp_path):
+    path = str(tmp_path / "queue.json")
+    queue = VerificationQueue(explorer, path=path, poll_interval=0)
+    for address in ["0xgood", "0xbad", "0xlate"]:
+        enqueue(queue, address)
+
+    summary = queue.drain()
+    assert summary[SUBMITTED] == 2 and summary[QUEUED] == 1, summary
+    assert queue.entries["0xlate"]["attempts"] == 1
+
+    summary = queue.drain(wait=True)
+    assert summary == {QUEUED: 0, SUBMITTED: 0, VERIFIED: 2, FAILED: 1}, summary
+    assert queue.entries["0xbad"]["last_error"] == "Fail - Unable to verify"
+
+    # The state survives the process, verified contracts aren't resubmitted
+    queue = VerificationQueue(explorer, path=path)
+    assert queue.entries["0xgood"]["state"] == VERIFIED
+    enqueue(queue, "0xgood")
+    assert queue.pending() == []
+
+
+def test_explorer_down(tmp_path):
+    queue = VerificationQueue(
+        "http://127.0.0.1:9/api",
+        path=str(tmp_path / "queue.json"),
+        poll_interval=0,
+        max_attempts=2,
+    )
+    enqueue(queue, "0xgood")
+    assert queue.drain()[QUEUED] == 1, "Transport errors are retried"
+    assert queue.drain()[FAILED] == 1, "Gives up after max_attempts"
+
+
+def test_background_drain(explorer, tmp_path):
+    queue = VerificationQueue(
+        explorer, path=str(tmp_path / "queue.json"), poll_interval=0.01
+    )
+    queue.start()
+    enqueue(queue, "0xgood")
+    for _ in range(500):
+        if queue.summary()[VERIFIED] == 1:
+            break
+        threading.Event().wait(0.01)
+    queue.stop()
+    assert queue.entries["0xgood"]["state"] == VERIFIED
+
+
+def test_unexpected_response(explorer, tmp_path):
+    queue = VerificationQueue(
+        explorer,
+        path=str(tmp_path / "queue.json"),
+        poll_interval=0.01,
+        max_attempts=2,
+    )
+    queue.start()
+    enqueue(queue, "0xhtml")
+    enqueue(queue, "0xgood")
+    for _ in range(500):
+        if not queue.pending():
+            break
+        threading.Event().wait(0.01)
+    assert queue._thread.is_alive(), "The worker survives a bad response"
+    queue.stop()
+    assert queue.entries["0xgood"]["state"] == VERIFIED
+    assert queue.entries["0xhtml"]["state"] == FAILED
+    assert queue.entries["0xhtml"]["last_error"].startswith("JSONDecodeError")
@@ -1,10 +1,13 @@
 from enum import IntEnum
 
 import brownie
-from brownie import BufferBinaryOptions, OptionsConfig, AccountRegistrar
+from brownie import OptionsConfig, AccountRegistrar
 from eth_account import Account
 from eth_account.messages import encode_defunct
-from eth_account.messages import encode_structured_data
+
+from scripts import eip712
+from scripts.market_metadata import MetadataCache
+from scripts.price_publisher import PriceSigner
 
 ONE_DAY = 86400
 
@@ -79,28 +82,10 @@ class BinaryOptionTesting(object):
             15e2,
         ]
         # self.validator = validator
-        self.domain_type = [
-            {"name": "name", "type": "string"},
-            {"name": "version", "type": "string"},
-            {"name": "chainId", "type": "uint256"},
-            {"name": "verifyingContract", "type": "address"},
-        ]
-        self.domain = {
-            "name": "Validator",
-            "version": "1",
-            "chainId": 1,
-            "verifyingContract": self.router.address,
-        }
-
-    def enc(self, msg_params, key):
-        encoded_msg = encode_structured_data(msg_params)
-        signed_msg = brownie.web3.eth.account.sign_message(encoded_msg, key)
-        return signed_msg.signature
-
-    def enc_v2(self, msg_params, key):
-        encoded_msg = encode_structured_data(msg_params)
-        signed_msg = brownie.web3.eth.account.sign_message(encoded_msg, key)
-        return signed_msg
+        # Type hashes and domain separators are precomputed, see eip712.py
+        self.domain = eip712.validator_domain(self.router.address)
+        self.price_signers = {}
+        self.metadata = MetadataCache(brownie.web3)
 
     def init(self):
         self.tokenX.approve(
@@ -203,15 +188,17 @@ class BinaryOptionTesting(object):
         ), "Wrong liquidity locked"
         assert txn.events["Save"], "Save event not emitted"
 
+    def asset_pair(self, token):
+        return self.metadata.get(getattr(token, "address", token), "assetPair")
+
     def get_signature(self, token, timestamp, price, publisher=None):
-        web3 = brownie.network.web3
         key = self.publisher.private_key if not publisher else publisher.private_key
-        msg_hash = web3.solidityKeccak(
-            ["string", "uint256", "uint256"],
-            [BufferBinaryOptions.at(token).assetPair(), timestamp, int(price)],
+        if key not in self.price_signers:
+            self.price_signers[key] = PriceSigner(key)
+        signature = self.price_signers[key].sign(
+            self.asset_pair(token), timestamp, int(price)
         )
-        signed_message = Account.sign_message(encode_defunct(msg_hash), key)
-        return to_32byte_hex(signed_message.signature)
+        return to_32byte_hex(signature)
 
     def get_sf_signature(self, token, timestamp, sf_publisher=None):
         web3 = brownie.network.web3
@@ -220,198 +207,97 @@ class BinaryOptionTesting(object):
             if not sf_publisher
             else sf_publisher.private_key
         )
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "SettlementFeeSignature": [
-                    {"name": "assetPair", "type": "string"},
-                    {"name": "expiryTimestamp", "type": "uint256"},
-                    {"name": "settlementFee", "type": "uint256"},
-                ],
-            },
-            "primaryType": "SettlementFeeSignature",
-            "domain": self.domain,
-            "message": {
-                "assetPair": BufferBinaryOptions.at(token).assetPair(),
-                "expiryTimestamp": timestamp,
-                "settlementFee": self.sf,
-            },
+        message = {
+            "assetPair": self.asset_pair(token),
+            "expiryTimestamp": timestamp,
+            "settlementFee": self.sf,
         }
-        s = self.enc(msgParams, key)
+        s = self.domain.sign(eip712.SETTLEMENT_FEE, message, key).signature
 
         return s
 
     def get_close_signature(self, token, timestamp, optionId, key):
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "CloseAnytimeSignature": [
-                    {"name": "assetPair", "type": "string"},
-                    {"name": "timestamp", "type": "uint256"},
-                    {"name": "optionId", "type": "uint256"},
-                ],
-            },
-            "primaryType": "CloseAnytimeSignature",
-            "domain": self.domain,
-            "message": {
-                "assetPair": BufferBinaryOptions.at(token).assetPair(),
-                "timestamp": timestamp,
-                "optionId": int(optionId),
-            },
+        message = {
+            "assetPair": self.asset_pair(token),
+            "timestamp": timestamp,
+            "optionId": int(optionId),
         }
-        return self.enc(msgParams, key)
+        return self.domain.sign(eip712.CLOSE_ANYTIME, message, key).signature
 
     def get_user_signature(self, params, user, key):
         signature_time = self.chain.time()
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "UserTradeSignatureWithSettlementFee": [
-                    {"name": "user", "type": "address"},
-                    {"name": "totalFee", "type": "uint256"},
-                    {"name": "period", "type": "uint256"},
-                    {"name": "targetContract", "type": "address"},
-                    {"name": "strike", "type": "uint256"},
-                    {"name": "slippage", "type": "uint256"},
-                    {"name": "allowPartialFill", "type": "bool"},
-                    {"name": "referralCode", "type": "string"},
-                    {"name": "traderNFTId", "type": "uint256"},
-                    {"name": "timestamp", "type": "uint256"},
-                    {"name": "settlementFee", "type": "uint256"},
-                ],
-            },
-            "primaryType": "UserTradeSignatureWithSettlementFee",
-            "domain": self.domain,
-            "message": {
-                "user": user,
-                "totalFee": params[0],
-                "period": params[1],
-                "targetContract": params[2],
-                "strike": params[3],
-                "slippage": params[4],
-                "allowPartialFill": params[5],
-                "referralCode": params[6],
-                "traderNFTId": params[7],
-                "timestamp": signature_time,
-                "settlementFee": self.sf,
-            },
+        message = {
+            "user": user,
+            "totalFee": params[0],
+            "period": params[1],
+            "targetContract": params[2],
+            "strike": params[3],
+            "slippage": params[4],
+            "allowPartialFill": params[5],
+            "referralCode": params[6],
+            "traderNFTId": params[7],
+            "timestamp": signature_time,
+            "settlementFee": self.sf,
         }
-        s = self.enc(msgParams, key)
+        s = self.domain.sign(eip712.USER_TRADE_WITH_SF, message, key).signature
         return (s, signature_time)
 
     def get_lo_user_signature(self, params, user, key):
         web3 = brownie.network.web3
         signature_time = self.chain.time()
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "UserTradeSignature": [
-                    {"name": "user", "type": "address"},
-                    {"name": "totalFee", "type": "uint256"},
-                    {"name": "period", "type": "uint256"},
-                    {"name": "targetContract", "type": "address"},
-                    {"name": "strike", "type": "uint256"},
-                    {"name": "slippage", "type": "uint256"},
-                    {"name": "allowPartialFill", "type": "bool"},
-                    {"name": "referralCode", "type": "string"},
-                    {"name": "traderNFTId", "type": "uint256"},
-                    {"name": "timestamp", "type": "uint256"},
-                ],
-            },
-            "primaryType": "UserTradeSignature",
-            "domain": self.domain,
-            "message": {
-                "user": user,
-                "totalFee": params[0],
-                "period": params[1],
-                "targetContract": params[2],
-                "strike": params[3],
-                "slippage": params[4],
-                "allowPartialFill": params[5],
-                "referralCode": params[6],
-                "traderNFTId": params[7],
-                "timestamp": signature_time,
-            },
+        message = {
+            "user": user,
+            "totalFee": params[0],
+            "period": params[1],
+            "targetContract": params[2],
+            "strike": params[3],
+            "slippage": params[4],
+            "allowPartialFill": params[5],
+            "referralCode": params[6],
+            "traderNFTId": params[7],
+            "timestamp": signature_time,
         }
-        return (self.enc(msgParams, key), signature_time)
+        s = self.domain.sign(eip712.USER_TRADE, message, key).signature
+        return (s, signature_time)
 
     def get_lo_user_signature_with_direction(
         self, params, is_above, user, signature_time, key
     ):
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "MarketDirectionSignature": [
-                    {"name": "user", "type": "address"},
-                    {"name": "totalFee", "type": "uint256"},
-                    {"name": "period", "type": "uint256"},
-                    {"name": "targetContract", "type": "address"},
-                    {"name": "strike", "type": "uint256"},
-                    {"name": "slippage", "type": "uint256"},
-                    {"name": "allowPartialFill", "type": "bool"},
-                    {"name": "referralCode", "type": "string"},
-                    {"name": "traderNFTId", "type": "uint256"},
-                    {"name": "isAbove", "type": "bool"},
-                    {"name": "timestamp", "type": "uint256"},
-                ],
-            },
-            "primaryType": "MarketDirectionSignature",
-            "domain": self.domain,
-            "message": {
-                "user": user,
-                "totalFee": params[0],
-                "period": params[1],
-                "targetContract": params[2],
-                "strike": params[3],
-                "slippage": params[4],
-                "allowPartialFill": params[5],
-                "referralCode": params[6],
-                "traderNFTId": params[7],
-                "isAbove": is_above,
-                "timestamp": signature_time,
-            },
+        message = {
+            "user": user,
+            "totalFee": params[0],
+            "period": params[1],
+            "targetContract": params[2],
+            "strike": params[3],
+            "slippage": params[4],
+            "allowPartialFill": params[5],
+            "referralCode": params[6],
+            "traderNFTId": params[7],
+            "isAbove": is_above,
+            "timestamp": signature_time,
         }
-        return (self.enc(msgParams, key), signature_time)
+        s = self.domain.sign(eip712.MARKET_DIRECTION, message, key).signature
+        return (s, signature_time)
 
     def get_user_signature_with_direction(
         self, params, is_above, user, signature_time, key
     ):
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "MarketDirectionSignatureWithSettlementFee": [
-                    {"name": "user", "type": "address"},
-                    {"name": "totalFee", "type": "uint256"},
-                    {"name": "period", "type": "uint256"},
-                    {"name": "targetContract", "type": "address"},
-                    {"name": "strike", "type": "uint256"},
-                    {"name": "slippage", "type": "uint256"},
-                    {"name": "allowPartialFill", "type": "bool"},
-                    {"name": "referralCode", "type": "string"},
-                    {"name": "traderNFTId", "type": "uint256"},
-                    {"name": "isAbove", "type": "bool"},
-                    {"name": "timestamp", "type": "uint256"},
-                    {"name": "settlementFee", "type": "uint256"},
-                ],
-            },
-            "primaryType": "MarketDirectionSignatureWithSettlementFee",
-            "domain": self.domain,
-            "message": {
-                "user": user,
-                "totalFee": params[0],
-                "period": params[1],
-                "targetContract": params[2],
-                "strike": params[3],
-                "slippage": params[4],
-                "allowPartialFill": params[5],
-                "referralCode": params[6],
-                "traderNFTId": params[7],
-                "isAbove": is_above,
-                "timestamp": signature_time,
-                "settlementFee": self.sf,
-            },
+        message = {
+            "user": user,
+            "totalFee": params[0],
+            "period": params[1],
+            "targetContract": params[2],
+            "strike": params[3],
+            "slippage": params[4],
+            "allowPartialFill": params[5],
+            "referralCode": params[6],
+            "traderNFTId": params[7],
+            "isAbove": is_above,
+            "timestamp": signature_time,
+            "settlementFee": self.sf,
         }
-        return (self.enc(msgParams, key), signature_time)
+        s = self.domain.sign(eip712.MARKET_DIRECTION_WITH_SF, message, key).signature
+        return (s, signature_time)
 
     def get_user_signature_for_close(self, params, user, key):
         web3 = brownie.network.web3
@@ -425,96 +311,36 @@ class BinaryOptionTesting(object):
         return (to_32byte_hex(signed_message.signature), signature_time)
 
     def get_register_signature(self, one_ct, user):
-        web3 = brownie.network.web3
-        key = user.private_key
-        domain = {
-            "name": "Validator",
-            "version": "1",
-            "chainId": 1,
-            "verifyingContract": self.registrar.address,
-        }
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "RegisterAccount": [
-                    {"name": "oneCT", "type": "address"},
-                    {"name": "user", "type": "address"},
-                    {"name": "nonce", "type": "uint256"},
-                ],
-            },
-            "primaryType": "RegisterAccount",
-            "domain": domain,
-            "message": {
-                "oneCT": one_ct.address,
-                "user": user.address,
-                "nonce": self.registrar.accountMapping(user.address)[1],
-            },
+        message = {
+            "oneCT": one_ct.address,
+            "user": user.address,
+            "nonce": self.registrar.accountMapping(user.address)[1],
         }
-        s = self.enc(msgParams, key)
-        return s
+        domain = eip712.validator_domain(self.registrar.address)
+        return domain.sign(eip712.REGISTER_ACCOUNT, message, user.private_key).signature
 
     def get_deregister_signature(self, user):
-        web3 = brownie.network.web3
-        key = user.private_key
-
-        domain = {
-            "name": "Validator",
-            "version": "1",
-            "chainId": 1,
-            "verifyingContract": self.registrar.address,
+        message = {
+            "user": user.address,
+            "nonce": self.registrar.accountMapping(user.address)[1],
         }
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "DeregisterAccount": [
-                    {"name": "user", "type": "address"},
-                    {"name": "nonce", "type": "uint256"},
-                ],
-            },
-            "primaryType": "DeregisterAccount",
-            "domain": domain,
-            "message": {
-                "user": user.address,
-                "nonce": self.registrar.accountMapping(user.address)[1],
-            },
-        }
-        s = self.enc(msgParams, key)
-        return s
+        domain = eip712.validator_domain(self.registrar.address)
+        return domain.sign(
+            eip712.DEREGISTER_ACCOUNT, message, user.private_key
+        ).signature
 
     def get_permit(self, allowance, deadline, user, spender=None):
-        web3 = brownie.network.web3
-        key = user.private_key
-        domain = {
-            "name": "Token",
-            "version": "1",
-            "chainId": 1,
-            "verifyingContract": self.tokenX.address,
-        }
-
-        msgParams = {
-            "types": {
-                "EIP712Domain": self.domain_type,
-                "Permit": [
-                    {"name": "owner", "type": "address"},
-                    {"name": "spender", "type": "address"},
-                    {"name": "value", "type": "uint256"},
-                    {"name": "nonce", "type": "uint256"},
-                    {"name": "deadline", "type": "uint256"},
-                ],
-            },
-            "primaryType": "Permit",
-            "domain": domain,
-            "message": {
-                "owner": user.address,
-                "spender": spender or self.router.address,
-                "value": allowance,
-                "nonce": self.tokenX.nonces(user.address),
-                "deadline": deadline,
-            },
+        message = {
+            "owner": user.address,
+            "spender": spender or self.router.address,
+            "value": allowance,
+            "nonce": self.tokenX.nonces(user.address),
+            "deadline": deadline,
         }
-        sig = self.enc_v2(msgParams, key)
+        domain = eip712.domain("Token", "1", 1, self.tokenX.address)
+        sig = domain.sign(eip712.PERMIT, message, user.private_key)
 
-        return sig.v, sig.r, sig.s
+        return sig.v, sig.signature[:32], sig.signature[32:64]
 
     def reregister(self, user, one_ct):
         nonce = self.registrar.accountMapping(user.address)[1]